@@ -0,0 +1,220 @@
+"""
+Serialisation Benchmark
+~~~~~~~~~~~~~~~~~~~~~~~
+
+Benchmarks every content type and content type × content encoding
+combination in :mod:`pyapp_ext.messaging.serialisation` against a set of
+representative payloads.
+
+For each combination encode and decode operations per second, the size of the
+encoded body and the peak memory allocated by an encode/decode round trip are
+reported. Combinations that cannot serialise a payload (eg binary data as
+JSON) or whose optional dependency is not installed are skipped.
+
+Run with::
+
+    python benchmarks/bench_serialisation.py [--min-time SECONDS] [--filter TEXT]
+
+Results are written to stdout (or ``--output``) as JSON lines.
+
+"""
+import argparse
+import json
+import random
+import sys
+import timeit
+import tracemalloc
+from typing import Any, Callable, Dict, Iterator, Tuple
+
+from pyapp_ext.messaging import serialisation
+
+
+def build_payloads() -> Dict[str, Any]:
+    """
+    Representative payload shapes.
+    """
+    rnd = random.Random(42)
+    return {
+        "small-flat": {
+            "event": "order.created",
+            "order_id": 123456,
+            "customer_id": 98765,
+            "total": 123.45,
+            "currency": "AUD",
+            "paid": True,
+            "note": None,
+            "created": "2020-08-20T03:01:40+00:00",
+        },
+        "nested": {
+            "event": "order.updated",
+            "order": {
+                "id": 123456,
+                "customer": {
+                    "id": 98765,
+                    "name": "Jane Citizen",
+                    "address": {"street": "1 Main St", "city": "Sydney"},
+                },
+                "lines": [
+                    {"sku": f"SKU-{idx}", "qty": idx % 5 + 1, "price": idx * 1.25}
+                    for idx in range(20)
+                ],
+                "tags": ["priority", "gift", "express"],
+            },
+        },
+        "large-list": {
+            "items": [
+                {"id": idx, "value": idx * 1.5, "name": f"item-{idx}"}
+                for idx in range(10000)
+            ]
+        },
+        "binary-heavy": {
+            "id": 1,
+            "content_type": "image/png",
+            "blob": bytes(rnd.getrandbits(8) for _ in range(32 * 1024)) * 8,
+        },
+    }
+
+
+def content_types() -> Iterator[Tuple[str, Callable[[], serialisation.ContentType]]]:
+    yield "JSONSerialise", serialisation.JSONSerialise
+    yield "FastJSONSerialise", serialisation.FastJSONSerialise
+    yield "MsgPackSerialise", serialisation.MsgPackSerialise
+    yield "PickleSerialise", serialisation.PickleSerialise
+    yield "OutOfBandPickleSerialise", serialisation.OutOfBandPickleSerialise
+
+
+def trained_dictionary_encoding(content_type: serialisation.ContentType):
+    """
+    Zstd dictionary encoding trained from variations of the small payload.
+    """
+    small = build_payloads()["small-flat"]
+    samples = []
+    for idx in range(1000):
+        sample = dict(small, order_id=idx, customer_id=idx * 7, total=idx / 3)
+        body = content_type.serialise(sample)
+        samples.append(body.encode() if isinstance(body, str) else body)
+    dictionary = serialisation.train_zstd_dictionary(samples, size=4096)
+    return serialisation.ZstdDictEncoding(content_type, dictionary)
+
+
+def encodings() -> Iterator[Tuple[str, Callable[[Any], serialisation.Serialise]]]:
+    yield "", lambda content_type: content_type
+    yield "GZipEncoding", serialisation.GZipEncoding
+    yield "ZstdEncoding", serialisation.ZstdEncoding
+    yield "LZ4Encoding", serialisation.LZ4Encoding
+    yield "ZstdDictEncoding", trained_dictionary_encoding
+
+
+def serialisations() -> Iterator[Tuple[str, serialisation.Serialise]]:
+    for content_name, content_type_factory in content_types():
+        try:
+            content_type = content_type_factory()
+        except (ImportError, RuntimeError) as ex:
+            print(f"Skipping {content_name}: {ex}", file=sys.stderr)
+            continue
+
+        for encoding_name, encoding_factory in encodings():
+            name = "+".join(filter(None, (content_name, encoding_name)))
+            try:
+                yield name, encoding_factory(content_type)
+            except (ImportError, RuntimeError) as ex:
+                print(f"Skipping {name}: {ex}", file=sys.stderr)
+
+
+def ops_per_second(func: Callable[[], Any], min_time: float) -> float:
+    """
+    Operations per second, repeating func for at least min_time seconds.
+    """
+    timer = timeit.Timer(func)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time:
+            return number / elapsed
+        if elapsed > 0:
+            number = max(number * 2, int(number * min_time / elapsed) + 1)
+        else:
+            number *= 10
+
+
+def peak_memory(func: Callable[[], Any]) -> int:
+    """
+    Peak memory allocated by a call to func.
+    """
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def benchmark(
+    name: str,
+    target: serialisation.Serialise,
+    payload_name: str,
+    payload: Any,
+    min_time: float,
+) -> Dict[str, Any]:
+    body = target.serialise(payload)
+    target.deserialise(body)  # Ensure the payload round trips
+
+    return {
+        "serialisation": name,
+        "content_type": target.content_type,
+        "content_encoding": target.content_encoding,
+        "payload": payload_name,
+        "encode_ops_per_sec": round(
+            ops_per_second(lambda: target.serialise(payload), min_time), 1
+        ),
+        "decode_ops_per_sec": round(
+            ops_per_second(lambda: target.deserialise(body), min_time), 1
+        ),
+        "bytes_out": len(body.encode() if isinstance(body, str) else body),
+        "peak_memory_bytes": peak_memory(
+            lambda: target.deserialise(target.serialise(payload))
+        ),
+    }
+
+
+def run(min_time: float = 0.2, name_filter: str = None) -> Iterator[Dict[str, Any]]:
+    payloads = build_payloads()
+    for name, target in serialisations():
+        if name_filter and name_filter not in name:
+            continue
+
+        for payload_name, payload in payloads.items():
+            try:
+                yield benchmark(name, target, payload_name, payload, min_time)
+            except (TypeError, ValueError) as ex:
+                print(f"Skipping {name} with {payload_name}: {ex}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.2,
+        help="Minimum time in seconds to run each measurement.",
+    )
+    parser.add_argument(
+        "--filter", dest="name_filter", help="Only run serialisations matching."
+    )
+    parser.add_argument(
+        "--output",
+        type=argparse.FileType("w"),
+        default=sys.stdout,
+        help="File to write JSON lines results to; defaults to stdout.",
+    )
+    opts = parser.parse_args(argv)
+
+    for result in run(opts.min_time, opts.name_filter):
+        json.dump(result, opts.output)
+        opts.output.write("\n")
+        opts.output.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""
+Throughput Benchmark
+~~~~~~~~~~~~~~~~~~~~
+
+Measures the end-to-end cost of the messaging abstraction by driving messages
+from :meth:`MessageSender.send` through :meth:`MessageReceiver.listen`
+(``receive_raw``, de-serialisation and ``delete``) of AsyncIO queues.
+
+Producers and consumers run concurrently in a single event loop; throughput
+(messages per second) and end-to-end latency percentiles (from send until
+the consumer has the decoded content) are reported. By default the in-memory
+queues are used so the result is the overhead of the abstraction layer itself;
+any queue configured in ``SEND_MESSAGE_QUEUES``/``RECEIVE_MESSAGE_QUEUES``
+can be benchmarked by name (use ``--settings`` to load their definitions).
+
+Run with::
+
+    python benchmarks/bench_throughput.py [--producers N] [--consumers N]
+        [--messages N] [--size BYTES] [--serialisation NAME]
+        [--settings MODULE --send-queue NAME --receive-queue NAME]
+
+Results are written to stdout as JSON lines.
+
+"""
+import argparse
+import asyncio
+import json
+import math
+import sys
+import time
+from typing import Any, AsyncGenerator, Dict, Iterable, List, Sequence
+
+from pyapp.conf import settings
+
+from pyapp_ext.messaging import serialisation
+from pyapp_ext.messaging.aio import MessageSender, MessageReceiver, Message
+from pyapp_ext.messaging.serialisation import Body, Serialise
+
+SERIALISATIONS = {
+    "json": lambda: serialisation.JSONSerialise(),
+    "fast-json": lambda: serialisation.FastJSONSerialise(),
+    "msgpack": lambda: serialisation.MsgPackSerialise(),
+    "pickle": lambda: serialisation.PickleSerialise(),
+    "fast-json+gzip": lambda: serialisation.GZipEncoding(
+        serialisation.FastJSONSerialise(), level=1
+    ),
+    "fast-json+zstd": lambda: serialisation.ZstdEncoding(
+        serialisation.FastJSONSerialise()
+    ),
+    "fast-json+lz4": lambda: serialisation.LZ4Encoding(
+        serialisation.FastJSONSerialise()
+    ),
+}
+
+MEMORY_QUEUE = "benchmark-throughput"
+
+
+class SerialisedSender(MessageSender):
+    """
+    Sender that sends through another sender using the serialisation being
+    benchmarked.
+    """
+
+    __slots__ = ("_queue", "_serialisation")
+
+    def __init__(self, queue: MessageSender, target: Serialise):
+        self._queue = queue
+        self._serialisation = target
+
+    @property
+    def serialisation(self) -> Serialise:
+        return self._serialisation
+
+    async def open(self):
+        await self._queue.open()
+
+    async def close(self):
+        await self._queue.close()
+
+    async def send_raw(
+        self, body: Body, *, content_type: str = None, content_encoding: str = None
+    ) -> Any:
+        return await self._queue.send_raw(
+            body, content_type=content_type, content_encoding=content_encoding
+        )
+
+    async def send_raw_many(
+        self,
+        bodies: Iterable[Body],
+        *,
+        content_type: str = None,
+        content_encoding: str = None,
+    ) -> List[Any]:
+        return await self._queue.send_raw_many(
+            bodies, content_type=content_type, content_encoding=content_encoding
+        )
+
+
+class SerialisedReceiver(MessageReceiver):
+    """
+    Receiver that receives from another receiver using the serialisation
+    being benchmarked as the fallback for content types that are not
+    registered (eg pickle).
+    """
+
+    __slots__ = ("_queue", "_serialisation")
+
+    def __init__(self, queue: MessageReceiver, target: Serialise):
+        self._queue = queue
+        self._serialisation = target
+
+    @property
+    def serialisation(self) -> Serialise:
+        return self._serialisation
+
+    async def open(self):
+        await self._queue.open()
+
+    async def close(self):
+        await self._queue.close()
+
+    async def receive_raw(self) -> AsyncGenerator[Message, None]:
+        messages = self._queue.receive_raw()
+        try:
+            async for message in messages:
+                yield message._replace(queue=self)
+        finally:
+            await messages.aclose()
+
+    async def delete(self, message: Message):
+        await self._queue.delete(message)
+
+    async def delete_many(self, messages: Iterable[Message]):
+        await self._queue.delete_many(messages)
+
+
+def register_memory_queues(max_size: int):
+    """
+    Register an in-memory queue as the default benchmark target.
+    """
+    settings.SEND_MESSAGE_QUEUES[MEMORY_QUEUE] = (
+        "pyapp_ext.messaging.aio.memory.MemorySender",
+        {"queue_name": MEMORY_QUEUE, "max_size": max_size},
+    )
+    settings.RECEIVE_MESSAGE_QUEUES[MEMORY_QUEUE] = (
+        "pyapp_ext.messaging.aio.memory.MemoryReceiver",
+        {"queue_name": MEMORY_QUEUE, "visibility_timeout": None},
+    )
+
+
+def percentile(ordered: Sequence[float], percent: float) -> float:
+    """
+    Nearest-rank percentile of an ordered sequence.
+    """
+    if not ordered:
+        return math.nan
+    rank = max(math.ceil(percent / 100 * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+async def produce(sender: MessageSender, count: int, data: str):
+    for seq in range(count):
+        await sender.send(sent=time.perf_counter(), seq=seq, data=data)
+
+
+async def consume(
+    receiver: MessageReceiver, latencies: List[float], total: int, done: asyncio.Event
+):
+    # Deleted explicitly as leaving listen() skips the delete of the last message
+    async for message in receiver.listen(auto_delete=False):
+        content = await message.acontent()
+        latencies.append(time.perf_counter() - content["sent"])
+        await message.delete()
+        if len(latencies) >= total:
+            done.set()
+            break
+
+
+async def run(
+    send_queue: str,
+    receive_queue: str,
+    producers: int,
+    consumers: int,
+    messages: int,
+    size: int,
+    serialisation_name: str,
+    target: Serialise,
+) -> Dict[str, Any]:
+    from pyapp_ext.messaging.aio.factory import get_sender, get_receiver
+
+    per_producer = max(messages // producers, 1)
+    total = per_producer * producers
+    data = "x" * size
+
+    senders = [
+        SerialisedSender(get_sender(send_queue), target) for _ in range(producers)
+    ]
+    receivers = [
+        SerialisedReceiver(get_receiver(receive_queue), target)
+        for _ in range(consumers)
+    ]
+    for queue in senders + receivers:
+        await queue.open()
+
+    latencies = []
+    done = asyncio.Event()
+    start = time.perf_counter()
+    consumer_tasks = [
+        asyncio.ensure_future(consume(receiver, latencies, total, done))
+        for receiver in receivers
+    ]
+    producer_tasks = [
+        asyncio.ensure_future(produce(sender, per_producer, data)) for sender in senders
+    ]
+    waiting = asyncio.ensure_future(done.wait())
+    try:
+        # Wait on the consumers as well so a failure is raised, not a hang
+        pending = set(consumer_tasks + producer_tasks + [waiting])
+        while not done.is_set():
+            finished, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in finished:
+                task.result()
+            if not done.is_set() and all(task.done() for task in consumer_tasks):
+                raise RuntimeError("Consumers finished before all messages arrived")
+        elapsed = time.perf_counter() - start
+
+    finally:
+        tasks = consumer_tasks + producer_tasks + [waiting]
+        for task in tasks:
+            task.cancel()
+        await asyncio.wait(tasks)
+        for queue in senders + receivers:
+            await queue.close()
+
+    latencies.sort()
+    return {
+        "send_queue": send_queue,
+        "receive_queue": receive_queue,
+        "serialisation": serialisation_name,
+        "producers": producers,
+        "consumers": consumers,
+        "messages": total,
+        "payload_size": size,
+        "elapsed_sec": round(elapsed, 4),
+        "msgs_per_sec": round(total / elapsed, 1),
+        "latency_ms": {
+            name: round(percentile(latencies, percent) * 1000, 3)
+            for name, percent in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100))
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--producers", type=int, default=1)
+    parser.add_argument("--consumers", type=int, default=1)
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument(
+        "--size",
+        type=int,
+        nargs="+",
+        default=[128],
+        help="Payload size(s) in bytes; each size is a separate run.",
+    )
+    parser.add_argument(
+        "--serialisation",
+        nargs="+",
+        choices=sorted(SERIALISATIONS),
+        default=["fast-json"],
+        help="Serialisation(s) used to send messages; each is a separate run.",
+    )
+    parser.add_argument(
+        "--settings",
+        action="append",
+        default=[],
+        help="Additional settings module(s) defining the queues to benchmark.",
+    )
+    parser.add_argument("--send-queue", default=MEMORY_QUEUE)
+    parser.add_argument("--receive-queue", default=MEMORY_QUEUE)
+    parser.add_argument(
+        "--max-size",
+        type=int,
+        default=1000,
+        help="Capacity of the default in-memory queue.",
+    )
+    opts = parser.parse_args(argv)
+
+    settings.configure(["pyapp_ext.messaging.default_settings"] + opts.settings)
+    register_memory_queues(opts.max_size)
+
+    loop = asyncio.get_event_loop()
+    for serialisation_name in opts.serialisation:
+        # Only an unavailable optional library is skipped; failures of a run
+        # are raised.
+        try:
+            target = SERIALISATIONS[serialisation_name]()
+        except ImportError as ex:
+            print(f"Skipping {serialisation_name}: {ex}", file=sys.stderr)
+            continue
+
+        for size in opts.size:
+            result = loop.run_until_complete(
+                run(
+                    opts.send_queue,
+                    opts.receive_queue,
+                    opts.producers,
+                    opts.consumers,
+                    opts.messages,
+                    size,
+                    serialisation_name,
+                    target,
+                )
+            )
+            json.dump(result, sys.stdout)
+            sys.stdout.write("\n")
+            sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
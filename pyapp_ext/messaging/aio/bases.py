@@ -8,10 +8,25 @@ These interfaces to be used with both Message Queue and Pub/Sub style queues.
 
 """
 import abc
+import asyncio
 import logging
-from typing import Any, AsyncGenerator, NamedTuple, Dict, Optional
-
-from ..serialisation import Serialise, JSONSerialise
+from collections import defaultdict
+from concurrent.futures import Executor
+from contextlib import suppress
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterable,
+    Awaitable,
+    Callable,
+    Dict,
+    Optional,
+    Iterable,
+    List,
+)
+
+from ..message import BaseMessage, _NOT_DECODED
+from ..serialisation import Body, Serialise, JSONSerialise, OFFLOAD_THRESHOLD
 
 LOGGER = logging.getLogger(__name__)
 DEFAULT_SERIALISE = JSONSerialise()
@@ -26,6 +41,18 @@ class QueueBase(abc.ABC):
 
     default_serialisation: Serialise = DEFAULT_SERIALISE
 
+    offload_threshold: int = OFFLOAD_THRESHOLD
+    """
+    Payloads of this size (in bytes) or larger are serialised/deserialised
+    in :attr:`serialisation_executor` to avoid blocking the event loop.
+    """
+
+    serialisation_executor: Optional[Executor] = None
+    """
+    Executor used for large payloads; the default executor of the event loop
+    (a thread pool) is used if not set.
+    """
+
     def __repr__(self):
         return f"<{type(self).__name__}>"
 
@@ -74,39 +101,124 @@ class MessageSender(QueueBase, metaclass=abc.ABCMeta):
 
     __slots__ = ()
 
+    send_concurrency: int = 10
+    """
+    Maximum number of concurrent :meth:`send_raw` calls made by the default
+    :meth:`send_raw_many` implementation.
+    """
+
     @abc.abstractmethod
     async def send_raw(
-        self, body: str, *, content_type: str = None, content_encoding: str = None
+        self, body: Body, *, content_type: str = None, content_encoding: str = None
     ):
         """
         Send a raw message to the task queue. This accepts a prepared and encoded body.
+
+        Bodies may be any bytes-like object (or str); implementations should
+        pass the body to their client without copying it where possible.
         """
 
-    async def send(self, d: Dict[str, Any] = None, **data):
+    async def send_raw_many(
+        self,
+        bodies: Iterable[Body],
+        *,
+        content_type: str = None,
+        content_encoding: str = None,
+    ) -> List[Any]:
+        """
+        Send multiple raw messages to the task queue. This accepts prepared and
+        encoded bodies that share a content type and encoding.
+
+        Backends that provide a bulk send (eg SQS SendMessageBatch or pipelined
+        AMQP publishes) should override this method; the default implementation
+        calls :meth:`send_raw` with at most :attr:`send_concurrency` sends in
+        flight at a time.
+
+        Results from each send are returned in the same order as the bodies.
+        The first failure is raised once the remaining sends are cancelled.
+        """
+        bodies = list(bodies)
+        results = [None] * len(bodies)
+        pending = iter(enumerate(bodies))
+
+        async def worker():
+            for idx, body in pending:
+                results[idx] = await self.send_raw(
+                    body, content_type=content_type, content_encoding=content_encoding
+                )
+
+        workers = [
+            asyncio.ensure_future(worker())
+            for _ in range(min(max(self.send_concurrency, 1), len(bodies)))
+        ]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            # Don't leave workers sending in the background after a failure
+            # (or cancellation).
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        return results
+
+    async def send(self, d: Dict[str, Any] = None, **data) -> Any:
         """
         Send a message to the task queue.
+
+        Returns the result of :meth:`send_raw` (eg a message ID).
         """
         if d:
             data.update(d)
 
         serialisation = self.serialisation
-        await self.send_raw(
-            serialisation.serialise(data),
+        body, content_encoding = await serialisation.aserialise_encoded(
+            data,
+            executor=self.serialisation_executor,
+            threshold=self.offload_threshold,
+        )
+        return await self.send_raw(
+            body,
             content_type=serialisation.content_type,
-            content_encoding=serialisation.content_encoding,
+            content_encoding=content_encoding,
         )
 
+    async def send_many(self, items: Iterable[Dict[str, Any]]) -> List[Any]:
+        """
+        Send multiple messages to the task queue.
 
-class Message(NamedTuple):
+        All messages are serialised in a single pass before being handed to
+        :meth:`send_raw_many`; as encodings may skip encoding small payloads
+        messages are grouped by the content encoding actually applied.
+        """
+        serialisation = self.serialisation
+        groups = defaultdict(list)
+        for idx, item in enumerate(items):
+            body, content_encoding = await serialisation.aserialise_encoded(
+                item,
+                executor=self.serialisation_executor,
+                threshold=self.offload_threshold,
+            )
+            groups[content_encoding].append((idx, body))
+
+        results = [None] * sum(len(group) for group in groups.values())
+        for content_encoding, group in groups.items():
+            sent = await self.send_raw_many(
+                [body for _, body in group],
+                content_type=serialisation.content_type,
+                content_encoding=content_encoding,
+            )
+            for (idx, _), result in zip(group, sent):
+                results[idx] = result
+
+        return results
+
+
+class Message(BaseMessage):
     """
     Message Received
     """
 
-    body: Any
-    content_type: str
-    content_encoding: Optional[str]
-    envelope: Any
-    queue: "MessageReceiver"
+    __slots__ = ()
 
     async def delete(self):
         """
@@ -114,12 +226,23 @@ class Message(NamedTuple):
         """
         await self.queue.delete(self)
 
-    @property
-    def content(self):
+    async def acontent(self):
         """
-        De-serialised message content
+        De-serialised message content, large messages are de-serialised in an
+        executor to avoid blocking the event loop (see
+        :attr:`QueueBase.offload_threshold`).
+
+        The result is cached and shared with :attr:`content`.
         """
-        return self.queue.serialisation.deserialise(self.body)
+        content = self._content
+        if content is _NOT_DECODED:
+            queue = self.queue
+            content = self._content = await self.serialisation.adeserialise(
+                self.body,
+                executor=queue.serialisation_executor,
+                threshold=queue.offload_threshold,
+            )
+        return content
 
 
 class MessageReceiver(QueueBase, metaclass=abc.ABCMeta):
@@ -141,13 +264,281 @@ class MessageReceiver(QueueBase, metaclass=abc.ABCMeta):
         Delete/Acknowledge message from queue
         """
 
+    async def delete_many(self, messages: Iterable[Message]):
+        """
+        Delete/Acknowledge multiple messages from queue.
+
+        Backends that provide a bulk acknowledge (eg SQS DeleteMessageBatch or
+        AMQP multiple acks) should override this method; the default
+        implementation calls :meth:`delete` for each message concurrently.
+        """
+        await asyncio.gather(*(self.delete(message) for message in messages))
+
+    async def receive_batch(
+        self, max_messages: int = 10, max_wait: Optional[float] = 0.0
+    ) -> List[Message]:
+        """
+        Receive a batch of up to `max_messages` messages from the queue.
+
+        Waits for at least one message and then up to `max_wait` seconds for
+        the batch to fill; by default only messages that are immediately
+        available are added (`None` waits until the batch is full).
+
+        If cancelled, messages already received are released back to the
+        queue if the receiver supports it (has a ``release_many`` or
+        ``release`` method) rather than being held until their visibility
+        timeout expires.
+
+        Backends that provide a batch receive (eg SQS ReceiveMessage) should
+        override this method.
+        """
+        loop = asyncio.get_event_loop()
+        messages = self.receive_raw()
+        batch = []
+        pending = None
+        cancelled = False
+        try:
+            deadline = None
+            while len(batch) < max_messages:
+                pending = asyncio.ensure_future(messages.__anext__())
+                timeout = None if deadline is None else max(deadline - loop.time(), 0)
+                # A zero timeout still allows the read a single step
+                done, _ = await asyncio.wait({pending}, timeout=timeout)
+                if not done:
+                    break
+
+                task, pending = pending, None
+                try:
+                    batch.append(task.result())
+                except StopAsyncIteration:
+                    break
+
+                if deadline is None and max_wait is not None:
+                    deadline = loop.time() + max_wait
+
+            return batch
+
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+
+        finally:
+            unused = batch if cancelled else []
+            if pending is not None:
+                pending.cancel()
+                with suppress(asyncio.CancelledError, Exception):
+                    # A read can complete in spite of being cancelled
+                    unused.append(await pending)
+            await messages.aclose()
+
+            release_many = getattr(self, "release_many", None)
+            if release_many is not None:
+                if unused:
+                    result = release_many(unused)
+                    if asyncio.iscoroutine(result):
+                        await result
+            else:
+                release = getattr(self, "release", None)
+                if release is not None:
+                    for message in unused:
+                        result = release(message)
+                        if asyncio.iscoroutine(result):
+                            await result
+
     async def listen(
-        self, *, auto_delete: bool = True
+        self,
+        *,
+        auto_delete: bool = True,
+        batch_size: int = None,
+        max_wait: Optional[float] = 0.0,
+        delete_batch_size: int = 1,
+        delete_interval: float = 1.0,
     ) -> AsyncGenerator[Message, None]:
         """
         Listen to queue for messages.
+
+        :param auto_delete: Delete messages once the consumer has processed them.
+        :param batch_size: Yield lists of up to this many messages instead of
+            individual messages; processed batches are deleted with
+            :meth:`delete_many`.
+        :param max_wait: Time in seconds to wait for a batch to fill after its
+            first message is received; by default only messages that are
+            immediately available are added (`None` waits until the batch is
+            full). Keep this shorter than the visibility timeout.
+        :param delete_batch_size: Coalesce deletes of individually yielded
+            messages into calls to :meth:`delete_many` of up to this many
+            messages. Outstanding deletes are flushed when listening ends.
+        :param delete_interval: Maximum time in seconds a coalesced delete is
+            held before being flushed, including while waiting for the next
+            message. Keep this shorter than the visibility timeout.
+
+        """
+        if batch_size:
+            batches = batched(self.receive_raw(), batch_size, max_wait)
+            try:
+                async for batch in batches:
+                    yield batch
+                    if auto_delete:
+                        await self.delete_many(batch)
+            finally:
+                await batches.aclose()
+            return
+
+        loop = asyncio.get_event_loop()
+        messages = self.receive_raw()
+        pending_deletes = []
+        flush_at = None
+        pending = None
+        try:
+            while True:
+                if pending_deletes:
+                    # Don't hold deletes past the interval while the queue is idle
+                    pending = asyncio.ensure_future(messages.__anext__())
+                    timeout = max(flush_at - loop.time(), 0)
+                    done, _ = await asyncio.wait({pending}, timeout=timeout)
+                    if not done:
+                        await self.delete_many(pending_deletes)
+                        pending_deletes = []
+                    task, pending = pending, None
+                    try:
+                        msg = await task
+                    except StopAsyncIteration:
+                        break
+                else:
+                    try:
+                        msg = await messages.__anext__()
+                    except StopAsyncIteration:
+                        break
+
+                yield msg
+                if auto_delete:
+                    if delete_batch_size > 1:
+                        if not pending_deletes:
+                            flush_at = loop.time() + delete_interval
+                        pending_deletes.append(msg)
+                        if (
+                            len(pending_deletes) >= delete_batch_size
+                            or loop.time() >= flush_at
+                        ):
+                            await self.delete_many(pending_deletes)
+                            pending_deletes = []
+                    else:
+                        await self.delete(msg)
+        finally:
+            if pending is not None:
+                pending.cancel()
+                with suppress(asyncio.CancelledError, Exception):
+                    await pending
+            if pending_deletes:
+                await self.delete_many(pending_deletes)
+            await messages.aclose()
+
+    async def consume(
+        self,
+        handler: Callable[[Message], Awaitable[Any]],
+        *,
+        concurrency: int = 1,
+        on_error: Callable[[Message, Exception], Any] = None,
+    ):
         """
-        async for msg in self.receive_raw():
-            yield msg
-            if auto_delete:
-                await self.delete(msg)
+        Consume messages from the queue, running up to `concurrency` handlers
+        at a time.
+
+        A new message is only received once a handler slot is free so at most
+        `concurrency` messages are in-flight. Each message is deleted once its
+        handler completes successfully; messages whose handler fails are not
+        deleted so they can be redelivered by the queue. A failure to delete a
+        message is handled in the same way as a handler failure.
+
+        :param handler: Coroutine function called with each message.
+        :param concurrency: Maximum number of handlers running at once.
+        :param on_error: Called with the message and exception when a handler
+            fails (may be a coroutine function). If not supplied consumption
+            stops and the first failure is raised once all in-flight handlers
+            have completed.
+
+        """
+        slots = asyncio.Semaphore(concurrency)
+        in_flight = set()
+        failures = []
+
+        async def process(message: Message):
+            try:
+                await handler(message)
+                await self.delete(message)
+            except Exception as ex:
+                if on_error is None:
+                    failures.append(ex)
+                else:
+                    result = on_error(message, ex)
+                    if asyncio.iscoroutine(result):
+                        await result
+            finally:
+                slots.release()
+
+        messages = self.receive_raw()
+        try:
+            while not failures:
+                await slots.acquire()
+                try:
+                    message = await messages.__anext__()
+                except StopAsyncIteration:
+                    break
+
+                task = asyncio.ensure_future(process(message))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+
+        finally:
+            if in_flight:
+                await asyncio.wait(in_flight)
+            await messages.aclose()
+
+        if failures:
+            raise failures[0]
+
+
+async def batched(
+    messages: AsyncIterable[Message], size: int, max_wait: Optional[float]
+) -> AsyncGenerator[List[Message], None]:
+    """
+    Group messages from an async iterable into batches of up to `size` messages.
+
+    A batch is started by the first message received and is yielded once it is
+    full or `max_wait` seconds have elapsed since that first message. The read
+    that is outstanding when a batch times out is carried over to the next
+    batch so no message is lost.
+    """
+    loop = asyncio.get_event_loop()
+    iterator = messages.__aiter__()
+    pending = None
+    try:
+        while True:
+            batch = []
+            deadline = None
+            while len(batch) < size:
+                if pending is None:
+                    pending = asyncio.ensure_future(iterator.__anext__())
+                timeout = None if deadline is None else max(deadline - loop.time(), 0)
+                done, _ = await asyncio.wait({pending}, timeout=timeout)
+                if not done:
+                    break
+
+                task, pending = pending, None
+                try:
+                    batch.append(task.result())
+                except StopAsyncIteration:
+                    if batch:
+                        yield batch
+                    return
+
+                if deadline is None and max_wait is not None:
+                    deadline = loop.time() + max_wait
+
+            yield batch
+
+    finally:
+        if pending is not None:
+            pending.cancel()
+            with suppress(asyncio.CancelledError, Exception):
+                await pending
@@ -0,0 +1,307 @@
+"""
+Consumers
+~~~~~~~~~
+
+Consumers that process messages from a :class:`MessageReceiver` in parallel.
+
+"""
+import asyncio
+import logging
+import os
+import zlib
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import suppress
+from typing import Any, Awaitable, Callable, Hashable, List, Optional, Union
+
+from .bases import MessageReceiver, Message
+from ..serialisation import Serialise
+
+LOGGER = logging.getLogger(__name__)
+
+KeyFunc = Callable[[Any], Hashable]
+
+
+class Lane:
+    """
+    Ordered lane of a :class:`PartitionedConsumer` with ack tracking.
+    """
+
+    __slots__ = ("index", "buffer", "acked", "failed", "error")
+
+    def __init__(self, index: int, buffer_size: int):
+        self.index = index
+        self.buffer = asyncio.Queue(buffer_size)
+        self.acked = 0
+        self.failed = 0
+        self.error = None
+
+    def __repr__(self):
+        return (
+            f"<Lane {self.index} pending={self.pending} "
+            f"acked={self.acked} failed={self.failed}>"
+        )
+
+    @property
+    def pending(self) -> int:
+        """
+        Messages buffered waiting to be handled
+        """
+        return self.buffer.qsize()
+
+
+class PartitionedConsumer:
+    """
+    Consume messages in parallel lanes while preserving the order of messages
+    that share a key.
+
+    A key is extracted from the content of each message and hashed to one of
+    `lanes` lanes. Each lane handles its messages one at a time in the order
+    they were received while lanes run in parallel. When a lane buffer is full
+    receiving from the queue is paused until the lane catches up.
+
+    A message is deleted once its handler completes successfully. If a handler
+    fails and no `on_error` callback is supplied the lane stops handling
+    messages (leaving any buffered messages to be redelivered by the queue),
+    consumption stops and the first failure is raised once the other lanes
+    have drained. A failure of `on_error` itself also stops the lane.
+
+    :param receiver: Queue to receive messages from.
+    :param handler: Coroutine function called with each message.
+    :param key: Name of the key to partition on in the message content or a
+        callable that returns the key from the message content.
+    :param lanes: Number of lanes to run in parallel.
+    :param lane_buffer: Maximum number of messages buffered per lane.
+    :param on_error: Called with the message and exception when a handler
+        fails (may be a coroutine function).
+
+    """
+
+    __slots__ = (
+        "receiver",
+        "handler",
+        "key",
+        "lane_count",
+        "lane_buffer",
+        "on_error",
+        "lanes",
+        "_failed",
+    )
+
+    def __init__(
+        self,
+        receiver: MessageReceiver,
+        handler: Callable[[Message], Awaitable[Any]],
+        *,
+        key: Union[str, KeyFunc],
+        lanes: int = 4,
+        lane_buffer: int = 10,
+        on_error: Callable[[Message, Exception], Any] = None,
+    ):
+        self.receiver = receiver
+        self.handler = handler
+        self.key = (lambda content: content.get(key)) if isinstance(key, str) else key
+        self.lane_count = lanes
+        self.lane_buffer = lane_buffer
+        self.on_error = on_error
+        self.lanes: List[Lane] = []
+        self._failed: Optional[asyncio.Event] = None
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.receiver!r} lanes={self.lane_count}>"
+
+    def partition(self, message: Message) -> int:
+        """
+        Index of the lane that handles a message.
+
+        A CRC is used rather than :func:`hash` so a key maps to the same lane
+        in every process.
+        """
+        key = self.key(message.content)
+        return zlib.crc32(str(key).encode()) % self.lane_count
+
+    async def run(self):
+        """
+        Consume messages until the queue is exhausted or a handler fails.
+        """
+        self.lanes = lanes = [
+            Lane(idx, self.lane_buffer) for idx in range(self.lane_count)
+        ]
+        self._failed = failed = asyncio.Event()
+        workers = [asyncio.ensure_future(self._work(lane)) for lane in lanes]
+
+        messages = self.receiver.receive_raw()
+        # Wait on a lane failure alongside receiving so an idle queue doesn't
+        # delay stopping until the next message arrives.
+        failure = asyncio.ensure_future(failed.wait())
+        pending = None
+        try:
+            while not failed.is_set():
+                pending = asyncio.ensure_future(messages.__anext__())
+                await asyncio.wait(
+                    {pending, failure}, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not pending.done():
+                    break
+
+                task, pending = pending, None
+                try:
+                    message = task.result()
+                except StopAsyncIteration:
+                    break
+                await lanes[self.partition(message)].buffer.put(message)
+
+        finally:
+            failure.cancel()
+            if pending is not None:
+                pending.cancel()
+                with suppress(asyncio.CancelledError, Exception):
+                    await pending
+            for lane in lanes:
+                await lane.buffer.put(None)
+            await asyncio.wait(workers)
+            await messages.aclose()
+
+        for lane in lanes:
+            if lane.error is not None:
+                raise lane.error
+
+    async def _work(self, lane: Lane):
+        """
+        Handle messages from a lane in order.
+        """
+        while True:
+            message = await lane.buffer.get()
+            if message is None:
+                break
+
+            # Once a lane has failed remaining messages are not handled to
+            # preserve ordering; they are left for the queue to redeliver.
+            if lane.error is not None:
+                continue
+
+            try:
+                await self.handler(message)
+                await message.delete()
+            except Exception as ex:
+                lane.failed += 1
+                if self.on_error is None:
+                    LOGGER.error("Handler failed in lane %s; stopping lane", lane.index)
+                    self._stop_lane(lane, ex)
+                    continue
+
+                # The worker must keep draining its buffer (or run() blocks
+                # putting to it) so an on_error failure stops the lane instead.
+                try:
+                    result = self.on_error(message, ex)
+                    if asyncio.iscoroutine(result):
+                        await result
+                except Exception as error_ex:
+                    LOGGER.exception(
+                        "on_error callback failed in lane %s; stopping lane",
+                        lane.index,
+                    )
+                    self._stop_lane(lane, error_ex)
+            else:
+                lane.acked += 1
+
+    def _stop_lane(self, lane: Lane, error: Exception):
+        """
+        Record a lane failure and signal run() to stop receiving.
+        """
+        lane.error = error
+        self._failed.set()
+
+
+def _call_handler(
+    handler: Callable[[Any], Any], serialisation: Optional[Serialise], body: Any
+) -> Any:
+    """
+    Deserialise a message body (if a serialisation is supplied) and call the
+    handler; this is called in the worker process.
+    """
+    content = body if serialisation is None else serialisation.deserialise(body)
+    return handler(content)
+
+
+class ProcessPoolConsumer:
+    """
+    Consume messages using a pool of worker processes for CPU bound handlers.
+
+    The handler is called in a worker process with the message content; by
+    default the raw body is shipped to the worker and deserialised there so
+    decoding is also moved off the event loop. Each message is deleted in the
+    event loop once the handler has completed successfully in the worker.
+
+    As the handler is run in another process it must be a picklable (module
+    level) function that accepts the message content.
+
+    :param receiver: Queue to receive messages from.
+    :param handler: Function called in a worker process with message content.
+    :param workers: Number of worker processes; defaults to the CPU count.
+    :param max_in_flight: Maximum number of messages being handled at once;
+        defaults to twice the number of workers so workers are kept busy.
+    :param deserialise_in_worker: Ship the raw body to the worker and
+        deserialise it there; otherwise messages are deserialised in the event
+        loop and the content is shipped.
+    :param on_error: Called with the message and exception when a handler
+        fails (may be a coroutine function).
+    :param executor: Use an existing executor rather than creating a process
+        pool; the executor is not shutdown by the consumer.
+
+    """
+
+    __slots__ = (
+        "receiver",
+        "handler",
+        "workers",
+        "max_in_flight",
+        "deserialise_in_worker",
+        "on_error",
+        "executor",
+    )
+
+    def __init__(
+        self,
+        receiver: MessageReceiver,
+        handler: Callable[[Any], Any],
+        *,
+        workers: int = None,
+        max_in_flight: int = None,
+        deserialise_in_worker: bool = True,
+        on_error: Callable[[Message, Exception], Any] = None,
+        executor: Executor = None,
+    ):
+        self.receiver = receiver
+        self.handler = handler
+        self.workers = workers or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight or self.workers * 2
+        self.deserialise_in_worker = deserialise_in_worker
+        self.on_error = on_error
+        self.executor = executor
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.receiver!r} workers={self.workers}>"
+
+    async def run(self):
+        """
+        Consume messages until the queue is exhausted or a handler fails.
+        """
+        loop = asyncio.get_event_loop()
+        executor = self.executor or ProcessPoolExecutor(self.workers)
+        handler = self.handler
+        deserialise_in_worker = self.deserialise_in_worker
+
+        async def submit(message: Message) -> Any:
+            if deserialise_in_worker:
+                args = (handler, message.serialisation, message.body)
+            else:
+                args = (handler, None, await message.acontent())
+            return await loop.run_in_executor(executor, _call_handler, *args)
+
+        try:
+            await self.receiver.consume(
+                submit, concurrency=self.max_in_flight, on_error=self.on_error
+            )
+        finally:
+            if self.executor is None:
+                executor.shutdown()
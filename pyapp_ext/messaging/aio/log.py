@@ -0,0 +1,210 @@
+"""
+Log Queues
+~~~~~~~~~~
+
+Durable single node message queues backed by a memory-mapped append-only log
+(see :mod:`pyapp_ext.messaging.log`), eg::
+
+    SEND_MESSAGE_QUEUES = {
+        "jobs": (
+            "pyapp_ext.messaging.aio.log.LogSender",
+            {"directory": "/var/lib/myapp/jobs", "sync_window": 0.005},
+        ),
+    }
+
+    RECEIVE_MESSAGE_QUEUES = {
+        "jobs": (
+            "pyapp_ext.messaging.aio.log.LogReceiver",
+            {"directory": "/var/lib/myapp/jobs", "group": "workers"},
+        ),
+    }
+
+Appends and reads are in-memory operations on the memory map so they are
+made directly from the event loop; syncs (fsync) are run in an executor.
+
+"""
+import asyncio
+from typing import AsyncGenerator, Iterable, Optional
+
+from .bases import MessageSender, MessageReceiver, Message
+from .memory import _waiter
+from ..log import ConsumerGroup, SegmentedLog, open_log
+from ..serialisation import Body
+
+__all__ = ("LogSender", "LogReceiver")
+
+
+class LogSender(MessageSender):
+    """
+    Append messages to a durable log.
+
+    :param directory: Directory of the log.
+    :param segment_size: Size in bytes of log segment files.
+    :param sync_window: Durability window in seconds. Sends wait until the
+        message is synced to disk; sends made within the window share a single
+        sync (group commit). `0` syncs every message and `None` leaves
+        writing back to the operating system (sends do not wait).
+
+    """
+
+    __slots__ = ("directory", "segment_size", "sync_window", "_log", "_commit")
+
+    def __init__(
+        self,
+        *,
+        directory: str,
+        segment_size: int = None,
+        sync_window: Optional[float] = 0.002,
+    ):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.sync_window = sync_window
+        self._log = None
+        self._commit = None
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.directory!r}>"
+
+    def _attach(self) -> SegmentedLog:
+        self._log = open_log(self.directory, segment_size=self.segment_size)
+        return self._log
+
+    @property
+    def log(self) -> SegmentedLog:
+        log = self._log
+        return log if log is not None and not log.closed else self._attach()
+
+    async def open(self):
+        self._attach()
+
+    async def close(self):
+        if self._log is not None and not self._log.closed:
+            await asyncio.get_event_loop().run_in_executor(None, self._log.sync)
+
+    async def configure(self):
+        self._attach()
+
+    async def send_raw(
+        self, body: Body, *, content_type: str = None, content_encoding: str = None
+    ) -> int:
+        offset = self.log.append(body, content_type, content_encoding)
+        if self.sync_window is not None:
+            if self._commit is None:
+                self._commit = asyncio.ensure_future(self._sync())
+            await asyncio.shield(self._commit)
+        return offset
+
+    async def _sync(self):
+        """
+        Sync all messages appended within the durability window (group commit).
+        """
+        await asyncio.sleep(self.sync_window)
+        # Messages appended from here on are included in the next commit
+        self._commit = None
+        await asyncio.get_event_loop().run_in_executor(None, self.log.sync)
+
+
+class LogReceiver(MessageReceiver):
+    """
+    Receive messages from a durable log as a member of a consumer group.
+
+    Messages are delivered in order to receivers of the same group (within
+    this process); each group receives every message. The envelope of a
+    message is its offset. Messages that are not deleted are redelivered when
+    the log is re-opened (eg after a restart) or the group is rewound.
+
+    :param directory: Directory of the log.
+    :param group: Name of the consumer group.
+    :param segment_size: Size in bytes of log segment files.
+    :param idle_timeout: Stop receiving once no message has been received for
+        this many seconds; `None` waits indefinitely.
+
+    """
+
+    __slots__ = ("directory", "group_name", "segment_size", "idle_timeout", "_log")
+
+    def __init__(
+        self,
+        *,
+        directory: str,
+        group: str = "default",
+        segment_size: int = None,
+        idle_timeout: float = None,
+    ):
+        self.directory = directory
+        self.group_name = group
+        self.segment_size = segment_size
+        self.idle_timeout = idle_timeout
+        self._log = None
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.directory!r} group={self.group_name!r}>"
+
+    def _attach(self) -> SegmentedLog:
+        self._log = open_log(self.directory, segment_size=self.segment_size)
+        return self._log
+
+    @property
+    def log(self) -> SegmentedLog:
+        log = self._log
+        return log if log is not None and not log.closed else self._attach()
+
+    @property
+    def group(self) -> ConsumerGroup:
+        return self.log.group(self.group_name)
+
+    async def open(self):
+        self._attach().group(self.group_name)
+
+    async def close(self):
+        pass
+
+    async def configure(self):
+        self._attach().group(self.group_name)
+
+    async def receive_raw(self) -> AsyncGenerator[Message, None]:
+        log = self.log
+        group = self.group
+        while True:
+            record = log.read(group)
+            if record is None:
+                record = await self._wait(log, group)
+                if record is None:
+                    return
+
+            offset, body, content_type, content_encoding = record
+            yield Message(body, content_type, content_encoding, offset, self)
+
+    async def _wait(self, log: SegmentedLog, group: ConsumerGroup):
+        """
+        Wait for a message to be appended (or the idle timeout to expire).
+        """
+        loop = asyncio.get_event_loop()
+        deadline = (
+            None if self.idle_timeout is None else loop.time() + self.idle_timeout
+        )
+        while True:
+            future, waiter = _waiter(loop)
+            record = log.read(group, waiter)
+            if record is not None or log.closed:
+                return record
+
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    log.discard_waiter(waiter)
+                    return None
+
+            try:
+                await asyncio.wait_for(future, remaining)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                log.discard_waiter(waiter)
+
+    async def delete(self, message: Message):
+        self.log.ack(self.group, message.envelope)
+
+    async def delete_many(self, messages: Iterable[Message]):
+        self.log.ack(self.group, *(message.envelope for message in messages))
@@ -0,0 +1,330 @@
+"""
+In-Memory Queues
+~~~~~~~~~~~~~~~~
+
+Message queues backed by the in-process broker (see
+:mod:`pyapp_ext.messaging.memory`).
+
+Memory queues are registered like any other queue, eg::
+
+    SEND_MESSAGE_QUEUES = {
+        "jobs": (
+            "pyapp_ext.messaging.aio.memory.MemorySender",
+            {"queue_name": "jobs", "max_size": 1000},
+        ),
+        "events": (
+            "pyapp_ext.messaging.aio.memory.MemorySender",
+            {"topic": "events"},
+        ),
+    }
+
+    RECEIVE_MESSAGE_QUEUES = {
+        "jobs": (
+            "pyapp_ext.messaging.aio.memory.MemoryReceiver",
+            {"queue_name": "jobs", "visibility_timeout": 30},
+        ),
+        "audit-events": (
+            "pyapp_ext.messaging.aio.memory.MemoryReceiver",
+            {"queue_name": "audit-events", "topics": ["events"]},
+        ),
+    }
+
+"""
+import asyncio
+from typing import AsyncGenerator, Callable, Iterable, List, Optional, Sequence, Tuple
+
+from .bases import MessageSender, MessageReceiver, Message
+from ..memory import (
+    Delivery,
+    MemoryBroker,
+    MemoryItem,
+    MemoryQueue,
+    QueueFull,
+    _min_timeout,
+    broker as default_broker,
+)
+from ..serialisation import Body
+
+__all__ = ("MemorySender", "MemoryReceiver")
+
+
+def _set_result(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+def _waiter(loop: asyncio.AbstractEventLoop) -> Tuple[asyncio.Future, Callable]:
+    """
+    Future along with a thread-safe callback that completes it.
+    """
+    future = loop.create_future()
+
+    def waiter():
+        loop.call_soon_threadsafe(_set_result, future)
+
+    return future, waiter
+
+
+async def _put(queue: MemoryQueue, item: MemoryItem, timeout: Optional[float]):
+    """
+    Put an item on a queue waiting for up to `timeout` seconds for space.
+    """
+    if queue.put_or_wait(item, None):
+        return
+
+    loop = asyncio.get_event_loop()
+    deadline = None if timeout is None else loop.time() + timeout
+    while True:
+        future, waiter = _waiter(loop)
+        if queue.put_or_wait(item, waiter):
+            return
+
+        try:
+            await asyncio.wait_for(
+                future, None if deadline is None else max(deadline - loop.time(), 0)
+            )
+        except asyncio.TimeoutError:
+            raise QueueFull(f"Queue {queue.name!r} is full") from None
+        finally:
+            queue.discard_waiter(waiter)
+
+
+class MemorySender(MessageSender):
+    """
+    Send messages to a queue or publish messages to a topic of an in-memory
+    broker.
+
+    Bodies are put on the queue without being copied; the same body object is
+    shared by every queue subscribed to a topic.
+
+    :param queue_name: Name of the queue to send messages to.
+    :param topic: Name of the topic to publish messages to (instead of a queue).
+    :param max_size: Capacity of the queue; if not supplied the capacity of
+        the queue is not changed (new queues are unbounded).
+    :param timeout: Time in seconds to wait for space on a full queue before
+        raising :class:`QueueFull`; `None` waits indefinitely.
+    :param broker: Broker to use; defaults to the broker shared by the process.
+
+    """
+
+    __slots__ = ("queue_name", "topic", "max_size", "timeout", "broker", "_queue")
+
+    def __init__(
+        self,
+        *,
+        queue_name: str = None,
+        topic: str = None,
+        max_size: int = None,
+        timeout: float = None,
+        broker: MemoryBroker = None,
+    ):
+        if (queue_name is None) == (topic is None):
+            raise ValueError("One of queue_name or topic must be supplied")
+
+        self.queue_name = queue_name
+        self.topic = topic
+        self.max_size = max_size
+        self.timeout = timeout
+        self.broker = broker or default_broker
+        self._queue = None
+
+    def __repr__(self):
+        if self.topic is None:
+            return f"<{type(self).__name__} queue={self.queue_name!r}>"
+        return f"<{type(self).__name__} topic={self.topic!r}>"
+
+    def _targets(self) -> List[MemoryQueue]:
+        if self.topic is not None:
+            return self.broker.subscribers(self.topic)
+        if self._queue is None:
+            self._queue = self.broker.declare_queue(
+                self.queue_name, max_size=self.max_size
+            )
+        return [self._queue]
+
+    async def open(self):
+        self._targets()
+
+    async def close(self):
+        pass
+
+    async def configure(self):
+        self._targets()
+
+    async def send_raw(
+        self, body: Body, *, content_type: str = None, content_encoding: str = None
+    ) -> str:
+        queues = self._targets()
+        message_id, items = self.broker.items(
+            body, content_type, content_encoding, len(queues)
+        )
+        for queue, item in zip(queues, items):
+            await _put(queue, item, self.timeout)
+        return message_id
+
+    async def send_raw_many(
+        self,
+        bodies: Iterable[Body],
+        *,
+        content_type: str = None,
+        content_encoding: str = None,
+    ) -> List[str]:
+        # Puts are in-memory so there is nothing to gain from concurrent sends
+        # and sending in order preserves the order of messages.
+        return [
+            await self.send_raw(
+                body, content_type=content_type, content_encoding=content_encoding
+            )
+            for body in bodies
+        ]
+
+
+class MemoryReceiver(MessageReceiver):
+    """
+    Receive messages from a queue of an in-memory broker.
+
+    Multiple receivers of the same queue compete for messages. A received
+    message is held in-flight until it is deleted; if it is not deleted within
+    `visibility_timeout` seconds it is redelivered (to any receiver). The
+    envelope of each message is a :class:`Delivery`.
+
+    Receiving continues until the queue is closed and empty or, if an
+    `idle_timeout` is supplied, no message is received for that long.
+
+    :param queue_name: Name of the queue to receive messages from.
+    :param topics: Topics to subscribe the queue to when opened/configured.
+    :param max_size: Capacity of the queue; if not supplied the capacity of
+        the queue is not changed (new queues are unbounded).
+    :param visibility_timeout: Time in seconds a received message is held
+        before it is redelivered; `None` holds messages until deleted.
+    :param idle_timeout: Stop receiving once no message has been received for
+        this many seconds; `None` waits indefinitely.
+    :param broker: Broker to use; defaults to the broker shared by the process.
+
+    """
+
+    __slots__ = (
+        "queue_name",
+        "topics",
+        "max_size",
+        "visibility_timeout",
+        "idle_timeout",
+        "broker",
+        "_queue",
+    )
+
+    def __init__(
+        self,
+        *,
+        queue_name: str,
+        topics: Sequence[str] = (),
+        max_size: int = None,
+        visibility_timeout: Optional[float] = 30.0,
+        idle_timeout: float = None,
+        broker: MemoryBroker = None,
+    ):
+        self.queue_name = queue_name
+        self.topics = tuple(topics)
+        self.max_size = max_size
+        self.visibility_timeout = visibility_timeout
+        self.idle_timeout = idle_timeout
+        self.broker = broker or default_broker
+        self._queue = None
+
+    def __repr__(self):
+        return f"<{type(self).__name__} queue={self.queue_name!r}>"
+
+    def _declare(self) -> MemoryQueue:
+        broker = self.broker
+        self._queue = broker.declare_queue(self.queue_name, max_size=self.max_size)
+        for topic in self.topics:
+            broker.subscribe(topic, self.queue_name)
+        return self._queue
+
+    @property
+    def queue(self) -> MemoryQueue:
+        """
+        Queue messages are received from; declared (and subscribed to topics)
+        on first use.
+        """
+        return self._queue or self._declare()
+
+    async def open(self):
+        self._declare()
+
+    async def close(self):
+        pass
+
+    async def configure(self):
+        self._declare()
+
+    async def _get(self) -> Optional[Tuple[int, MemoryItem]]:
+        """
+        Wait for a message (or the idle timeout to expire).
+        """
+        queue = self.queue
+        visibility_timeout = self.visibility_timeout
+        loop = asyncio.get_event_loop()
+        deadline = (
+            None if self.idle_timeout is None else loop.time() + self.idle_timeout
+        )
+
+        while True:
+            future, waiter = _waiter(loop)
+            delivery = queue.get_or_wait(waiter, visibility_timeout)
+            if delivery is not None or queue.closed:
+                return delivery
+
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    queue.discard_waiter(waiter)
+                    return None
+
+            # Wake when an in-flight message is due to be redelivered
+            try:
+                await asyncio.wait_for(
+                    future, _min_timeout(queue.next_expiry(), remaining)
+                )
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                queue.discard_waiter(waiter)
+
+    async def receive_raw(self) -> AsyncGenerator[Message, None]:
+        queue = self.queue
+        visibility_timeout = self.visibility_timeout
+        while True:
+            delivery = queue.get_or_wait(None, visibility_timeout)
+            if delivery is None:
+                delivery = await self._get()
+                if delivery is None:
+                    return
+
+            receipt, item = delivery
+            yield Message(
+                item.body,
+                item.content_type,
+                item.content_encoding,
+                Delivery(item.message_id, receipt, item.delivery_count),
+                self,
+            )
+
+    async def delete(self, message: Message):
+        self.queue.ack(message.envelope.receipt)
+
+    async def delete_many(self, messages: Iterable[Message]):
+        self.queue.ack(*(message.envelope.receipt for message in messages))
+
+    async def release(self, message: Message):
+        """
+        Return a message to the queue to be redelivered immediately.
+        """
+        self.queue.release(message.envelope.receipt)
+
+    async def release_many(self, messages: Iterable[Message]):
+        """
+        Return messages to the queue to be redelivered immediately, in order.
+        """
+        self.queue.release(*(message.envelope.receipt for message in messages))
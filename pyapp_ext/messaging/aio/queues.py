@@ -3,11 +3,112 @@ Special Purpose Queues
 ~~~~~~~~~~~~~~~~~~~~~~
 """
 import asyncio
+import logging
+import time
 
-from typing import Sequence, AsyncGenerator
+from collections import deque
+from concurrent.futures import Executor
+from itertools import groupby
+from typing import Any, Dict, Iterable, List, Optional, Sequence, AsyncGenerator
 
 from .bases import MessageSender, MessageReceiver, Message
 from .factory import get_sender, get_receiver
+from ..serialisation import Body, Serialise
+
+LOGGER = logging.getLogger(__name__)
+
+OVERFLOW_BLOCK = "block"
+OVERFLOW_DROP_OLDEST = "drop-oldest"
+OVERFLOW_SPILL = "spill"
+OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_SPILL)
+
+
+class TargetStats:
+    """
+    Delivery statistics of a single broadcast target.
+    """
+
+    __slots__ = (
+        "name",
+        "sent",
+        "errors",
+        "dropped",
+        "spilled",
+        "last_error",
+        "latency_total",
+        "latency_max",
+    )
+
+    def __init__(self, name: str):
+        self.name = name
+        self.sent = 0
+        self.errors = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.last_error: Optional[BaseException] = None
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def __repr__(self):
+        return (
+            f"<TargetStats {self.name!r} sent={self.sent} errors={self.errors} "
+            f"dropped={self.dropped} spilled={self.spilled}>"
+        )
+
+    @property
+    def latency_mean(self) -> float:
+        """
+        Mean time in seconds taken by the target to send a message.
+        """
+        attempts = self.sent + self.errors
+        return self.latency_total / attempts if attempts else 0.0
+
+    def record(self, elapsed: float, error: BaseException = None):
+        self.latency_total += elapsed
+        if elapsed > self.latency_max:
+            self.latency_max = elapsed
+        if error is None:
+            self.sent += 1
+        else:
+            self.errors += 1
+            self.last_error = error
+
+
+class _Target:
+    """
+    Buffer and drain task of a broadcast target.
+    """
+
+    __slots__ = ("sender", "stats", "buffer", "task")
+
+    def __init__(self, name: str, sender: MessageSender):
+        self.sender = sender
+        self.stats = TargetStats(name)
+        self.buffer: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Future] = None
+
+    async def drain(self):
+        buffer = self.buffer
+        sender = self.sender
+        stats = self.stats
+        while True:
+            body, content_type, content_encoding = await buffer.get()
+            start = time.perf_counter()
+            try:
+                await sender.send_raw(
+                    body, content_type=content_type, content_encoding=content_encoding
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                stats.record(time.perf_counter() - start, ex)
+                LOGGER.warning(
+                    "Broadcast to %s failed: %s", stats.name, ex, exc_info=True
+                )
+            else:
+                stats.record(time.perf_counter() - start)
+            finally:
+                buffer.task_done()
 
 
 class BroadcastMessagePublisher(MessageSender):
@@ -18,30 +119,828 @@ class BroadcastMessagePublisher(MessageSender):
     This is useful during testing or in the case where messages only need to be
     delivered to a few listening queues.
 
+    Each target has a buffer of up to `buffer_size` messages that is drained
+    by a background task, so publishing completes once a message is buffered
+    and a slow (or failing) target does not delay delivery to the others.
+    When the buffer of a target is full the `overflow` policy applies:
+
+    - ``block``; wait for space in the buffer of that target,
+    - ``drop-oldest``; discard the oldest buffered message of that target,
+    - ``spill``; send the message to the `spill_queue` instead.
+
+    Errors raised by a target are logged and counted (along with send latency)
+    in :attr:`stats`; use :meth:`flush` to wait for buffered messages to be
+    sent.
+
     :param target_queues: Names of send message queues to publish messages to.
+    :param buffer_size: Maximum number of messages buffered for each target.
+    :param overflow: Policy applied when the buffer of a target is full.
+    :param spill_queue: Name of the send message queue that receives messages
+        that overflow with the ``spill`` policy.
 
     """
 
-    __slots__ = ("_queues",)
+    __slots__ = ("_queues", "_targets", "buffer_size", "overflow", "_spill")
+
+    def __init__(
+        self,
+        *,
+        target_queues: Sequence[str],
+        buffer_size: int = 1000,
+        overflow: str = OVERFLOW_BLOCK,
+        spill_queue: str = None,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow!r}")
+        if (overflow == OVERFLOW_SPILL) != (spill_queue is not None):
+            raise ValueError("A spill_queue is required by (only) the spill policy")
+        if buffer_size < 1:
+            raise ValueError("buffer_size must be at least 1")
 
-    def __init__(self, *, target_queues: Sequence[str]):
         self._queues = [get_sender(name) for name in target_queues]
+        self._targets = [
+            _Target(name, queue) for name, queue in zip(target_queues, self._queues)
+        ]
+        self.buffer_size = buffer_size
+        self.overflow = overflow
+        self._spill = get_sender(spill_queue) if spill_queue else None
+
+    @property
+    def stats(self) -> Dict[str, TargetStats]:
+        """
+        Delivery statistics of each target.
+        """
+        return {target.stats.name: target.stats for target in self._targets}
+
+    def buffered(self) -> Dict[str, int]:
+        """
+        Number of messages waiting to be sent to each target.
+        """
+        return {
+            target.stats.name: target.buffer.qsize() if target.buffer else 0
+            for target in self._targets
+        }
+
+    def _start(self):
+        for target in self._targets:
+            if target.task is None:
+                target.buffer = asyncio.Queue(self.buffer_size)
+                target.task = asyncio.ensure_future(target.drain())
+
+    async def flush(self):
+        """
+        Wait until all buffered messages have been sent.
+        """
+        buffers = [target.buffer for target in self._targets if target.buffer]
+        if buffers:
+            await asyncio.gather(*(buffer.join() for buffer in buffers))
+
+    def _senders(self):
+        return self._queues + [self._spill] if self._spill else self._queues
 
     async def open(self):
-        aw = [queue.open() for queue in self._queues]
+        aw = [asyncio.ensure_future(queue.open()) for queue in self._senders()]
         await asyncio.wait(aw)
+        self._start()
 
     async def close(self):
-        aw = [queue.close() for queue in self._queues]
+        await self.flush()
+        tasks = [target.task for target in self._targets if target.task]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks)
+        for target in self._targets:
+            target.task = target.buffer = None
+
+        aw = [asyncio.ensure_future(queue.close()) for queue in self._senders()]
         await asyncio.wait(aw)
 
+    async def _overflow(self, target: _Target, message: tuple):
+        buffer = target.buffer
+        if self.overflow == OVERFLOW_DROP_OLDEST:
+            while buffer.full():
+                buffer.get_nowait()
+                buffer.task_done()
+                target.stats.dropped += 1
+            buffer.put_nowait(message)
+
+        elif self.overflow == OVERFLOW_SPILL:
+            target.stats.spilled += 1
+            body, content_type, content_encoding = message
+            try:
+                await self._spill.send_raw(
+                    body, content_type=content_type, content_encoding=content_encoding
+                )
+            except Exception as ex:
+                target.stats.errors += 1
+                target.stats.last_error = ex
+                LOGGER.warning(
+                    "Spill of %s failed: %s", target.stats.name, ex, exc_info=True
+                )
+
+        else:
+            await buffer.put(message)
+
     async def send_raw(
-        self, body: bytes, *, content_type: str = None, content_encoding: str = None
+        self, body: Body, *, content_type: str = None, content_encoding: str = None
+    ):
+        self._start()
+
+        # The same body object is passed to every target (it is not copied)
+        message = (body, content_type, content_encoding)
+        overflowed = []
+        for target in self._targets:
+            if target.buffer.full():
+                overflowed.append(target)
+            else:
+                target.buffer.put_nowait(message)
+
+        for target in overflowed:
+            await self._overflow(target, message)
+
+
+def _body_size(body: Body) -> int:
+    return body.nbytes if isinstance(body, memoryview) else len(body)
+
+
+async def _release(queue: MessageReceiver, message: Message):
+    """
+    Release a message back to a queue if the queue supports it (otherwise the
+    message is redelivered once its visibility timeout expires).
+    """
+    release = getattr(queue, "release", None)
+    if release is not None:
+        result = release(message)
+        if asyncio.iscoroutine(result):
+            await result
+
+
+async def _release_many(queue: MessageReceiver, messages: List[Message]):
+    """
+    Release messages back to a queue in order, as a batch if the queue
+    supports it.
+    """
+    release_many = getattr(queue, "release_many", None)
+    if release_many is None:
+        for message in messages:
+            await _release(queue, message)
+    elif messages:
+        result = release_many(messages)
+        if asyncio.iscoroutine(result):
+            await result
+
+
+class BatchingMessageSender(MessageSender):
+    """
+    Message sender that collects sends into batches that are sent with a
+    single :meth:`MessageSender.send_raw_many` call to a target queue (the
+    bulk send path of the backend, if it has one).
+
+    A batch is sent once it holds `max_batch_size` messages or `max_bytes`
+    bytes of bodies, or `linger_ms` milliseconds after its first message was
+    added; batches are sent in order. Each send completes once its batch has
+    been sent, so concurrent producers share batches; a single producer can
+    pipeline sends with :meth:`send_raw_nowait`.
+
+    Messages with a different content type or encoding are sent in separate
+    :meth:`send_raw_many` calls (preserving the order of messages).
+
+    :param target_queue: Name of the send message queue to send batches to.
+    :param max_batch_size: Maximum number of messages in a batch.
+    :param max_bytes: Maximum size of the bodies in a batch; a message that
+        would take a batch over this size starts a new batch.
+    :param linger_ms: Time in milliseconds to wait for a batch to fill.
+
+    """
+
+    __slots__ = (
+        "_queue",
+        "max_batch_size",
+        "max_bytes",
+        "linger_ms",
+        "_batch",
+        "_batch_bytes",
+        "_linger",
+        "_sending",
+    )
+
+    def __init__(
+        self,
+        *,
+        target_queue: str,
+        max_batch_size: int = 100,
+        max_bytes: int = 1024 * 1024,
+        linger_ms: float = 5.0,
     ):
-        aw = [
-            queue.send_raw(
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+
+        self._queue = get_sender(target_queue)
+        self.max_batch_size = max_batch_size
+        self.max_bytes = max_bytes
+        self.linger_ms = linger_ms
+        self._batch = []
+        self._batch_bytes = 0
+        self._linger: Optional[asyncio.Handle] = None
+        self._sending: Optional[asyncio.Future] = None
+
+    @property
+    def serialisation(self) -> Serialise:
+        return self._queue.serialisation
+
+    @property
+    def offload_threshold(self) -> int:
+        return self._queue.offload_threshold
+
+    @property
+    def serialisation_executor(self) -> Optional[Executor]:
+        return self._queue.serialisation_executor
+
+    async def open(self):
+        await self._queue.open()
+
+    async def close(self):
+        await self.flush()
+        await self._queue.close()
+
+    async def configure(self):
+        await self._queue.configure()
+
+    def send_raw_nowait(
+        self, body: Body, *, content_type: str = None, content_encoding: str = None
+    ) -> asyncio.Future:
+        """
+        Add a message to the current batch.
+
+        :return: Future that resolves to the result of sending the message
+            once its batch has been sent.
+        """
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        size = _body_size(body)
+        if self._batch and self._batch_bytes + size > self.max_bytes:
+            # Keep batches within max_bytes (a single larger body is sent alone)
+            self._send_batch()
+
+        self._batch.append((body, content_type, content_encoding, future))
+        self._batch_bytes += size
+
+        if (
+            len(self._batch) >= self.max_batch_size
+            or self._batch_bytes >= self.max_bytes
+        ):
+            self._send_batch()
+        elif self._linger is None:
+            self._linger = loop.call_later(self.linger_ms / 1000, self._send_batch)
+        return future
+
+    async def send_raw(
+        self, body: Body, *, content_type: str = None, content_encoding: str = None
+    ) -> Any:
+        return await self.send_raw_nowait(
+            body, content_type=content_type, content_encoding=content_encoding
+        )
+
+    async def send_raw_many(
+        self,
+        bodies: Iterable[Body],
+        *,
+        content_type: str = None,
+        content_encoding: str = None,
+    ) -> List[Any]:
+        futures = [
+            self.send_raw_nowait(
                 body, content_type=content_type, content_encoding=content_encoding
             )
-            for queue in self._queues
+            for body in bodies
         ]
-        await asyncio.wait(aw)
+        return list(await asyncio.gather(*futures)) if futures else []
+
+    async def flush(self):
+        """
+        Send the current batch and wait until all batches have been sent.
+        """
+        self._send_batch()
+        while self._sending is not None:
+            await asyncio.shield(self._sending)
+
+    def _send_batch(self):
+        if self._linger is not None:
+            self._linger.cancel()
+            self._linger = None
+        if not self._batch:
+            return
+
+        batch, self._batch, self._batch_bytes = self._batch, [], 0
+        previous = self._sending
+        self._sending = sending = asyncio.ensure_future(self._send(batch, previous))
+
+        def sent(_):
+            if self._sending is sending:
+                self._sending = None
+
+        sending.add_done_callback(sent)
+
+    async def _send(self, batch: list, previous: Optional[asyncio.Future]):
+        if previous is not None:
+            # Batches are sent in order
+            await asyncio.wait((previous,))
+
+        for (content_type, content_encoding), group in groupby(
+            batch, key=lambda item: item[1:3]
+        ):
+            group = list(group)
+            try:
+                results = await self._queue.send_raw_many(
+                    [body for body, *_ in group],
+                    content_type=content_type,
+                    content_encoding=content_encoding,
+                )
+            except Exception as ex:
+                for *_, future in group:
+                    if not future.done():
+                        future.set_exception(ex)
+            else:
+                if results is None:
+                    results = [None] * len(group)
+                for (*_, future), result in zip(group, results):
+                    if not future.done():
+                        future.set_result(result)
+
+
+class PrefetchMessageReceiver(MessageReceiver):
+    """
+    Message receiver that reads ahead from a source queue into a bounded
+    buffer while received messages are being handled, hiding the latency of
+    the broker behind processing time.
+
+    The buffer holds at most `max_messages` messages and stops filling once it
+    holds `max_bytes` bytes of bodies (a single message larger than
+    `max_bytes` is still received).
+
+    If a `visibility_timeout` is supplied (this should match the source
+    queue) the time taken to handle each message is tracked and the buffer is
+    limited to the messages that can be handled before they become visible
+    again. A buffered message that is too old to be handled before its
+    visibility timeout expires is not yielded; it is released back to the
+    source queue (if the source supports releasing messages) or left to be
+    redelivered. Once handling a message takes longer than the visibility
+    timeout nothing is prefetched; each message is fetched when it is
+    requested.
+
+    Buffered messages are released when the receiver is closed.
+
+    :param source_queue: Name of the receive message queue to read from.
+    :param max_messages: Maximum number of messages buffered.
+    :param max_bytes: Size of buffered bodies at which the buffer stops filling.
+    :param visibility_timeout: Time in seconds a received message remains
+        hidden from other receivers of the source queue.
+
+    """
+
+    __slots__ = (
+        "_queue",
+        "max_messages",
+        "max_bytes",
+        "visibility_timeout",
+        "expired",
+        "_buffer",
+        "_buffer_bytes",
+        "_handle_time",
+        "_taken_at",
+        "_task",
+        "_error",
+        "_ready",
+        "_space",
+        "_waiting",
+    )
+
+    def __init__(
+        self,
+        *,
+        source_queue: str,
+        max_messages: int = 10,
+        max_bytes: int = 4 * 1024 * 1024,
+        visibility_timeout: float = None,
+    ):
+        if max_messages < 1:
+            raise ValueError("max_messages must be at least 1")
+
+        self._queue = get_receiver(source_queue)
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.visibility_timeout = visibility_timeout
+        self.expired = 0
+        self._buffer = deque()
+        self._buffer_bytes = 0
+        self._handle_time = 0.0
+        self._taken_at = None
+        self._task: Optional[asyncio.Future] = None
+        self._error: Optional[BaseException] = None
+        self._ready: Optional[asyncio.Event] = None
+        self._space: Optional[asyncio.Event] = None
+        self._waiting = False
+
+    @property
+    def serialisation(self) -> Serialise:
+        return self._queue.serialisation
+
+    @property
+    def buffered(self) -> int:
+        """
+        Number of messages in the buffer.
+        """
+        return len(self._buffer)
+
+    @property
+    def buffered_bytes(self) -> int:
+        """
+        Size of the bodies of messages in the buffer.
+        """
+        return self._buffer_bytes
+
+    @property
+    def handle_time(self) -> float:
+        """
+        Moving average of the time in seconds taken to handle a message.
+        """
+        return self._handle_time
+
+    async def open(self):
+        await self._queue.open()
+        self._start()
+
+    async def close(self):
+        task = self._task
+        if task is not None:
+            task.cancel()
+            await asyncio.wait((task,))
+            self._task = None
+
+        buffered = [message for message, _ in self._buffer]
+        self._buffer.clear()
+        self._buffer_bytes = 0
+        await _release_many(self._queue, buffered)
+        await self._queue.close()
+
+    async def configure(self):
+        await self._queue.configure()
+
+    def _start(self):
+        if self._task is None:
+            self._ready = asyncio.Event()
+            self._space = asyncio.Event()
+            self._error = None
+            self._task = asyncio.ensure_future(self._prefetch())
+
+    def _full(self) -> bool:
+        buffered = len(self._buffer)
+        timeout = self.visibility_timeout
+        if timeout is not None and self._handle_time >= timeout:
+            # Any prefetched message would expire before it could be handled;
+            # fetch only when a reader is waiting for a message.
+            return buffered > 0 or not self._waiting
+        if not buffered:
+            return False
+        if buffered >= self.max_messages or self._buffer_bytes >= self.max_bytes:
+            return True
+
+        # Only prefetch messages that can be handled before they expire
+        return timeout is not None and (buffered + 1) * self._handle_time >= timeout
+
+    async def _prefetch(self):
+        loop = asyncio.get_event_loop()
+        messages = self._queue.receive_raw()
+        try:
+            while True:
+                while self._full():
+                    self._space.clear()
+                    await self._space.wait()
+
+                try:
+                    message = await messages.__anext__()
+                except StopAsyncIteration:
+                    break
+                self._buffer.append((message, loop.time()))
+                self._buffer_bytes += _body_size(message.body)
+                self._ready.set()
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            self._error = ex
+        finally:
+            await messages.aclose()
+            # Wake readers so the end of the source (or an error) is seen
+            self._ready.set()
+
+    def _expired(self, age: float) -> bool:
+        timeout = self.visibility_timeout
+        if timeout is None:
+            return False
+        if age >= timeout:
+            return True
+        # A message that cannot be handled before it expires is skipped unless
+        # handlers are slower than the timeout (no message can be handled in
+        # time, so each is handled as soon as it is fetched).
+        handle_time = self._handle_time
+        return handle_time < timeout and age + handle_time >= timeout
+
+    async def _take(self) -> Optional[Message]:
+        loop = asyncio.get_event_loop()
+        now = loop.time()
+        if self._taken_at is not None:
+            # Time since the previous message was yielded is spent handling it
+            elapsed = now - self._taken_at
+            if self._handle_time:
+                elapsed = 0.8 * self._handle_time + 0.2 * elapsed
+            self._handle_time = elapsed
+            self._taken_at = None
+
+        buffer = self._buffer
+        while True:
+            while not buffer:
+                if self._task is None or self._task.done():
+                    if self._error is not None:
+                        raise self._error
+                    return None
+                # Request a fetch (required when fetching on demand)
+                self._waiting = True
+                self._space.set()
+                self._ready.clear()
+                try:
+                    await self._ready.wait()
+                finally:
+                    self._waiting = False
+
+            message, received_at = buffer.popleft()
+            self._buffer_bytes -= _body_size(message.body)
+            self._space.set()
+
+            now = loop.time()
+            if self._expired(now - received_at):
+                self.expired += 1
+                await _release(self._queue, message)
+                continue
+
+            self._taken_at = now
+            return message._replace(queue=self)
+
+    async def receive_raw(self) -> AsyncGenerator[Message, None]:
+        self._start()
+        while True:
+            message = await self._take()
+            if message is None:
+                return
+            yield message
+
+    async def delete(self, message: Message):
+        await self._queue.delete(message)
+
+    async def delete_many(self, messages: Iterable[Message]):
+        await self._queue.delete_many(messages)
+
+
+def _credit_key(message: Message) -> Any:
+    """
+    Identity of a received message that is shared by re-wrapped copies (see
+    :meth:`Message._replace`); the envelope if it is hashable.
+    """
+    envelope = message.envelope
+    if envelope is None:
+        return ("body", id(message.body))
+    try:
+        hash(envelope)
+    except TypeError:
+        return ("envelope", id(envelope))
+    return envelope
+
+
+class FlowControlledReceiver(MessageReceiver):
+    """
+    Message receiver that limits the messages (and bytes of message bodies)
+    received from a source queue that are in-flight, ie received but not yet
+    deleted; receiving from the source pauses while either limit is reached.
+
+    Each received message takes a credit that is returned once the message is
+    deleted (or released). If a `visibility_timeout` is supplied (this should
+    match the source queue) the credit of a message that has not been deleted
+    in that time is also returned as the message will be redelivered.
+
+    Limits are checked before a message is received, so the byte limit may be
+    exceeded by the body of a single message; a message is always received if
+    none are in-flight.
+
+    :param source_queue: Name of the receive message queue to read from.
+    :param max_in_flight: Maximum number of in-flight messages.
+    :param max_in_flight_bytes: Maximum size of in-flight message bodies.
+    :param visibility_timeout: Time in seconds a received message remains
+        hidden from other receivers of the source queue.
+
+    """
+
+    __slots__ = (
+        "_queue",
+        "max_in_flight",
+        "max_in_flight_bytes",
+        "visibility_timeout",
+        "peak_in_flight",
+        "peak_in_flight_bytes",
+        "pauses",
+        "paused_time",
+        "expired",
+        "_in_flight",
+        "_in_flight_bytes",
+        "_paused",
+        "_credit",
+    )
+
+    def __init__(
+        self,
+        *,
+        source_queue: str,
+        max_in_flight: int = None,
+        max_in_flight_bytes: int = None,
+        visibility_timeout: float = None,
+    ):
+        self._queue = get_receiver(source_queue)
+        self.max_in_flight = max_in_flight
+        self.max_in_flight_bytes = max_in_flight_bytes
+        self.visibility_timeout = visibility_timeout
+        self.peak_in_flight = 0
+        self.peak_in_flight_bytes = 0
+        self.pauses = 0
+        self.paused_time = 0.0
+        self.expired = 0
+        self._in_flight = {}
+        self._in_flight_bytes = 0
+        self._paused = False
+        self._credit: Optional[asyncio.Event] = None
+
+    @property
+    def serialisation(self) -> Serialise:
+        return self._queue.serialisation
+
+    @property
+    def in_flight(self) -> int:
+        """
+        Number of messages received and not yet deleted.
+        """
+        return len(self._in_flight)
+
+    @property
+    def in_flight_bytes(self) -> int:
+        """
+        Size of the bodies of messages received and not yet deleted.
+        """
+        return self._in_flight_bytes
+
+    @property
+    def paused(self) -> bool:
+        """
+        Receiving is paused waiting for in-flight messages to be deleted.
+        """
+        return self._paused
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Snapshot of the flow control counters (eg for export as metrics).
+        """
+        return {
+            "in_flight": self.in_flight,
+            "in_flight_bytes": self._in_flight_bytes,
+            "peak_in_flight": self.peak_in_flight,
+            "peak_in_flight_bytes": self.peak_in_flight_bytes,
+            "paused": self._paused,
+            "pauses": self.pauses,
+            "paused_time": self.paused_time,
+            "expired": self.expired,
+        }
+
+    async def open(self):
+        await self._queue.open()
+
+    async def close(self):
+        await self._queue.close()
+
+    async def configure(self):
+        await self._queue.configure()
+
+    def _has_credit(self) -> bool:
+        count = len(self._in_flight)
+        if not count:
+            return True
+        if self.max_in_flight is not None and count >= self.max_in_flight:
+            return False
+        limit = self.max_in_flight_bytes
+        return limit is None or self._in_flight_bytes < limit
+
+    def _expire(self, now: float) -> Optional[float]:
+        """
+        Return the credit of messages whose visibility timeout has expired.
+
+        :return: Time the next in-flight message expires.
+        """
+        next_expiry = None
+        for key, (message, size, expires) in list(self._in_flight.items()):
+            if expires is None:
+                continue
+            if expires <= now:
+                del self._in_flight[key]
+                self._in_flight_bytes -= size
+                self.expired += 1
+            elif next_expiry is None or expires < next_expiry:
+                next_expiry = expires
+        return next_expiry
+
+    async def _wait_for_credit(self):
+        loop = asyncio.get_event_loop()
+        start = None
+        try:
+            while True:
+                next_expiry = self._expire(loop.time())
+                if self._has_credit():
+                    return
+
+                if start is None:
+                    start = loop.time()
+                    self._paused = True
+                    self.pauses += 1
+
+                self._credit.clear()
+                timeout = None
+                if next_expiry is not None:
+                    timeout = max(next_expiry - loop.time(), 0)
+                try:
+                    await asyncio.wait_for(self._credit.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if start is not None:
+                self._paused = False
+                self.paused_time += loop.time() - start
+
+    def _acquire(self, message: Message):
+        size = _body_size(message.body)
+        expires = None
+        if self.visibility_timeout is not None:
+            expires = asyncio.get_event_loop().time() + self.visibility_timeout
+        previous = self._in_flight.get(_credit_key(message))
+        if previous is not None:
+            self._in_flight_bytes -= previous[1]
+        self._in_flight[_credit_key(message)] = (message, size, expires)
+        self._in_flight_bytes += size
+        self.peak_in_flight = max(self.peak_in_flight, len(self._in_flight))
+        self.peak_in_flight_bytes = max(
+            self.peak_in_flight_bytes, self._in_flight_bytes
+        )
+
+    def _return_credit(self, message: Message):
+        entry = self._in_flight.pop(_credit_key(message), None)
+        if entry is not None:
+            self._in_flight_bytes -= entry[1]
+            if self._credit is not None:
+                self._credit.set()
+
+    async def receive_raw(self) -> AsyncGenerator[Message, None]:
+        if self._credit is None:
+            self._credit = asyncio.Event()
+
+        messages = self._queue.receive_raw()
+        try:
+            while True:
+                await self._wait_for_credit()
+                try:
+                    message = await messages.__anext__()
+                except StopAsyncIteration:
+                    return
+
+                message = message._replace(queue=self)
+                self._acquire(message)
+                yield message
+        finally:
+            await messages.aclose()
+
+    async def delete(self, message: Message):
+        try:
+            await self._queue.delete(message)
+        finally:
+            self._return_credit(message)
+
+    async def delete_many(self, messages: Iterable[Message]):
+        messages = list(messages)
+        try:
+            await self._queue.delete_many(messages)
+        finally:
+            for message in messages:
+                self._return_credit(message)
+
+    async def release(self, message: Message):
+        """
+        Return the credit of a message that will not be deleted; the message
+        is also released to the source queue if the source supports it.
+        """
+        try:
+            await _release(self._queue, message)
+        finally:
+            self._return_credit(message)
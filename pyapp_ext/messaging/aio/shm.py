@@ -0,0 +1,183 @@
+"""
+Shared Memory Queues
+~~~~~~~~~~~~~~~~~~~~
+
+Message queues for processes on the same host backed by a shared memory ring
+buffer (see :mod:`pyapp_ext.messaging.shm`), eg::
+
+    SEND_MESSAGE_QUEUES = {
+        "jobs": (
+            "pyapp_ext.messaging.aio.shm.SharedMemorySender",
+            {"name": "jobs", "capacity": 64 * 1024 * 1024},
+        ),
+    }
+
+    RECEIVE_MESSAGE_QUEUES = {
+        "jobs": ("pyapp_ext.messaging.aio.shm.SharedMemoryReceiver", {"name": "jobs"}),
+    }
+
+Receivers wait on the ring's notification FIFO with the event loop so no
+thread is blocked. Rings are shared with the Synchronous shared memory queues.
+
+"""
+import asyncio
+from typing import AsyncGenerator
+
+from .bases import MessageSender, MessageReceiver, Message
+from ..exceptions import QueueFull
+from ..serialisation import Body
+from ..shm import SharedMemoryRing, DEFAULT_CAPACITY
+
+__all__ = ("SharedMemorySender", "SharedMemoryReceiver")
+
+
+def _set_result(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+async def _wait_readable(fd: int, timeout: float = None) -> bool:
+    """
+    Wait for a file descriptor to become readable.
+    """
+    loop = asyncio.get_event_loop()
+    future = loop.create_future()
+    loop.add_reader(fd, _set_result, future)
+    try:
+        await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        loop.remove_reader(fd)
+    return True
+
+
+class SharedMemorySender(MessageSender):
+    """
+    Send messages to a shared memory ring.
+
+    When the ring is full sending waits (polling with a short back-off) for
+    receivers to free space.
+
+    :param name: Name of the ring.
+    :param capacity: Size in bytes of the ring if it is created.
+    :param timeout: Time in seconds to wait for space in a full ring before
+        raising :class:`QueueFull`; `None` waits indefinitely.
+    :param directory: Directory for the ring lock file and FIFO.
+
+    """
+
+    __slots__ = ("ring", "timeout")
+
+    def __init__(
+        self,
+        *,
+        name: str,
+        capacity: int = DEFAULT_CAPACITY,
+        timeout: float = None,
+        directory: str = None,
+    ):
+        self.ring = SharedMemoryRing(name, capacity=capacity, directory=directory)
+        self.timeout = timeout
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.ring.name!r}>"
+
+    async def open(self):
+        self.ring.open()
+
+    async def close(self):
+        self.ring.close()
+
+    async def configure(self):
+        self.ring.open()
+
+    async def send_raw(
+        self, body: Body, *, content_type: str = None, content_encoding: str = None
+    ):
+        ring = self.ring
+        if not ring.is_open:
+            ring.open()
+        if ring.put(body, content_type, content_encoding):
+            return
+
+        loop = asyncio.get_event_loop()
+        deadline = None if self.timeout is None else loop.time() + self.timeout
+        delay = 0.0001
+        while not ring.put(body, content_type, content_encoding):
+            if deadline is not None and loop.time() >= deadline:
+                raise QueueFull(f"Shared memory ring {ring.name!r} is full")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.01)
+
+
+class SharedMemoryReceiver(MessageReceiver):
+    """
+    Receive messages from a shared memory ring.
+
+    Multiple receivers (in any process) compete for messages. Messages are
+    removed from the ring as they are received so :meth:`delete` has nothing
+    to do; messages are not redelivered if a receiver fails.
+
+    :param name: Name of the ring.
+    :param capacity: Size in bytes of the ring if it is created.
+    :param idle_timeout: Stop receiving once no message has been received for
+        this many seconds; `None` waits indefinitely.
+    :param directory: Directory for the ring lock file and FIFO.
+
+    """
+
+    __slots__ = ("ring", "idle_timeout")
+
+    def __init__(
+        self,
+        *,
+        name: str,
+        capacity: int = DEFAULT_CAPACITY,
+        idle_timeout: float = None,
+        directory: str = None,
+    ):
+        self.ring = SharedMemoryRing(name, capacity=capacity, directory=directory)
+        self.idle_timeout = idle_timeout
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.ring.name!r}>"
+
+    async def open(self):
+        self.ring.open()
+
+    async def close(self):
+        self.ring.close()
+
+    async def configure(self):
+        self.ring.open()
+
+    async def receive_raw(self) -> AsyncGenerator[Message, None]:
+        ring = self.ring
+        if not ring.is_open:
+            ring.open()
+
+        loop = asyncio.get_event_loop()
+        idle_timeout = self.idle_timeout
+        deadline = None
+        while True:
+            message = ring.get()
+            if message is not None:
+                deadline = None
+                body, content_type, content_encoding = message
+                yield Message(body, content_type, content_encoding, None, self)
+                continue
+
+            timeout = None
+            if idle_timeout is not None:
+                now = loop.time()
+                if deadline is None:
+                    deadline = now + idle_timeout
+                timeout = max(deadline - now, 0)
+
+            if not await _wait_readable(ring.notify_fd, timeout):
+                return
+            ring.consume_notification()
+
+    async def delete(self, message: Message):
+        pass
@@ -0,0 +1,266 @@
+"""
+SQLite Queues
+~~~~~~~~~~~~~
+
+Persistent message queues for nodes without a broker backed by an SQLite
+database (see :mod:`pyapp_ext.messaging.sqlite`), eg::
+
+    SEND_MESSAGE_QUEUES = {
+        "jobs": (
+            "pyapp_ext.messaging.aio.sqlite.SQLiteSender",
+            {"path": "/var/lib/myapp/queues.db", "queue_name": "jobs"},
+        ),
+    }
+
+    RECEIVE_MESSAGE_QUEUES = {
+        "jobs": (
+            "pyapp_ext.messaging.aio.sqlite.SQLiteReceiver",
+            {"path": "/var/lib/myapp/queues.db", "queue_name": "jobs"},
+        ),
+    }
+
+Create the schema with the ``messaging configure`` command (or by calling
+:meth:`configure`). Database calls are made in an executor so the event loop
+is not blocked.
+
+"""
+import asyncio
+from functools import partial
+from typing import AsyncGenerator, Iterable, List
+
+from .bases import MessageSender, MessageReceiver, Message
+from ..serialisation import Body
+from ..sqlite import SQLiteStore
+
+__all__ = ("SQLiteSender", "SQLiteReceiver")
+
+
+async def _run(func, *args, **kwargs):
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, partial(func, *args, **kwargs))
+
+
+class SQLiteSender(MessageSender):
+    """
+    Send messages to a queue stored in an SQLite database.
+
+    Sends made while a commit is pending (or within `commit_window` seconds of
+    the first) are inserted in a single transaction (group commit); each send
+    completes once its transaction is committed.
+
+    :param path: Path of the database file.
+    :param queue_name: Name of the queue within the database.
+    :param commit_window: Time in seconds to wait for further sends to join
+        a transaction; `0` only groups sends made in the same loop iteration.
+    :param synchronous: SQLite synchronous mode (see :class:`SQLiteStore`).
+    :param busy_timeout: Time in seconds to wait for a locked database.
+
+    """
+
+    __slots__ = ("store", "queue_name", "commit_window", "_pending", "_commit")
+
+    def __init__(
+        self,
+        *,
+        path: str,
+        queue_name: str = "default",
+        commit_window: float = 0.0,
+        synchronous: str = "NORMAL",
+        busy_timeout: float = 5.0,
+    ):
+        self.store = SQLiteStore(
+            path, synchronous=synchronous, busy_timeout=busy_timeout
+        )
+        self.queue_name = queue_name
+        self.commit_window = commit_window
+        self._pending = []
+        self._commit = None
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.store.path!r} queue={self.queue_name!r}>"
+
+    async def open(self):
+        await _run(self.store.create_schema)
+
+    async def close(self):
+        if self._commit is not None:
+            await asyncio.shield(self._commit)
+        await _run(self.store.close)
+
+    async def configure(self):
+        await _run(self.store.create_schema)
+
+    async def send_raw(
+        self, body: Body, *, content_type: str = None, content_encoding: str = None
+    ) -> int:
+        future = asyncio.get_event_loop().create_future()
+        self._pending.append(((body, content_type, content_encoding), future))
+        if self._commit is None:
+            self._commit = asyncio.ensure_future(self._commit_pending())
+        return await future
+
+    async def _commit_pending(self):
+        """
+        Insert pending messages in a single transaction.
+        """
+        try:
+            await asyncio.sleep(self.commit_window)
+            while self._pending:
+                batch, self._pending = self._pending, []
+                try:
+                    ids = await _run(
+                        self.store.insert_many,
+                        self.queue_name,
+                        [message for message, _ in batch],
+                    )
+                except Exception as ex:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(ex)
+                else:
+                    for (_, future), id_ in zip(batch, ids):
+                        if not future.done():
+                            future.set_result(id_)
+        finally:
+            self._commit = None
+
+    async def send_raw_many(
+        self,
+        bodies: Iterable[Body],
+        *,
+        content_type: str = None,
+        content_encoding: str = None,
+    ) -> List[int]:
+        return await _run(
+            self.store.insert_many,
+            self.queue_name,
+            [(body, content_type, content_encoding) for body in bodies],
+        )
+
+
+class SQLiteReceiver(MessageReceiver):
+    """
+    Receive messages from a queue stored in an SQLite database.
+
+    Messages are claimed in batches of up to `batch_size` with a lease of
+    `visibility_timeout` seconds; messages that are not deleted before their
+    lease expires are redelivered (to any receiver in any process). The
+    envelope of a message is its :class:`Lease`. SQLite does not notify
+    receivers of new messages so an empty queue is polled, backing off up to
+    `poll_interval` seconds.
+
+    Deleted messages are marked as acknowledged and removed in bulk at most
+    every `vacuum_interval` seconds.
+
+    :param path: Path of the database file.
+    :param queue_name: Name of the queue within the database.
+    :param visibility_timeout: Lease time in seconds of a claimed message.
+    :param batch_size: Maximum number of messages claimed at once.
+    :param poll_interval: Maximum time in seconds between polls of an empty
+        queue.
+    :param idle_timeout: Stop receiving once no message has been received for
+        this many seconds; `None` waits indefinitely.
+    :param vacuum_interval: Minimum time in seconds between removing
+        acknowledged messages.
+    :param synchronous: SQLite synchronous mode (see :class:`SQLiteStore`).
+    :param busy_timeout: Time in seconds to wait for a locked database.
+
+    """
+
+    __slots__ = (
+        "store",
+        "queue_name",
+        "visibility_timeout",
+        "batch_size",
+        "poll_interval",
+        "idle_timeout",
+    )
+
+    def __init__(
+        self,
+        *,
+        path: str,
+        queue_name: str = "default",
+        visibility_timeout: float = 30.0,
+        batch_size: int = 10,
+        poll_interval: float = 0.5,
+        idle_timeout: float = None,
+        vacuum_interval: float = 60.0,
+        synchronous: str = "NORMAL",
+        busy_timeout: float = 5.0,
+    ):
+        self.store = SQLiteStore(
+            path,
+            synchronous=synchronous,
+            busy_timeout=busy_timeout,
+            vacuum_interval=vacuum_interval,
+        )
+        self.queue_name = queue_name
+        self.visibility_timeout = visibility_timeout
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.store.path!r} queue={self.queue_name!r}>"
+
+    async def open(self):
+        await _run(self.store.create_schema)
+
+    async def close(self):
+        await _run(self.store.close)
+
+    async def configure(self):
+        await _run(self.store.create_schema)
+
+    async def receive_raw(self) -> AsyncGenerator[Message, None]:
+        loop = asyncio.get_event_loop()
+        store = self.store
+        delay = 0.01
+        deadline = None
+        while True:
+            rows = await _run(
+                store.claim, self.queue_name, self.batch_size, self.visibility_timeout
+            )
+            if rows:
+                delay = 0.01
+                deadline = None
+                yielded = 0
+                try:
+                    for lease, body, content_type, content_encoding in rows:
+                        yielded += 1
+                        yield Message(body, content_type, content_encoding, lease, self)
+                finally:
+                    # Rows claimed but not handed out (eg receive_batch only
+                    # needed some of them) are released rather than left
+                    # leased until their visibility timeout expires.
+                    unyielded = [lease for lease, *_ in rows[yielded:]]
+                    if unyielded:
+                        await _run(store.release_many, unyielded)
+                continue
+
+            if self.idle_timeout is not None:
+                now = loop.time()
+                if deadline is None:
+                    deadline = now + self.idle_timeout
+                if now >= deadline:
+                    return
+                delay = min(delay, deadline - now)
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.poll_interval)
+
+    async def delete(self, message: Message):
+        await self.delete_many((message,))
+
+    async def delete_many(self, messages: Iterable[Message]):
+        store = self.store
+        leases = [message.envelope for message in messages]
+        await _run(store.ack, leases)
+        await _run(store.maybe_vacuum)
+
+    async def release(self, message: Message):
+        """
+        Return a message to the queue to be redelivered immediately.
+        """
+        await _run(self.store.release, message.envelope)
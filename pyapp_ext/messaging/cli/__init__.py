@@ -16,6 +16,7 @@ from pyapp.exceptions import NotFound, CannotImport
 
 from pyapp_ext.messaging.aio import factory
 from ..exceptions import QueueNotFound
+from ..serialisation import train_zstd_dictionary
 
 LOGGER = logging.getLogger(__name__)
 
@@ -103,7 +104,7 @@ class Extension:
                     print(
                         f"\n----\nFrom: {msg.queue!r}\nContent:", file=opts.out
                     )
-                    pprint(msg.content, stream=opts.out)
+                    pprint(await msg.acontent(), stream=opts.out)
 
         except QueueNotFound:
             LOGGER.error("Queue not found.")
@@ -174,6 +175,51 @@ class Extension:
                 )
             print()
 
+    @staticmethod
+    @argument("OUTPUT", type=FileType("wb"), help_text="File to write dictionary to.")
+    @argument(
+        "SAMPLES",
+        nargs="+",
+        type=FileType("rb"),
+        help_text="Files each containing a sample message body.",
+    )
+    @argument(
+        "--size",
+        type=int,
+        default=16 * 1024,
+        help_text="Maximum size of the dictionary in bytes.",
+    )
+    @argument(
+        "--dict-id",
+        type=int,
+        default=0,
+        help_text="ID (version) of the dictionary; defaults to a random ID.",
+    )
+    def train_dictionary(opts: CommandOptions):
+        """
+        Train a Zstandard compression dictionary from sample message bodies.
+        """
+        samples = [sample.read() for sample in opts.SAMPLES]
+
+        try:
+            dictionary = train_zstd_dictionary(
+                samples, size=opts.size, dict_id=opts.dict_id
+            )
+        except ImportError as ex:
+            LOGGER.error(str(ex))
+            return 10
+
+        except Exception as ex:
+            LOGGER.error(f"Unable to train dictionary: {ex}")
+            return 30
+
+        opts.OUTPUT.write(dictionary.as_bytes())
+        print(
+            f"Trained dictionary {Fore.BLUE}{dictionary.dict_id()}{Fore.RESET} "
+            f"from {len(samples)} samples"
+        )
+        return 0
+
     @staticmethod
     def register_commands(root: CommandGroup):
         group = root.create_command_group("messaging")
@@ -182,3 +228,4 @@ class Extension:
         group.command(Extension.listen)
         group.command(Extension.configure)
         group.command(Extension.queues)
+        group.command(Extension.train_dictionary, name="train-dictionary")
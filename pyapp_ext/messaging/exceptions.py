@@ -22,3 +22,15 @@ class ClientError(MessagingError):
 
     This is to provide a generic response exception type.
     """
+
+
+class QueueFull(MessagingError):
+    """
+    Queue is at capacity and space did not become available in time.
+    """
+
+
+class QueueClosed(MessagingError):
+    """
+    Queue has been closed and no longer accepts messages.
+    """
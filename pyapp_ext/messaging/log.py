@@ -0,0 +1,680 @@
+"""
+Segmented Log
+~~~~~~~~~~~~~
+
+Durable append-only message log used by the AsyncIO and Synchronous log
+queues (see :mod:`pyapp_ext.messaging.aio.log` and
+:mod:`pyapp_ext.messaging.sio.log`).
+
+Messages are appended to fixed size, memory-mapped segment files in a
+directory; each message is assigned an ever increasing offset. Consumer
+groups track the offset below which every message has been acknowledged so
+unacknowledged messages are redelivered after a restart, and segments whose
+messages have been acknowledged by every group are removed (compacted).
+
+Appends are written to the memory map and made durable by :meth:`SegmentedLog.sync`;
+senders wait for a sync shared by every append made within a configurable
+durability window (group commit). Bodies are read as zero-copy views of the
+memory map.
+
+A log directory is owned by a single process; queues in that process share
+the log through :func:`open_log`.
+
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .exceptions import MessagingError
+from .serialisation import Body
+
+__all__ = (
+    "Segment",
+    "Cursor",
+    "ConsumerGroup",
+    "SegmentedLog",
+    "open_log",
+    "DEFAULT_SEGMENT_SIZE",
+)
+
+DEFAULT_SEGMENT_SIZE = 64 * 1024 * 1024
+
+MAGIC = b"PYML"
+VERSION = 1
+SEGMENT_HEADER = struct.Struct("<4sIQ")  # Magic, version, base offset
+RECORD = struct.Struct("<IIIHH")  # Record size, CRC, flags, type/encoding length
+RECORD_PREFIX = struct.Struct("<II")  # Record size, CRC
+CRC_START = RECORD_PREFIX.size  # CRC covers the record from the flags field
+FLAG_STR = 0x01
+OFFSET = struct.Struct("<Q")
+
+SEGMENT_SUFFIX = ".log"
+GROUP_SUFFIX = ".offset"
+
+Record = Tuple[int, Body, Optional[str], Optional[str]]
+Waiter = Callable[[], None]
+
+
+def _fsync_directory(directory: str):
+    """
+    Ensure directory entries (eg a new segment) are durable.
+    """
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Segment:
+    """
+    Memory-mapped segment file holding consecutive messages starting at
+    `base_offset`.
+    """
+
+    __slots__ = (
+        "path",
+        "base_offset",
+        "count",
+        "write_position",
+        "_file",
+        "_mm",
+        "_dirty_start",
+        "_dirty_end",
+    )
+
+    def __init__(self, path: str, base_offset: int, file, mm: mmap.mmap):
+        self.path = path
+        self.base_offset = base_offset
+        self.count = 0
+        self.write_position = SEGMENT_HEADER.size
+        self._file = file
+        self._mm = mm
+        self._dirty_start = self._dirty_end = 0
+
+    def __repr__(self):
+        return f"<Segment {self.base_offset} count={self.count}>"
+
+    @classmethod
+    def create(cls, directory: str, base_offset: int, size: int) -> "Segment":
+        path = os.path.join(directory, f"{base_offset:020d}{SEGMENT_SUFFIX}")
+        file = open(path, "w+b")
+        file.truncate(size)
+        mm = mmap.mmap(file.fileno(), size)
+        SEGMENT_HEADER.pack_into(mm, 0, MAGIC, VERSION, base_offset)
+        mm.flush(0, SEGMENT_HEADER.size)
+        _fsync_directory(directory)
+        return cls(path, base_offset, file, mm)
+
+    @classmethod
+    def load(cls, path: str) -> "Segment":
+        """
+        Open an existing segment, scanning records to find the end of the
+        segment; a partially written record (failing its CRC) ends the
+        segment.
+        """
+        file = open(path, "r+b")
+        mm = mmap.mmap(file.fileno(), 0)
+        magic, version, base_offset = SEGMENT_HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or version != VERSION:
+            mm.close()
+            file.close()
+            raise MessagingError(f"{path} is not a message log segment")
+
+        segment = cls(path, base_offset, file, mm)
+        position = SEGMENT_HEADER.size
+        while True:
+            record = segment._record(position, verify=True)
+            if record is None:
+                break
+            position = record[0]
+            segment.count += 1
+        segment.write_position = position
+        return segment
+
+    @property
+    def size(self) -> int:
+        return len(self._mm)
+
+    @property
+    def next_offset(self) -> int:
+        return self.base_offset + self.count
+
+    def append(
+        self, body: memoryview, flags: int, content_type: bytes, content_encoding: bytes
+    ) -> bool:
+        """
+        Append a record; returns `False` if the segment does not have space.
+        """
+        mm = self._mm
+        start = self.write_position
+        size = RECORD.size + len(content_type) + len(content_encoding) + len(body)
+        if start + size > len(mm):
+            return False
+
+        position = start + RECORD.size
+        for data in (content_type, content_encoding, body):
+            mm[position : position + len(data)] = data
+            position += len(data)
+
+        # The size is written last so a partial record is never seen as valid
+        RECORD.pack_into(
+            mm, start, 0, 0, flags, len(content_type), len(content_encoding)
+        )
+        crc = zlib.crc32(memoryview(mm)[start + CRC_START : start + size])
+        RECORD_PREFIX.pack_into(mm, start, size, crc)
+        self.write_position = start + size
+        self.count += 1
+        if self._dirty_end <= self._dirty_start:
+            self._dirty_start = start
+        self._dirty_end = self.write_position
+        return True
+
+    def _record(self, position: int, verify: bool = False):
+        mm = self._mm
+        if position + RECORD.size > len(mm):
+            return None
+        size, crc, flags, type_size, encoding_size = RECORD.unpack_from(mm, position)
+        if size < RECORD.size or position + size > len(mm):
+            return None
+        if verify:
+            if (
+                zlib.crc32(memoryview(mm)[position + CRC_START : position + size])
+                != crc
+            ):
+                return None
+        return position + size, flags, type_size, encoding_size
+
+    def read(self, position: int) -> Optional[Tuple[int, Body, str, str]]:
+        """
+        Read the record at a position.
+
+        :return: Position of the next record, body (a view of the segment),
+            content type and encoding; or `None` at the end of the segment.
+        """
+        if position >= self.write_position:
+            return None
+
+        next_position, flags, type_size, encoding_size = self._record(position)
+        view = memoryview(self._mm)
+        position += RECORD.size
+        content_type = bytes(view[position : position + type_size]).decode()
+        position += type_size
+        content_encoding = bytes(view[position : position + encoding_size]).decode()
+        body = view[position + encoding_size : next_position]
+        if flags & FLAG_STR:
+            body = str(body, "utf8")
+        return next_position, body, content_type or None, content_encoding or None
+
+    def dirty(self) -> Optional[Tuple[int, int]]:
+        """
+        Range written since the last call (which is then considered clean).
+        """
+        if self._dirty_end <= self._dirty_start:
+            return None
+        dirty = self._dirty_start, self._dirty_end
+        self._dirty_start = self._dirty_end
+        return dirty
+
+    def flush(self, start: int, end: int):
+        # Flush offsets must be aligned to the allocation granularity
+        start -= start % mmap.ALLOCATIONGRANULARITY
+        try:
+            self._mm.flush(start, end - start)
+        except ValueError:
+            # Segment was closed (compacted) in the mean time
+            pass
+
+    def close(self):
+        try:
+            self._mm.close()
+        except BufferError:
+            # Bodies are views of the map; leave it to be released with them
+            pass
+        self._file.close()
+
+
+class Cursor:
+    """
+    Read position within a log.
+    """
+
+    __slots__ = ("segment", "position", "offset")
+
+    def __init__(self, segment: Segment, position: int, offset: int):
+        self.segment = segment
+        self.position = position
+        self.offset = offset
+
+    def __repr__(self):
+        return f"<Cursor {self.offset}>"
+
+
+class ConsumerGroup:
+    """
+    Read position and acknowledgements of a named group of consumers.
+
+    Messages are delivered to one consumer of the group in offset order. The
+    `committed` offset is the offset below which every message has been
+    acknowledged; it is stored in the log directory so consumption resumes
+    from the first unacknowledged message after a restart.
+    """
+
+    __slots__ = ("log", "name", "committed", "cursor", "_acked", "_fd", "_dirty")
+
+    def __init__(self, log: "SegmentedLog", name: str):
+        self.log = log
+        self.name = name
+        path = os.path.join(log.directory, f"{name}{GROUP_SUFFIX}")
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        data = os.pread(self._fd, OFFSET.size, 0)
+        self.committed = max(
+            OFFSET.unpack(data)[0] if len(data) == OFFSET.size else 0,
+            log.first_offset,
+        )
+        self.cursor = log.cursor(self.committed)
+        self._acked = set()
+        self._dirty = False
+
+    def __repr__(self):
+        return f"<ConsumerGroup {self.name!r} committed={self.committed}>"
+
+    @property
+    def pending(self) -> int:
+        """
+        Messages delivered but not yet acknowledged.
+        """
+        return self.cursor.offset - self.committed - len(self._acked)
+
+    def ack(self, offsets) -> bool:
+        """
+        Acknowledge offsets; returns `True` if the committed offset advanced.
+
+        Must be called with the log lock held.
+        """
+        acked = self._acked
+        acked.update(offset for offset in offsets if offset >= self.committed)
+        committed = self.committed
+        while committed in acked:
+            acked.remove(committed)
+            committed += 1
+        if committed == self.committed:
+            return False
+
+        self.committed = committed
+        os.pwrite(self._fd, OFFSET.pack(committed), 0)
+        self._dirty = True
+        return True
+
+    def rewind(self):
+        """
+        Redeliver messages that have not been acknowledged.
+
+        Must be called with the log lock held.
+        """
+        self.cursor = self.log.cursor(self.committed)
+
+    def sync(self):
+        if self._dirty:
+            self._dirty = False
+            os.fsync(self._fd)
+
+    def close(self):
+        os.close(self._fd)
+
+
+class SegmentedLog:
+    """
+    Append-only log of messages stored in memory-mapped segment files.
+
+    :param directory: Directory containing the log segments and consumer
+        group offsets; created if it does not exist.
+    :param segment_size: Size in bytes of each segment file.
+
+    """
+
+    __slots__ = (
+        "directory",
+        "segment_size",
+        "segments",
+        "groups",
+        "_lock",
+        "_appended",
+        "_waiters",
+        "_closed",
+        "_commit",
+        "_syncing",
+        "_synced",
+        "_sync_attempts",
+        "_sync_failure",
+    )
+
+    def __init__(self, directory: str, *, segment_size: int = DEFAULT_SEGMENT_SIZE):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.groups: Dict[str, ConsumerGroup] = {}
+        self._lock = threading.RLock()
+        self._appended = threading.Condition(self._lock)
+        self._waiters: List[Waiter] = []
+        self._closed = False
+        self._commit = threading.Condition()
+        self._syncing = False
+        self._synced = 0
+        self._sync_attempts = 0
+        self._sync_failure = None
+
+        os.makedirs(directory, exist_ok=True)
+        self.segments: List[Segment] = [
+            Segment.load(os.path.join(directory, name))
+            for name in sorted(os.listdir(directory))
+            if name.endswith(SEGMENT_SUFFIX)
+        ]
+        if not self.segments:
+            self.segments.append(Segment.create(directory, 0, segment_size))
+
+    def __repr__(self):
+        return f"<SegmentedLog {self.directory!r} segments={len(self.segments)}>"
+
+    @property
+    def first_offset(self) -> int:
+        return self.segments[0].base_offset
+
+    @property
+    def next_offset(self) -> int:
+        return self.segments[-1].next_offset
+
+    def group(self, name: str) -> ConsumerGroup:
+        """
+        Get (or open) a consumer group.
+        """
+        with self._lock:
+            group = self.groups.get(name)
+            if group is None:
+                group = self.groups[name] = ConsumerGroup(self, name)
+            return group
+
+    def cursor(self, offset: int) -> Cursor:
+        """
+        Cursor positioned at an offset.
+        """
+        with self._lock:
+            segment = self.segments[0]
+            for candidate in self.segments:
+                if candidate.base_offset > offset:
+                    break
+                segment = candidate
+
+            cursor = Cursor(segment, SEGMENT_HEADER.size, segment.base_offset)
+            while cursor.offset < offset and self._advance(cursor) is not None:
+                pass
+            return cursor
+
+    def append(
+        self, body: Body, content_type: str = None, content_encoding: str = None
+    ) -> int:
+        """
+        Append a message to the log; the message is durable once a
+        :meth:`sync` has completed.
+
+        :return: Offset of the message.
+        """
+        flags = 0
+        if isinstance(body, str):
+            body = body.encode()
+            flags |= FLAG_STR
+        body = memoryview(body).cast("B")
+        content_type = (content_type or "").encode()
+        content_encoding = (content_encoding or "").encode()
+
+        with self._lock:
+            if self._closed:
+                raise MessagingError(f"Log {self.directory!r} is closed")
+
+            segment = self.segments[-1]
+            if not segment.append(body, flags, content_type, content_encoding):
+                segment = Segment.create(
+                    self.directory, segment.next_offset, self.segment_size
+                )
+                self.segments.append(segment)
+                if not segment.append(body, flags, content_type, content_encoding):
+                    raise ValueError("Message is larger than the log segment size")
+
+            self._appended.notify_all()
+            waiters, self._waiters = self._waiters, []
+            for waiter in waiters:
+                waiter()
+            return segment.next_offset - 1
+
+    def _advance(self, cursor: Cursor) -> Optional[Record]:
+        """
+        Read the record at a cursor and move the cursor to the next record.
+        """
+        segment = cursor.segment
+        record = segment.read(cursor.position)
+        if record is None:
+            index = self.segments.index(segment)
+            if index + 1 >= len(self.segments):
+                return None
+            cursor.segment = segment = self.segments[index + 1]
+            cursor.position = SEGMENT_HEADER.size
+            record = segment.read(cursor.position)
+            if record is None:
+                return None
+
+        cursor.position, body, content_type, content_encoding = record
+        offset = cursor.offset
+        cursor.offset += 1
+        return offset, body, content_type, content_encoding
+
+    def _next(self, group: ConsumerGroup) -> Optional[Record]:
+        # Skip messages already acknowledged (after a rewind)
+        acked = group._acked
+        record = self._advance(group.cursor)
+        while record is not None and record[0] in acked:
+            record = self._advance(group.cursor)
+        return record
+
+    def read(self, group: ConsumerGroup, waiter: Waiter = None) -> Optional[Record]:
+        """
+        Read the next message for a consumer group, registering a waiter (if
+        supplied) that is called when a message is appended if none is
+        available.
+        """
+        with self._lock:
+            record = self._next(group)
+            if record is None and waiter is not None and not self._closed:
+                self._waiters.append(waiter)
+            return record
+
+    def read_wait(
+        self, group: ConsumerGroup, timeout: float = None
+    ) -> Optional[Record]:
+        """
+        Read the next message for a consumer group, blocking for up to
+        `timeout` seconds for one to be appended.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while True:
+                record = self._next(group)
+                if record is not None or self._closed:
+                    return record
+
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                self._appended.wait(remaining)
+
+    def discard_waiter(self, waiter: Waiter):
+        with self._lock:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def ack(self, group: ConsumerGroup, *offsets: int):
+        """
+        Acknowledge messages of a consumer group, compacting the log once
+        segments have been acknowledged by every group.
+        """
+        with self._lock:
+            if group.ack(offsets) and len(self.segments) > 1:
+                if group.committed >= self.segments[1].base_offset:
+                    self.compact()
+
+    def _committed_offsets(self) -> List[int]:
+        committed = []
+        for name in os.listdir(self.directory):
+            if name.endswith(GROUP_SUFFIX):
+                group = self.groups.get(name[: -len(GROUP_SUFFIX)])
+                if group is not None:
+                    committed.append(group.committed)
+                else:
+                    with open(os.path.join(self.directory, name), "rb") as f:
+                        data = f.read(OFFSET.size)
+                    committed.append(
+                        OFFSET.unpack(data)[0] if len(data) == OFFSET.size else 0
+                    )
+        return committed
+
+    def compact(self) -> int:
+        """
+        Remove segments acknowledged by every consumer group; the active
+        (last) segment is never removed.
+
+        :return: Number of segments removed.
+        """
+        with self._lock:
+            committed = self._committed_offsets()
+            if not committed:
+                return 0
+
+            low_water = min(committed)
+            removed = []
+            while len(self.segments) > 1 and self.segments[1].base_offset <= low_water:
+                removed.append(self.segments.pop(0))
+
+            # Cursors at the end of a removed segment move to the next segment
+            for group in self.groups.values():
+                if group.cursor.segment in removed:
+                    group.cursor = self.cursor(group.cursor.offset)
+
+            for segment in removed:
+                segment.close()
+                os.remove(segment.path)
+            return len(removed)
+
+    def sync(self):
+        """
+        Flush appended messages and committed offsets to disk.
+        """
+        with self._lock:
+            dirty = [
+                (segment, segment.dirty())
+                for segment in self.segments
+                if segment._dirty_end > segment._dirty_start
+            ]
+            groups = list(self.groups.values())
+
+        for idx, (segment, (start, end)) in enumerate(dirty):
+            try:
+                segment.flush(start, end)
+            except BaseException:
+                # Ranges not flushed are dirty again so a retry flushes them
+                with self._lock:
+                    for segment, (start, _) in dirty[idx:]:
+                        segment._dirty_start = min(segment._dirty_start, start)
+                raise
+        for group in groups:
+            group.sync()
+
+    def commit(self, offset: int, window: float = 0):
+        """
+        Block until the message at `offset` is durable.
+
+        The first caller waits `window` seconds for further appends before
+        calling :meth:`sync`; callers arriving while a sync is pending share
+        it (group commit). If the sync fails the error is raised to every
+        caller whose message it covered.
+        """
+        commit = self._commit
+        with commit:
+            while self._synced <= offset:
+                if not self._syncing:
+                    self._syncing = True
+                    break
+                attempts = self._sync_attempts
+                commit.wait()
+                failure = self._sync_failure
+                if failure is not None:
+                    attempt, target, error = failure
+                    if attempt > attempts and offset < target:
+                        raise error
+            else:
+                return
+
+        target = offset + 1
+        error = None
+        try:
+            if window:
+                time.sleep(window)
+            target = self.next_offset
+            self.sync()
+        except BaseException as ex:
+            error = ex
+            raise
+        finally:
+            with commit:
+                self._syncing = False
+                self._sync_attempts += 1
+                if error is None:
+                    self._synced = max(self._synced, target)
+                else:
+                    self._sync_failure = (self._sync_attempts, target, error)
+                commit.notify_all()
+
+    def close(self):
+        """
+        Sync and close the log; waiting readers are woken.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self.sync()
+            self._closed = True
+            self._appended.notify_all()
+            waiters, self._waiters = self._waiters, []
+            for waiter in waiters:
+                waiter()
+            for group in self.groups.values():
+                group.close()
+            for segment in self.segments:
+                segment.close()
+        _logs.pop(os.path.realpath(self.directory), None)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+
+_logs: Dict[str, SegmentedLog] = {}
+_logs_lock = threading.Lock()
+
+
+def open_log(directory: str, *, segment_size: int = None) -> SegmentedLog:
+    """
+    Get the log stored in a directory; queues in the same process share a
+    single log instance per directory.
+    """
+    key = os.path.realpath(directory)
+    with _logs_lock:
+        log = _logs.get(key)
+        if log is None:
+            log = _logs[key] = SegmentedLog(
+                directory, segment_size=segment_size or DEFAULT_SEGMENT_SIZE
+            )
+        return log
@@ -0,0 +1,504 @@
+"""
+In-Memory Broker
+~~~~~~~~~~~~~~~~
+
+In-process message broker used by the AsyncIO and Synchronous memory queues
+(see :mod:`pyapp_ext.messaging.aio.memory` and
+:mod:`pyapp_ext.messaging.sio.memory`).
+
+The broker provides named queues shared by competing consumers, topics that
+fan-out messages to subscribed queues, acknowledgement with redelivery of
+messages that are not acknowledged within a visibility timeout, and queues
+with a bounded capacity.
+
+Messages only exist in the memory of the current process and bodies are
+passed from sender to receiver without being copied. The broker is
+thread-safe so senders and receivers may be used from different threads (and
+event loops).
+
+"""
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from .exceptions import QueueClosed, QueueFull, QueueNotFound
+
+__all__ = (
+    "QueueFull",
+    "QueueClosed",
+    "Delivery",
+    "MemoryItem",
+    "MemoryQueue",
+    "MemoryBroker",
+    "broker",
+)
+
+Waiter = Callable[[], None]
+
+
+class Delivery(NamedTuple):
+    """
+    Envelope of a message delivered from a memory queue.
+    """
+
+    message_id: str
+    receipt: int
+    delivery_count: int
+
+
+class MemoryItem:
+    """
+    Message held in a memory queue.
+    """
+
+    __slots__ = (
+        "message_id",
+        "body",
+        "content_type",
+        "content_encoding",
+        "delivery_count",
+    )
+
+    def __init__(
+        self,
+        message_id: str,
+        body: Any,
+        content_type: Optional[str],
+        content_encoding: Optional[str],
+    ):
+        self.message_id = message_id
+        self.body = body
+        self.content_type = content_type
+        self.content_encoding = content_encoding
+        self.delivery_count = 0
+
+    def __repr__(self):
+        return f"<MemoryItem {self.message_id}>"
+
+
+def _min_timeout(*timeouts: Optional[float]) -> Optional[float]:
+    timeouts = [timeout for timeout in timeouts if timeout is not None]
+    return min(timeouts) if timeouts else None
+
+
+class MemoryQueue:
+    """
+    Named queue of messages.
+
+    Received messages are held in-flight until they are acknowledged (and
+    removed) or released; in-flight messages that are not acknowledged within
+    their visibility timeout are returned to the front of the queue to be
+    redelivered.
+
+    Both ready and in-flight messages count towards `max_size`; when a queue
+    is full senders wait for messages to be acknowledged.
+
+    Blocking calls (:meth:`put`, :meth:`get`) are provided for threads, while
+    the non-blocking :meth:`put_or_wait` and :meth:`get_or_wait` register a
+    waiter callback that is called (from any thread) when the operation
+    should be retried; this allows an event loop to wait on the queue.
+
+    :param name: Name of the queue.
+    :param max_size: Maximum number of messages held by the queue; `0` is
+        unbounded.
+
+    """
+
+    __slots__ = (
+        "name",
+        "max_size",
+        "closed",
+        "_lock",
+        "_not_empty",
+        "_not_full",
+        "_ready",
+        "_in_flight",
+        "_deadlines",
+        "_receipts",
+        "_get_waiters",
+        "_put_waiters",
+    )
+
+    def __init__(self, name: str, *, max_size: int = 0):
+        self.name = name
+        self.max_size = max_size
+        self.closed = False
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._ready = deque()
+        self._in_flight: Dict[int, MemoryItem] = {}
+        self._deadlines: List[Tuple[float, int]] = []
+        self._receipts = itertools.count(1)
+        self._get_waiters: List[Waiter] = []
+        self._put_waiters: List[Waiter] = []
+
+    def __repr__(self):
+        return (
+            f"<MemoryQueue {self.name!r} ready={self.ready_count} "
+            f"in_flight={self.in_flight_count}>"
+        )
+
+    def __len__(self):
+        return len(self._ready) + len(self._in_flight)
+
+    @property
+    def ready_count(self) -> int:
+        """
+        Messages waiting to be received
+        """
+        return len(self._ready)
+
+    @property
+    def in_flight_count(self) -> int:
+        """
+        Messages received but not yet acknowledged
+        """
+        return len(self._in_flight)
+
+    def _has_space(self) -> bool:
+        return self.max_size <= 0 or len(self) < self.max_size
+
+    def _wake_getters(self):
+        self._not_empty.notify()
+        waiters, self._get_waiters = self._get_waiters, []
+        for waiter in waiters:
+            waiter()
+
+    def _wake_putters(self):
+        self._not_full.notify()
+        waiters, self._put_waiters = self._put_waiters, []
+        for waiter in waiters:
+            waiter()
+
+    def _put(self, item: MemoryItem):
+        if self.closed:
+            raise QueueClosed(f"Queue {self.name!r} is closed")
+        self._ready.append(item)
+        self._wake_getters()
+
+    def _expire(self, now: float):
+        """
+        Return in-flight messages whose visibility timeout has expired to the
+        front of the queue.
+        """
+        deadlines = self._deadlines
+        expired = []
+        while deadlines and deadlines[0][0] <= now:
+            _, receipt = heapq.heappop(deadlines)
+            item = self._in_flight.pop(receipt, None)
+            if item is not None:
+                expired.append(item)
+        if expired:
+            # extendleft reverses; keep the messages in their original order
+            self._ready.extendleft(reversed(expired))
+
+    def _get(
+        self, now: float, visibility_timeout: Optional[float]
+    ) -> Optional[Tuple[int, MemoryItem]]:
+        self._expire(now)
+        if not self._ready:
+            return None
+
+        item = self._ready.popleft()
+        item.delivery_count += 1
+        receipt = next(self._receipts)
+        self._in_flight[receipt] = item
+        if visibility_timeout is not None:
+            heapq.heappush(self._deadlines, (now + visibility_timeout, receipt))
+        return receipt, item
+
+    def _next_expiry(self, now: float) -> Optional[float]:
+        deadlines = self._deadlines
+        return max(deadlines[0][0] - now, 0) if deadlines else None
+
+    def next_expiry(self) -> Optional[float]:
+        """
+        Seconds until the next in-flight message may be redelivered.
+        """
+        with self._lock:
+            return self._next_expiry(time.monotonic())
+
+    def put(self, item: MemoryItem, timeout: float = None):
+        """
+        Put a message on the queue, blocking for up to `timeout` seconds
+        (`None` waits indefinitely) for space to become available.
+
+        :raises QueueFull: Space was not available within the timeout.
+        :raises QueueClosed: The queue has been closed.
+        """
+        with self._lock:
+            if not self._has_space() and not self.closed:
+                deadline = None if timeout is None else time.monotonic() + timeout
+                while not self._has_space() and not self.closed:
+                    remaining = None
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise QueueFull(f"Queue {self.name!r} is full")
+                    self._not_full.wait(remaining)
+            self._put(item)
+
+    def put_or_wait(self, item: MemoryItem, waiter: Optional[Waiter]) -> bool:
+        """
+        Put a message on the queue if there is space, otherwise register a
+        waiter (if supplied) that is called when space may be available.
+
+        :raises QueueClosed: The queue has been closed.
+        """
+        with self._lock:
+            if self._has_space() or self.closed:
+                self._put(item)
+                return True
+            if waiter is not None:
+                self._put_waiters.append(waiter)
+            return False
+
+    def get(
+        self, timeout: float = None, visibility_timeout: float = None
+    ) -> Optional[Tuple[int, MemoryItem]]:
+        """
+        Get a message from the queue, blocking for up to `timeout` seconds
+        (`None` waits indefinitely) for a message to become available.
+
+        :param timeout: Time to wait for a message.
+        :param visibility_timeout: Time the message is held in-flight before
+            it is redelivered; `None` holds it until it is acknowledged or
+            released.
+        :return: Receipt and message; or `None` if the timeout expired or the
+            queue is closed and empty.
+
+        """
+        with self._lock:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while True:
+                now = time.monotonic()
+                delivery = self._get(now, visibility_timeout)
+                if delivery is not None or self.closed:
+                    return delivery
+
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        return None
+                self._not_empty.wait(_min_timeout(self._next_expiry(now), remaining))
+
+    def get_or_wait(
+        self, waiter: Optional[Waiter], visibility_timeout: float = None
+    ) -> Optional[Tuple[int, MemoryItem]]:
+        """
+        Get a message from the queue if one is available, otherwise register a
+        waiter (if supplied) that is called when a message may be available (waiters are
+        not called when an in-flight message expires, see :meth:`next_expiry`).
+
+        Nothing is returned (and no waiter registered) if the queue is closed
+        and empty.
+        """
+        with self._lock:
+            delivery = self._get(time.monotonic(), visibility_timeout)
+            if delivery is None and waiter is not None and not self.closed:
+                self._get_waiters.append(waiter)
+            return delivery
+
+    def discard_waiter(self, waiter: Waiter):
+        """
+        Remove a waiter that is no longer required.
+        """
+        with self._lock:
+            for waiters in (self._get_waiters, self._put_waiters):
+                if waiter in waiters:
+                    waiters.remove(waiter)
+
+    def ack(self, *receipts: int) -> int:
+        """
+        Acknowledge (and remove) in-flight messages.
+
+        Receipts of messages that have already been acknowledged or whose
+        visibility timeout has expired are ignored.
+
+        :return: Number of messages acknowledged.
+        """
+        with self._lock:
+            in_flight = self._in_flight
+            count = 0
+            for receipt in receipts:
+                if in_flight.pop(receipt, None) is not None:
+                    count += 1
+
+            # Drop deadlines of acknowledged messages rather than holding them
+            # until they would have expired.
+            deadlines = self._deadlines
+            if len(deadlines) > 2 * len(in_flight) + 64:
+                self._deadlines = [
+                    entry for entry in deadlines if entry[1] in in_flight
+                ]
+                heapq.heapify(self._deadlines)
+
+            if count:
+                self._wake_putters()
+            return count
+
+    def release(self, *receipts: int) -> int:
+        """
+        Return in-flight messages to the front of the queue (in the order the
+        receipts are supplied) to be redelivered immediately.
+
+        :return: Number of messages released.
+        """
+        with self._lock:
+            in_flight = self._in_flight
+            items = []
+            for receipt in receipts:
+                item = in_flight.pop(receipt, None)
+                if item is not None:
+                    items.append(item)
+
+            if items:
+                self._ready.extendleft(reversed(items))
+                self._wake_getters()
+            return len(items)
+
+    def close(self):
+        """
+        Close the queue; no more messages are accepted and receivers stop once
+        the ready messages are consumed.
+        """
+        with self._lock:
+            self.closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+            waiters = self._get_waiters + self._put_waiters
+            self._get_waiters, self._put_waiters = [], []
+            for waiter in waiters:
+                waiter()
+
+
+class MemoryBroker:
+    """
+    Registry of named queues and topics.
+
+    Messages published to a topic are put on every queue subscribed to the
+    topic at the time of publishing (the same body object is shared by each
+    queue). Messages published to a topic without subscribers are discarded.
+    """
+
+    __slots__ = ("_lock", "_queues", "_subscriptions", "_ids")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queues: Dict[str, MemoryQueue] = {}
+        self._subscriptions: Dict[str, Set[str]] = {}
+        self._ids = itertools.count(1)
+
+    def __repr__(self):
+        return f"<MemoryBroker queues={len(self._queues)}>"
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._queues
+
+    def declare_queue(self, name: str, *, max_size: int = None) -> MemoryQueue:
+        """
+        Get a named queue, creating it if it does not exist.
+
+        :param name: Name of the queue.
+        :param max_size: Maximum number of messages held by the queue; if
+            supplied the capacity of an existing queue is updated.
+
+        """
+        with self._lock:
+            queue = self._queues.get(name)
+            if queue is None:
+                queue = self._queues[name] = MemoryQueue(name, max_size=max_size or 0)
+            elif max_size is not None:
+                queue.max_size = max_size
+            return queue
+
+    def get_queue(self, name: str) -> MemoryQueue:
+        """
+        Get a named queue.
+
+        :raises QueueNotFound: The queue has not been declared.
+        """
+        try:
+            return self._queues[name]
+        except KeyError:
+            raise QueueNotFound(f"Memory queue {name!r} not found") from None
+
+    def delete_queue(self, name: str):
+        """
+        Close and remove a named queue (along with any subscriptions).
+        """
+        with self._lock:
+            queue = self._queues.pop(name, None)
+            for subscribers in self._subscriptions.values():
+                subscribers.discard(name)
+        if queue is not None:
+            queue.close()
+
+    def subscribe(self, topic: str, queue_name: str):
+        """
+        Subscribe a queue to a topic (the queue is declared if required).
+        """
+        self.declare_queue(queue_name)
+        with self._lock:
+            self._subscriptions.setdefault(topic, set()).add(queue_name)
+
+    def unsubscribe(self, topic: str, queue_name: str):
+        """
+        Unsubscribe a queue from a topic.
+        """
+        with self._lock:
+            self._subscriptions.get(topic, set()).discard(queue_name)
+
+    def subscribers(self, topic: str) -> List[MemoryQueue]:
+        """
+        Queues subscribed to a topic.
+        """
+        with self._lock:
+            queues = self._queues
+            return [
+                queues[name]
+                for name in sorted(self._subscriptions.get(topic, ()))
+                if name in queues
+            ]
+
+    def items(
+        self,
+        body: Any,
+        content_type: Optional[str],
+        content_encoding: Optional[str],
+        count: int,
+    ) -> Tuple[str, List[MemoryItem]]:
+        """
+        Create items for a message being put on `count` queues; all items
+        share the message ID and body.
+        """
+        message_id = str(next(self._ids))
+        return (
+            message_id,
+            [
+                MemoryItem(message_id, body, content_type, content_encoding)
+                for _ in range(count)
+            ],
+        )
+
+    def reset(self):
+        """
+        Close and remove all queues and subscriptions.
+        """
+        with self._lock:
+            queues = list(self._queues.values())
+            self._queues.clear()
+            self._subscriptions.clear()
+        for queue in queues:
+            queue.close()
+
+
+broker = MemoryBroker()
+"""
+Default broker shared by memory queues in this process
+"""
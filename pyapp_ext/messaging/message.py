@@ -0,0 +1,122 @@
+"""
+Message
+~~~~~~~
+
+Base class for messages received from a queue.
+
+"""
+from typing import Any, Dict, Optional, Tuple
+
+from .serialisation import Serialise, registry
+
+_NOT_DECODED = object()
+
+
+class BaseMessage:
+    """
+    Message Received
+
+    Messages were originally named tuples and still behave like one (they can
+    be unpacked, indexed, compared with tuples and copied with
+    :meth:`_replace`). Unlike a named tuple the de-serialised content is
+    decoded on first access and cached.
+
+    Content is decoded with the serialisation registered for the content type
+    and encoding of the message (see :data:`serialisation.registry`), falling
+    back to the serialisation of the receiving queue.
+    """
+
+    __slots__ = (
+        "body",
+        "content_type",
+        "content_encoding",
+        "envelope",
+        "queue",
+        "_content",
+    )
+
+    _fields = ("body", "content_type", "content_encoding", "envelope", "queue")
+
+    def __init__(
+        self,
+        body: Any,
+        content_type: str,
+        content_encoding: Optional[str],
+        envelope: Any,
+        queue: Any,
+    ):
+        self.body = body
+        self.content_type = content_type
+        self.content_encoding = content_encoding
+        self.envelope = envelope
+        self.queue = queue
+        self._content = _NOT_DECODED
+
+    def __repr__(self):
+        fields = ", ".join(
+            f"{name}={value!r}" for name, value in zip(self._fields, self)
+        )
+        return f"{type(self).__name__}({fields})"
+
+    def __iter__(self):
+        return iter(self._astuple())
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __getitem__(self, item):
+        return self._astuple()[item]
+
+    def __eq__(self, other):
+        if isinstance(other, (BaseMessage, tuple)):
+            return self._astuple() == tuple(other)
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self._astuple())
+
+    def _astuple(self) -> Tuple[Any, ...]:
+        return (
+            self.body,
+            self.content_type,
+            self.content_encoding,
+            self.envelope,
+            self.queue,
+        )
+
+    def _asdict(self) -> Dict[str, Any]:
+        return dict(zip(self._fields, self))
+
+    def _replace(self, **kwargs) -> "BaseMessage":
+        """
+        Return a copy of the message replacing specified fields.
+
+        Cached content is retained as long as the body and its encoding are
+        not replaced.
+        """
+        values = self._asdict()
+        values.update(kwargs)
+        message = type(self)(**values)
+        if not kwargs.keys() & {"body", "content_type", "content_encoding"}:
+            message._content = self._content
+        return message
+
+    @property
+    def serialisation(self) -> Serialise:
+        """
+        Serialisation used to decode the message, as determined by the content
+        type and encoding of the message.
+        """
+        return registry.resolve(
+            self.content_type, self.content_encoding, self.queue.serialisation
+        )
+
+    @property
+    def content(self):
+        """
+        De-serialised message content
+        """
+        content = self._content
+        if content is _NOT_DECODED:
+            content = self._content = self.serialisation.deserialise(self.body)
+        return content
@@ -2,15 +2,67 @@
 Serialisation
 ~~~~~~~~~~~~~
 
+Serialisation of message content. A serialisation is made up of a content
+type (eg JSON) optionally wrapped by a content encoding (eg GZip).
 
+Received messages are decoded using the serialisation registered in
+:data:`registry` for the content type and encoding of the message, so
+producers can change serialisation without receivers being reconfigured.
 
 """
 import abc
+import asyncio
+import datetime
+import decimal
 import gzip
 import json
 import pickle
+import struct
+import uuid
 
-from typing import Any, Union
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover
+    ujson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+try:
+    from lz4 import frame as lz4_frame
+except ImportError:  # pragma: no cover
+    lz4_frame = None
+
+BytesLike = Union[bytes, bytearray, memoryview]
+"""
+Binary message body; bodies are passed through the pipeline without copying.
+"""
+
+Body = Union[BytesLike, str]
+"""
+Raw message body.
+"""
+
+OFFLOAD_THRESHOLD = 256 * 1024
+"""
+Default size in bytes at which the async serialisation methods process a
+payload in an executor rather than on the event loop.
+"""
 
 
 class Serialise(abc.ABC):
@@ -20,16 +72,74 @@ class Serialise(abc.ABC):
     content_encoding: str = None
 
     @abc.abstractmethod
-    def serialise(self, data: Any) -> Union[bytes, str]:
+    def serialise(self, data: Any) -> Body:
         """
         Serialise native type into bytes.
         """
 
     @abc.abstractmethod
-    def deserialise(self, data: Union[bytes, str]) -> Any:
+    def deserialise(self, data: Body) -> Any:
         """
         Deserialise bytes into native type.
+
+        Any bytes-like object (``bytes``, ``bytearray`` or ``memoryview``)
+        is accepted without first being copied into ``bytes``.
+        """
+
+    def serialise_encoded(self, data: Any) -> Tuple[Body, Optional[str]]:
+        """
+        Serialise native type into bytes returning the content encoding that
+        was actually applied (encodings may skip encoding small payloads).
+        """
+        return self.serialise(data), self.content_encoding
+
+    async def aserialise(
+        self,
+        data: Any,
+        *,
+        executor: Executor = None,
+        threshold: int = OFFLOAD_THRESHOLD,
+    ) -> Body:
+        """
+        Serialise native type into bytes without blocking the event loop.
+
+        The size of native data is not known until it is serialised so content
+        types serialise inline; encodings compress payloads of `threshold`
+        bytes or larger in `executor` (default executor if not supplied).
+        """
+        return self.serialise(data)
+
+    async def aserialise_encoded(
+        self,
+        data: Any,
+        *,
+        executor: Executor = None,
+        threshold: int = OFFLOAD_THRESHOLD,
+    ) -> Tuple[Body, Optional[str]]:
+        """
+        Async version of :meth:`serialise_encoded`, see :meth:`aserialise`.
+        """
+        return self.serialise_encoded(data)
+
+    async def adeserialise(
+        self,
+        data: Body,
+        *,
+        executor: Executor = None,
+        threshold: int = OFFLOAD_THRESHOLD,
+    ) -> Any:
         """
+        Deserialise bytes into native type without blocking the event loop.
+
+        Payloads of `threshold` bytes or larger are deserialised in `executor`
+        (default executor if not supplied); smaller payloads are deserialised
+        inline as the cost of switching threads would outweigh the work.
+        """
+        if len(data) < threshold:
+            return self.deserialise(data)
+
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(executor, self.deserialise, data)
 
 
 class ContentType(Serialise, abc.ABC):
@@ -43,29 +153,168 @@ class ContentType(Serialise, abc.ABC):
 class ContentEncoding(Serialise, abc.ABC):
     """
     Content encoding serialisation
+
+    :param content: Content type being encoded.
+    :param threshold: Payloads smaller than this number of bytes are not
+        encoded when serialised with :meth:`serialise_encoded`; compressing
+        tiny payloads often makes them larger and wastes CPU.
+
     """
 
-    __slots__ = ("content", "content_type")
+    __slots__ = ("content", "content_type", "threshold")
 
-    def __init__(self, content: ContentType):
+    def __init__(self, content: ContentType, *, threshold: int = 0):
         self.content = content
         self.content_type = self.content.content_type
+        self.threshold = threshold
+
+    @abc.abstractmethod
+    def compress(self, data: BytesLike) -> bytes:
+        """
+        Encode serialised content.
+        """
+
+    @abc.abstractmethod
+    def decompress(self, data: BytesLike) -> bytes:
+        """
+        Decode encoded content.
+        """
+
+    def _serialise_content(self, data: Any) -> bytes:
+        data = self.content.serialise(data)
+        if isinstance(data, str):
+            data = data.encode()
+        return data
+
+    def serialise(self, data: Any) -> bytes:
+        return self.compress(self._serialise_content(data))
+
+    def serialise_encoded(self, data: Any) -> Tuple[bytes, Optional[str]]:
+        data = self._serialise_content(data)
+        if len(data) < self.threshold:
+            return data, self.content.content_encoding
+        return self.compress(data), self.content_encoding
+
+    def deserialise(self, data: BytesLike) -> Any:
+        return self.content.deserialise(self.decompress(data))
+
+    async def _acompress(
+        self, data: bytes, executor: Optional[Executor], threshold: int
+    ) -> bytes:
+        if len(data) < threshold:
+            return self.compress(data)
+
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(executor, self.compress, data)
+
+    async def aserialise(
+        self,
+        data: Any,
+        *,
+        executor: Executor = None,
+        threshold: int = OFFLOAD_THRESHOLD,
+    ) -> bytes:
+        data = self._serialise_content(data)
+        return await self._acompress(data, executor, threshold)
+
+    async def aserialise_encoded(
+        self,
+        data: Any,
+        *,
+        executor: Executor = None,
+        threshold: int = OFFLOAD_THRESHOLD,
+    ) -> Tuple[bytes, Optional[str]]:
+        data = self._serialise_content(data)
+        if len(data) < self.threshold:
+            return data, self.content.content_encoding
+        return await self._acompress(data, executor, threshold), self.content_encoding
 
 
 class PickleSerialise(ContentType):
     """
     Pickle serialisation
+
+    :param protocol: Pickle protocol; defaults to :data:`pickle.DEFAULT_PROTOCOL`.
+
     """
 
+    __slots__ = ("protocol",)
+
     content_type = "application/python-pickle"
 
+    def __init__(self, *, protocol: int = None):
+        self.protocol = protocol
+
     def serialise(self, data: Any) -> bytes:
-        return pickle.dumps(data)
+        return pickle.dumps(data, protocol=self.protocol)
 
-    def deserialise(self, data: Union[bytes, str]) -> Any:
+    def deserialise(self, data: Body) -> Any:
         return pickle.loads(data)
 
 
+class OutOfBandPickleSerialise(ContentType):
+    """
+    Pickle (protocol 5) serialisation with out-of-band buffers
+
+    Large buffers (eg ``bytearray``, NumPy arrays or any object wrapped in a
+    :class:`pickle.PickleBuffer`) are not copied into the pickle stream;
+    instead they are framed after it in the message body::
+
+        [count: u32][pickle length: u64][buffer lengths: u64 * count]
+        [pickle][buffer 0][buffer 1]...
+
+    When loading, buffers are passed to :func:`pickle.loads` as slices of a
+    :class:`memoryview` over the body so they are not copied again. Any
+    bytes-like body is accepted, including memory-mapped files. Buffers
+    backed by a read-only body (eg ``bytes``) are read-only.
+
+    Requires Python 3.8+.
+    """
+
+    __slots__ = ()
+
+    content_type = "application/python-pickle-oob"
+
+    _HEADER = struct.Struct("<IQ")
+    _LENGTH = struct.Struct("<Q")
+
+    def __init__(self):
+        if pickle.HIGHEST_PROTOCOL < 5:  # pragma: no cover
+            raise RuntimeError("Out-of-band pickling requires pickle protocol 5")
+
+    def serialise(self, data: Any) -> bytes:
+        buffers = []
+        payload = pickle.dumps(data, protocol=5, buffer_callback=buffers.append)
+        raw_buffers = [buffer.raw() for buffer in buffers]
+
+        header = bytearray(self._HEADER.pack(len(raw_buffers), len(payload)))
+        for raw in raw_buffers:
+            header += self._LENGTH.pack(raw.nbytes)
+
+        return b"".join((header, payload, *raw_buffers))
+
+    def deserialise(self, data: BytesLike) -> Any:
+        view = memoryview(data).cast("B")
+        count, payload_length = self._HEADER.unpack_from(view)
+        offset = self._HEADER.size
+
+        lengths = []
+        for _ in range(count):
+            (length,) = self._LENGTH.unpack_from(view, offset)
+            lengths.append(length)
+            offset += self._LENGTH.size
+
+        payload = view[offset : offset + payload_length]
+        offset += payload_length
+
+        buffers = []
+        for length in lengths:
+            buffers.append(view[offset : offset + length])
+            offset += length
+
+        return pickle.loads(payload, buffers=buffers)
+
+
 class JSONSerialise(ContentType):
     """
     JSON serialisation
@@ -76,24 +325,412 @@ class JSONSerialise(ContentType):
     def serialise(self, data: Any) -> str:
         return json.dumps(data)
 
-    def deserialise(self, data: Union[bytes, str]) -> Any:
-        if isinstance(data, bytes):
-            data = data.decode()
-        return json.loads(data)
+    def deserialise(self, data: Body) -> Any:
+        return _stdlib_loads(data)
+
+
+def _json_default(obj: Any) -> Any:
+    """
+    Encode types not natively supported by JSON; consistent with orjson.
+    """
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _stdlib_dumps(data: Any) -> bytes:
+    return json.dumps(
+        data, separators=(",", ":"), ensure_ascii=False, default=_json_default
+    ).encode()
+
+
+def _stdlib_loads(data: Body) -> Any:
+    # The json module requires str, bytes or bytearray
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+
+def _select_json_backend() -> Tuple[str, Callable, Callable]:
+    """
+    Select the fastest available JSON library.
+    """
+    if orjson is not None:
+
+        def dumps(data: Any) -> bytes:
+            return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+
+        return "orjson", dumps, orjson.loads
+
+    if ujson is not None:
+
+        def dumps(data: Any) -> bytes:
+            return ujson.dumps(data, ensure_ascii=False, default=_json_default).encode()
+
+        def loads(data: Body) -> Any:
+            if isinstance(data, memoryview):
+                data = data.tobytes()
+            return ujson.loads(data)
+
+        return "ujson", dumps, loads
+
+    return "json", _stdlib_dumps, _stdlib_loads  # pragma: no cover
+
+
+JSON_BACKEND, _json_dumps, _json_loads = _select_json_backend()
+
+
+class FastJSONSerialise(ContentType):
+    """
+    JSON serialisation using the fastest available JSON library
+
+    Uses *orjson* or *ujson* if installed, falling back to the standard library.
+    Content is serialised directly to/from UTF-8 encoded bytes and datetime,
+    date, time and UUID values are encoded as ISO-8601/hex strings. Output is
+    compact JSON that can be decoded by any other `application/json` consumer.
+    """
+
+    content_type = "application/json"
+    backend = JSON_BACKEND
+
+    def serialise(self, data: Any) -> bytes:
+        return _json_dumps(data)
+
+    def deserialise(self, data: Body) -> Any:
+        return _json_loads(data)
+
+
+class MsgPackSerialise(ContentType):
+    """
+    MessagePack serialisation (requires *msgpack*)
+
+    A compact binary format that is faster to encode/decode than JSON. In
+    addition to the native msgpack types datetime, date, Decimal and UUID
+    values are supported using msgpack extension types; subclasses can add
+    further types by extending :meth:`default` and :meth:`ext_hook`.
+    """
+
+    __slots__ = ()
+
+    content_type = "application/msgpack"
+
+    EXT_DATETIME = 1
+    EXT_DATE = 2
+    EXT_DECIMAL = 3
+    EXT_UUID = 4
+
+    def __init__(self):
+        if msgpack is None:
+            raise ImportError("MsgPackSerialise requires the msgpack package")
+
+    def default(self, obj: Any) -> Any:
+        """
+        Encode types not natively supported by msgpack as extension types.
+        """
+        if isinstance(obj, datetime.datetime):
+            offset = obj.utcoffset()
+            value = [
+                obj.year,
+                obj.month,
+                obj.day,
+                obj.hour,
+                obj.minute,
+                obj.second,
+                obj.microsecond,
+                None if offset is None else offset // datetime.timedelta(seconds=1),
+            ]
+            return msgpack.ExtType(self.EXT_DATETIME, msgpack.packb(value))
+        if isinstance(obj, datetime.date):
+            value = [obj.year, obj.month, obj.day]
+            return msgpack.ExtType(self.EXT_DATE, msgpack.packb(value))
+        if isinstance(obj, decimal.Decimal):
+            return msgpack.ExtType(self.EXT_DECIMAL, str(obj).encode())
+        if isinstance(obj, uuid.UUID):
+            return msgpack.ExtType(self.EXT_UUID, obj.bytes)
+        raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+
+    def ext_hook(self, code: int, data: bytes) -> Any:
+        """
+        Decode extension types.
+        """
+        if code == self.EXT_DATETIME:
+            *value, offset = msgpack.unpackb(data)
+            tzinfo = (
+                None
+                if offset is None
+                else datetime.timezone(datetime.timedelta(seconds=offset))
+            )
+            return datetime.datetime(*value, tzinfo=tzinfo)
+        if code == self.EXT_DATE:
+            return datetime.date(*msgpack.unpackb(data))
+        if code == self.EXT_DECIMAL:
+            return decimal.Decimal(data.decode())
+        if code == self.EXT_UUID:
+            return uuid.UUID(bytes=bytes(data))
+        return msgpack.ExtType(code, data)
+
+    def serialise(self, data: Any) -> bytes:
+        return msgpack.packb(data, use_bin_type=True, default=self.default)
+
+    def deserialise(self, data: BytesLike) -> Any:
+        return msgpack.unpackb(
+            data, raw=False, strict_map_key=False, ext_hook=self.ext_hook
+        )
 
 
 class GZipEncoding(ContentEncoding):
     """
     GZip encoding
+
+    :param level: Compression level 0-9.
+
     """
 
+    __slots__ = ("level",)
+
     content_encoding = "GZIP"
 
-    def serialise(self, data: Any) -> bytes:
-        data = self.content.serialise(data)
-        if isinstance(data, str):
-            data = data.encode()
-        return gzip.compress(data)
+    def __init__(self, content: ContentType, *, level: int = 9, threshold: int = 0):
+        super().__init__(content, threshold=threshold)
+        self.level = level
+
+    def compress(self, data: BytesLike) -> bytes:
+        return gzip.compress(data, self.level)
+
+    def decompress(self, data: BytesLike) -> bytes:
+        return gzip.decompress(data)
+
+
+class ZstdEncoding(ContentEncoding):
+    """
+    Zstandard encoding (requires *zstandard*)
+
+    Typically compresses better than GZip at a fraction of the CPU cost.
+
+    :param level: Compression level 1-22.
+
+    """
+
+    __slots__ = ("level",)
+
+    content_encoding = "ZSTD"
+
+    def __init__(self, content: ContentType, *, level: int = 3, threshold: int = 0):
+        if zstandard is None:
+            raise ImportError("ZstdEncoding requires the zstandard package")
+        super().__init__(content, threshold=threshold)
+        self.level = level
+
+    def compress(self, data: BytesLike) -> bytes:
+        # Compressor objects are not thread safe so are created per call
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def decompress(self, data: BytesLike) -> bytes:
+        return zstandard.ZstdDecompressor().decompress(data)
+
+
+class ZstdDictEncoding(ContentEncoding):
+    """
+    Zstandard encoding using a pre-trained dictionary (requires *zstandard*)
+
+    Small messages that share most of their structure (eg JSON events with the
+    same keys) compress poorly on their own; a dictionary trained from sample
+    messages (see :func:`train_zstd_dictionary`) provides that shared context.
+
+    The dictionary ID is included in the content encoding (eg ``ZSTD-DICT:42``)
+    so receivers with multiple versions of a dictionary registered can select
+    the correct one.
+
+    :param dictionary: Dictionary or raw dictionary data.
+    :param level: Compression level 1-22.
+
+    """
+
+    __slots__ = ("level", "dictionary", "content_encoding")
+
+    def __init__(
+        self,
+        content: ContentType,
+        dictionary: Union[bytes, "zstandard.ZstdCompressionDict"],
+        *,
+        level: int = 3,
+        threshold: int = 0,
+    ):
+        if zstandard is None:
+            raise ImportError("ZstdDictEncoding requires the zstandard package")
+        super().__init__(content, threshold=threshold)
+        if not isinstance(dictionary, zstandard.ZstdCompressionDict):
+            dictionary = zstandard.ZstdCompressionDict(bytes(dictionary))
+        dictionary.precompute_compress(level=level)
+        self.level = level
+        self.dictionary = dictionary
+        self.content_encoding = f"ZSTD-DICT:{dictionary.dict_id()}"
+
+    def compress(self, data: BytesLike) -> bytes:
+        compressor = zstandard.ZstdCompressor(
+            level=self.level, dict_data=self.dictionary
+        )
+        return compressor.compress(data)
+
+    def decompress(self, data: BytesLike) -> bytes:
+        return zstandard.ZstdDecompressor(dict_data=self.dictionary).decompress(data)
+
+
+def train_zstd_dictionary(
+    samples: Iterable[bytes], *, size: int = 16 * 1024, dict_id: int = 0
+) -> "zstandard.ZstdCompressionDict":
+    """
+    Train a Zstandard dictionary from sample message bodies.
+
+    Samples should be representative un-encoded bodies (a few thousand is
+    typical). Use `dict_id` to version dictionaries, the ID identifies the
+    dictionary used to encode each message; `0` assigns a random ID.
+
+    The raw dictionary (``dictionary.as_bytes()``) can be stored and passed to
+    :class:`ZstdDictEncoding`.
+    """
+    if zstandard is None:
+        raise ImportError("Training a dictionary requires the zstandard package")
+    return zstandard.train_dictionary(size, list(samples), dict_id=dict_id)
+
+
+class LZ4Encoding(ContentEncoding):
+    """
+    LZ4 encoding (requires *lz4*)
+
+    Very fast compression and decompression for a lower compression ratio.
+
+    :param level: Compression level 0-16; levels above 2 use LZ4-HC.
+
+    """
+
+    __slots__ = ("level",)
+
+    content_encoding = "LZ4"
+
+    def __init__(self, content: ContentType, *, level: int = 0, threshold: int = 0):
+        if lz4_frame is None:
+            raise ImportError("LZ4Encoding requires the lz4 package")
+        super().__init__(content, threshold=threshold)
+        self.level = level
+
+    def compress(self, data: BytesLike) -> bytes:
+        return lz4_frame.compress(data, compression_level=self.level)
+
+    def decompress(self, data: BytesLike) -> bytes:
+        return lz4_frame.decompress(data)
+
+
+def _normalise(value: Optional[str]) -> Optional[str]:
+    """
+    Normalise a content type/encoding name; parameters (eg charset) are
+    ignored and names are case-insensitive.
+    """
+    if value is None:
+        return None
+    return value.partition(";")[0].strip().lower() or None
+
+
+class SerialisationRegistry:
+    """
+    Registry of serialisations keyed by content type and content encoding.
+    """
+
+    __slots__ = ("_serialisations",)
+
+    def __init__(self):
+        self._serialisations: Dict[Tuple[str, Optional[str]], Serialise] = {}
+
+    def __len__(self):
+        return len(self._serialisations)
+
+    def __contains__(self, item: Tuple[str, Optional[str]]) -> bool:
+        content_type, content_encoding = item
+        return (
+            _normalise(content_type),
+            _normalise(content_encoding),
+        ) in self._serialisations
+
+    def register(self, serialisation: Serialise) -> Serialise:
+        """
+        Register a serialisation; replaces any serialisation previously
+        registered for the same content type and encoding.
+        """
+        key = (
+            _normalise(serialisation.content_type),
+            _normalise(serialisation.content_encoding),
+        )
+        self._serialisations[key] = serialisation
+        return serialisation
+
+    def get(
+        self, content_type: Optional[str], content_encoding: Optional[str] = None
+    ) -> Optional[Serialise]:
+        """
+        Get the serialisation for a content type and encoding.
+        """
+        return self._serialisations.get(
+            (_normalise(content_type), _normalise(content_encoding))
+        )
+
+    def resolve(
+        self,
+        content_type: Optional[str],
+        content_encoding: Optional[str],
+        default: Serialise,
+    ) -> Serialise:
+        """
+        Resolve the serialisation used to decode a message.
+
+        The `default` (the queues serialisation), or the content type it
+        encodes, is preferred if it matches the content type and encoding,
+        otherwise the registered serialisation is used. If nothing is
+        registered the default is returned.
+        """
+        content_type = _normalise(content_type)
+        content_encoding = _normalise(content_encoding)
+        if content_type is None or (
+            _normalise(default.content_type) == content_type
+            and _normalise(default.content_encoding) == content_encoding
+        ):
+            return default
+
+        # A payload below an encoding threshold is sent un-encoded
+        content = getattr(default, "content", None)
+        if content_encoding is None and content is not None:
+            if _normalise(content.content_type) == content_type:
+                return content
+
+        return self._serialisations.get((content_type, content_encoding), default)
+
+
+registry = SerialisationRegistry()
+"""
+Default serialisation registry.
+
+Pickle is not registered by default as un-pickling data from an untrusted
+producer allows arbitrary code execution; register a :class:`PickleSerialise`
+instance explicitly if all producers are trusted.
+"""
+
+
+def _register_defaults():
+    content_types = [FastJSONSerialise()]
+    if msgpack is not None:
+        content_types.append(MsgPackSerialise())
+
+    encodings = [GZipEncoding]
+    if zstandard is not None:
+        encodings.append(ZstdEncoding)
+    if lz4_frame is not None:
+        encodings.append(LZ4Encoding)
+
+    for content_type in content_types:
+        registry.register(content_type)
+        for encoding in encodings:
+            registry.register(encoding(content_type))
+
 
-    def deserialise(self, data: bytes) -> Any:
-        return self.content.deserialise(gzip.decompress(data))
+_register_defaults()
@@ -0,0 +1,340 @@
+"""
+Shared Memory Ring
+~~~~~~~~~~~~~~~~~~
+
+Inter-process message ring buffer used by the AsyncIO and Synchronous shared
+memory queues (see :mod:`pyapp_ext.messaging.aio.shm` and
+:mod:`pyapp_ext.messaging.sio.shm`).
+
+Messages are stored in a named :mod:`multiprocessing.shared_memory` segment
+so processes on the same host exchange messages without a broker. Each
+message is written as a small fixed header followed by the content type,
+content encoding and raw body; bodies are copied into and out of the ring but
+are never pickled.
+
+Access to the ring is serialised with an ``fcntl`` lock file and receivers
+are woken through a named FIFO (one byte is written per message), so waiting
+receivers do not poll.
+
+Requires Python 3.8+ on a POSIX platform.
+
+"""
+import os
+import struct
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # pragma: no cover
+    shared_memory = None
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+from .exceptions import MessagingError
+from .serialisation import Body
+
+__all__ = ("SharedMemoryRing", "DEFAULT_CAPACITY")
+
+DEFAULT_CAPACITY = 16 * 1024 * 1024
+
+MAGIC = b"PYMR"
+VERSION = 1
+HEADER = struct.Struct("<4sIQ")  # Magic, version, capacity
+POSITION = struct.Struct("<Q")
+HEAD_OFFSET = HEADER.size
+TAIL_OFFSET = HEAD_OFFSET + POSITION.size
+DATA_OFFSET = 64
+
+RECORD = struct.Struct("<IIHH")  # Body length, flags, content type/encoding length
+FLAG_STR = 0x01
+
+
+def _open_segment(name: str, size: int = 0) -> "shared_memory.SharedMemory":
+    """
+    Create (if a size is supplied) or attach to a shared memory segment.
+
+    The segment must outlive the process that created it so it is removed
+    from the resource tracker, which would otherwise unlink it on exit.
+    """
+    segment = shared_memory.SharedMemory(name, create=bool(size), size=size)
+    try:
+        from multiprocessing import resource_tracker
+
+        resource_tracker.unregister(segment._name, "shared_memory")
+    except Exception:  # pragma: no cover
+        pass
+    return segment
+
+
+class SharedMemoryRing:
+    """
+    Ring buffer of messages in a named shared memory segment.
+
+    The ring is created by the first process to open it; `capacity` is
+    ignored when attaching to an existing ring. Write and read positions are
+    ever increasing byte counters stored in the segment header, so the space
+    used is always `tail - head`.
+
+    :param name: Name of the ring; used to name the segment, lock file and
+        notification FIFO.
+    :param capacity: Size in bytes of the message area of the ring.
+    :param directory: Directory for the lock file and FIFO; defaults to the
+        system temporary directory.
+
+    """
+
+    __slots__ = (
+        "name",
+        "capacity",
+        "directory",
+        "_segment",
+        "_buf",
+        "_lock",
+        "_lock_fd",
+        "_notify_fd",
+    )
+
+    def __init__(
+        self, name: str, *, capacity: int = DEFAULT_CAPACITY, directory: str = None
+    ):
+        if shared_memory is None or fcntl is None:
+            raise ImportError(
+                "Shared memory queues require Python 3.8+ on a POSIX platform"
+            )
+
+        self.name = name
+        self.capacity = capacity
+        self.directory = directory
+        self._segment = None
+        self._buf = None
+        self._lock = threading.Lock()
+        self._lock_fd = None
+        self._notify_fd = None
+
+    def __repr__(self):
+        return f"<SharedMemoryRing {self.name!r} capacity={self.capacity}>"
+
+    @property
+    def path(self) -> str:
+        """
+        Path prefix of the lock file and notification FIFO.
+        """
+        directory = self.directory or tempfile.gettempdir()
+        return os.path.join(directory, f"pyapp-messaging-{self.name}")
+
+    @property
+    def segment_name(self) -> str:
+        return f"pyapp-messaging-{self.name}"
+
+    @property
+    def is_open(self) -> bool:
+        return self._segment is not None
+
+    @property
+    def notify_fd(self) -> int:
+        """
+        File descriptor that is readable when a message may be available.
+        """
+        return self._notify_fd
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def open(self):
+        """
+        Attach to the ring, creating it if it does not exist.
+        """
+        if self.is_open:
+            return
+
+        path = self.path
+        self._lock_fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+        with self._locked():
+            try:
+                segment = _open_segment(self.segment_name)
+            except FileNotFoundError:
+                segment = _open_segment(self.segment_name, DATA_OFFSET + self.capacity)
+                HEADER.pack_into(segment.buf, 0, MAGIC, VERSION, self.capacity)
+                POSITION.pack_into(segment.buf, HEAD_OFFSET, 0)
+                POSITION.pack_into(segment.buf, TAIL_OFFSET, 0)
+            else:
+                magic, version, capacity = HEADER.unpack_from(segment.buf, 0)
+                if magic != MAGIC or version != VERSION:
+                    segment.close()
+                    raise MessagingError(
+                        f"Shared memory segment {self.segment_name!r} is not a "
+                        "message ring"
+                    )
+                self.capacity = capacity
+
+        self._segment = segment
+        self._buf = segment.buf
+
+        try:
+            os.mkfifo(f"{path}.fifo", 0o600)
+        except FileExistsError:
+            pass
+        # Opened read/write so neither end blocks waiting for the other
+        self._notify_fd = os.open(f"{path}.fifo", os.O_RDWR | os.O_NONBLOCK)
+
+    def close(self):
+        """
+        Detach from the ring; the ring and any messages remain available to
+        other processes.
+        """
+        if self._segment is not None:
+            self._buf = None
+            self._segment.close()
+            self._segment = None
+        for fd in (self._notify_fd, self._lock_fd):
+            if fd is not None:
+                os.close(fd)
+        self._notify_fd = self._lock_fd = None
+
+    def unlink(self):
+        """
+        Remove the ring along with its lock file and FIFO.
+        """
+        self.close()
+        try:
+            segment = shared_memory.SharedMemory(self.segment_name)
+        except FileNotFoundError:
+            pass
+        else:
+            segment.close()
+            segment.unlink()
+        for suffix in (".lock", ".fifo"):
+            try:
+                os.remove(self.path + suffix)
+            except FileNotFoundError:
+                pass
+
+    def __len__(self):
+        """
+        Bytes used by messages in the ring
+        """
+        with self._locked():
+            return self._tail - self._head
+
+    @property
+    def _head(self) -> int:
+        return POSITION.unpack_from(self._buf, HEAD_OFFSET)[0]
+
+    @property
+    def _tail(self) -> int:
+        return POSITION.unpack_from(self._buf, TAIL_OFFSET)[0]
+
+    def _write(self, position: int, data: memoryview) -> int:
+        capacity = self.capacity
+        offset = position % capacity
+        first = min(len(data), capacity - offset)
+        start = DATA_OFFSET + offset
+        self._buf[start : start + first] = data[:first]
+        if first < len(data):
+            self._buf[DATA_OFFSET : DATA_OFFSET + len(data) - first] = data[first:]
+        return position + len(data)
+
+    def _read(self, position: int, size: int) -> bytes:
+        capacity = self.capacity
+        offset = position % capacity
+        first = min(size, capacity - offset)
+        start = DATA_OFFSET + offset
+        data = bytes(self._buf[start : start + first])
+        if first < size:
+            data += bytes(self._buf[DATA_OFFSET : DATA_OFFSET + size - first])
+        return data
+
+    def put(
+        self, body: Body, content_type: str = None, content_encoding: str = None
+    ) -> bool:
+        """
+        Write a message to the ring and notify receivers.
+
+        :return: `False` if there is not enough free space in the ring.
+        :raises ValueError: The message is larger than the ring.
+        """
+        flags = 0
+        if isinstance(body, str):
+            body = body.encode()
+            flags |= FLAG_STR
+        body = memoryview(body).cast("B")
+        content_type = (content_type or "").encode()
+        content_encoding = (content_encoding or "").encode()
+
+        size = RECORD.size + len(content_type) + len(content_encoding) + len(body)
+        if size > self.capacity:
+            raise ValueError(
+                f"Message of {size} bytes is larger than the ring ({self.capacity})"
+            )
+
+        with self._locked():
+            tail = self._tail
+            if self.capacity - (tail - self._head) < size:
+                return False
+
+            record = RECORD.pack(
+                len(body), flags, len(content_type), len(content_encoding)
+            )
+            position = self._write(tail, memoryview(record))
+            position = self._write(position, memoryview(content_type))
+            position = self._write(position, memoryview(content_encoding))
+            position = self._write(position, body)
+            POSITION.pack_into(self._buf, TAIL_OFFSET, position)
+
+        try:
+            os.write(self._notify_fd, b"\0")
+        except BlockingIOError:
+            # The FIFO is full of notifications so receivers will be woken.
+            pass
+        return True
+
+    def get(self) -> Optional[Tuple[Body, Optional[str], Optional[str]]]:
+        """
+        Read the next message from the ring.
+
+        :return: Body, content type and content encoding of the message; or
+            `None` if the ring is empty.
+        """
+        with self._locked():
+            head = self._head
+            if head == self._tail:
+                return None
+
+            body_size, flags, type_size, encoding_size = RECORD.unpack(
+                self._read(head, RECORD.size)
+            )
+            position = head + RECORD.size
+            content_type = self._read(position, type_size).decode()
+            position += type_size
+            content_encoding = self._read(position, encoding_size).decode()
+            position += encoding_size
+            body = self._read(position, body_size)
+            POSITION.pack_into(self._buf, HEAD_OFFSET, position + body_size)
+
+        if flags & FLAG_STR:
+            body = body.decode()
+        return body, content_type or None, content_encoding or None
+
+    def consume_notification(self):
+        """
+        Consume all pending notifications; called once :attr:`notify_fd` is
+        readable before retrying :meth:`get` (which reads every message that
+        is available, so stale notifications would only cause idle wake ups).
+        """
+        try:
+            while os.read(self._notify_fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
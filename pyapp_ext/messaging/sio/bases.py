@@ -9,9 +9,12 @@ These interfaces to be used with both Message Queue and Pub/Sub style queues.
 """
 import abc
 import logging
-from typing import Any, Generator, NamedTuple, Dict, Optional
+from collections import defaultdict
+import time
+from typing import Any, Generator, Dict, Optional, Iterable, List
 
-from ..serialisation import Serialise, JSONSerialise
+from ..message import BaseMessage
+from ..serialisation import Body, Serialise, JSONSerialise
 
 LOGGER = logging.getLogger(__name__)
 DEFAULT_SERIALISE = JSONSerialise()
@@ -76,11 +79,38 @@ class MessageSender(QueueBase, metaclass=abc.ABCMeta):
 
     @abc.abstractmethod
     def send_raw(
-        self, body: str, *, content_type: str = None, content_encoding: str = None
+        self, body: Body, *, content_type: str = None, content_encoding: str = None
     ):
         """
         Send a raw message to the task queue. This accepts a prepared and encoded body.
+
+        Bodies may be any bytes-like object (or str); implementations should
+        pass the body to their client without copying it where possible.
+        """
+
+    def send_raw_many(
+        self,
+        bodies: Iterable[Body],
+        *,
+        content_type: str = None,
+        content_encoding: str = None,
+    ) -> List[str]:
+        """
+        Send multiple raw messages to the task queue. This accepts prepared and
+        encoded bodies that share a content type and encoding.
+
+        Backends that provide a bulk send (eg SQS SendMessageBatch or pipelined
+        AMQP publishes) should override this method; the default implementation
+        calls :meth:`send_raw` for each body.
+
+        Results from each send are returned in the same order as the bodies.
         """
+        return [
+            self.send_raw(
+                body, content_type=content_type, content_encoding=content_encoding
+            )
+            for body in bodies
+        ]
 
     def send(self, d: Dict[str, Any] = None, **data) -> str:
         """
@@ -90,23 +120,46 @@ class MessageSender(QueueBase, metaclass=abc.ABCMeta):
             data.update(d)
 
         serialisation = self.serialisation
+        body, content_encoding = serialisation.serialise_encoded(data)
         return self.send_raw(
-            serialisation.serialise(data),
+            body,
             content_type=serialisation.content_type,
-            content_encoding=serialisation.content_encoding,
+            content_encoding=content_encoding,
         )
 
+    def send_many(self, items: Iterable[Dict[str, Any]]) -> List[str]:
+        """
+        Send multiple messages to the task queue.
+
+        All messages are serialised in a single pass before being handed to
+        :meth:`send_raw_many`; as encodings may skip encoding small payloads
+        messages are grouped by the content encoding actually applied.
+        """
+        serialisation = self.serialisation
+        groups = defaultdict(list)
+        for idx, item in enumerate(items):
+            body, content_encoding = serialisation.serialise_encoded(item)
+            groups[content_encoding].append((idx, body))
+
+        results = [None] * sum(len(group) for group in groups.values())
+        for content_encoding, group in groups.items():
+            sent = self.send_raw_many(
+                [body for _, body in group],
+                content_type=serialisation.content_type,
+                content_encoding=content_encoding,
+            )
+            for (idx, _), result in zip(group, sent):
+                results[idx] = result
+
+        return results
 
-class Message(NamedTuple):
+
+class Message(BaseMessage):
     """
     Message Received
     """
 
-    body: Any
-    content_type: str
-    content_encoding: Optional[str]
-    envelope: Any
-    queue: "MessageReceiver"
+    __slots__ = ()
 
     def delete(self):
         """
@@ -114,13 +167,6 @@ class Message(NamedTuple):
         """
         self.queue.delete(self)
 
-    @property
-    def content(self):
-        """
-        De-serialised message content
-        """
-        return self.queue.serialisation.deserialise(self.body)
-
 
 class MessageReceiver(QueueBase, metaclass=abc.ABCMeta):
     """
@@ -141,13 +187,106 @@ class MessageReceiver(QueueBase, metaclass=abc.ABCMeta):
         Delete/Acknowledge message from queue
         """
 
+    def delete_many(self, messages: Iterable[Message]):
+        """
+        Delete/Acknowledge multiple messages from queue.
+
+        Backends that provide a bulk acknowledge (eg SQS DeleteMessageBatch or
+        AMQP multiple acks) should override this method; the default
+        implementation calls :meth:`delete` for each message.
+        """
+        for message in messages:
+            self.delete(message)
+
+    def receive_batch(
+        self, max_messages: int = 10, max_wait: Optional[float] = 0.0
+    ) -> List[Message]:
+        """
+        Receive a batch of up to `max_messages` messages from the queue.
+
+        Waits for at least one message and then collects messages until the
+        batch is full or `max_wait` seconds have elapsed (`None` waits until
+        the batch is full). As receiving is blocking the elapsed time is only
+        checked as each message arrives, so by default the batch is returned
+        as soon as its first message is received.
+
+        Backends that provide a batch receive (eg SQS ReceiveMessage) should
+        override this method.
+        """
+        messages = self.receive_raw()
+        try:
+            return next(batched(messages, max_messages, max_wait), [])
+        finally:
+            messages.close()
+
     def listen(
-        self, *, auto_delete: bool = True
+        self,
+        *,
+        auto_delete: bool = True,
+        batch_size: int = None,
+        max_wait: float = None,
+        delete_batch_size: int = 1,
     ) -> Generator[Message, None, None]:
         """
         Listen to queue for messages.
+
+        :param auto_delete: Delete messages once the consumer has processed them.
+        :param batch_size: Yield lists of up to this many messages instead of
+            individual messages; processed batches are deleted with
+            :meth:`delete_many`.
+        :param max_wait: Time in seconds to collect a batch after its first
+            message is received.
+        :param delete_batch_size: Coalesce deletes of individually yielded
+            messages into calls to :meth:`delete_many` of up to this many
+            messages. Outstanding deletes are flushed when listening ends.
+
         """
-        for msg in self.receive_raw():
-            yield msg
-            if auto_delete:
-                self.delete(msg)
+        if batch_size:
+            for batch in batched(self.receive_raw(), batch_size, max_wait):
+                yield batch
+                if auto_delete:
+                    self.delete_many(batch)
+            return
+
+        pending_deletes = []
+        try:
+            for msg in self.receive_raw():
+                yield msg
+                if auto_delete:
+                    if delete_batch_size > 1:
+                        pending_deletes.append(msg)
+                        if len(pending_deletes) >= delete_batch_size:
+                            self.delete_many(pending_deletes)
+                            pending_deletes = []
+                    else:
+                        self.delete(msg)
+        finally:
+            if pending_deletes:
+                self.delete_many(pending_deletes)
+
+
+def batched(
+    messages: Iterable[Message], size: int, max_wait: Optional[float]
+) -> Generator[List[Message], None, None]:
+    """
+    Group messages from an iterable into batches of up to `size` messages.
+
+    A batch is started by the first message received and is yielded once it is
+    full or a message arrives `max_wait` seconds or more after that first message.
+    """
+    batch = []
+    deadline = None
+    for message in messages:
+        batch.append(message)
+        if deadline is None and max_wait is not None:
+            deadline = time.monotonic() + max_wait
+
+        if len(batch) >= size or (
+            deadline is not None and time.monotonic() >= deadline
+        ):
+            yield batch
+            batch = []
+            deadline = None
+
+    if batch:
+        yield batch
@@ -0,0 +1,133 @@
+"""
+Consumers
+~~~~~~~~~
+
+Consumers that process messages from a :class:`MessageReceiver` in parallel.
+
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from .bases import MessageReceiver, Message
+
+LOGGER = logging.getLogger(__name__)
+
+
+class ThreadPoolConsumer:
+    """
+    Consume messages using a pool of worker threads for I/O bound handlers.
+
+    A new message is only received from the queue once there is capacity for
+    it so at most `max_in_flight` messages are held at once. Each message is
+    deleted by the worker thread once its handler completes successfully;
+    messages whose handler (or delete) fails are not deleted so they can be
+    redelivered by the queue. The receiver must support deleting messages
+    from worker threads.
+
+    Calling :meth:`stop` (eg from a signal handler or another thread) stops
+    receiving messages; :meth:`run` returns once in-flight messages have been
+    handled. A stop requested before :meth:`run` is called is honoured.
+
+    :param receiver: Queue to receive messages from.
+    :param handler: Function called with each message.
+    :param workers: Number of worker threads.
+    :param max_in_flight: Maximum number of messages being handled or waiting
+        for a worker; defaults to the number of workers.
+    :param on_error: Called with the message and exception when a handler
+        fails. If not supplied (or `on_error` itself fails) consumption stops
+        and the first failure is raised once in-flight messages have been
+        handled.
+
+    """
+
+    __slots__ = (
+        "receiver",
+        "handler",
+        "workers",
+        "max_in_flight",
+        "on_error",
+        "_stopping",
+    )
+
+    def __init__(
+        self,
+        receiver: MessageReceiver,
+        handler: Callable[[Message], Any],
+        *,
+        workers: int = 4,
+        max_in_flight: int = None,
+        on_error: Callable[[Message, Exception], Any] = None,
+    ):
+        self.receiver = receiver
+        self.handler = handler
+        self.workers = workers
+        self.max_in_flight = max_in_flight or workers
+        self.on_error = on_error
+        self._stopping = threading.Event()
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.receiver!r} workers={self.workers}>"
+
+    def stop(self):
+        """
+        Stop receiving messages.
+        """
+        self._stopping.set()
+
+    def run(self):
+        """
+        Consume messages until the queue is exhausted, :meth:`stop` is called
+        or a handler fails; may be called again once it returns.
+        """
+        handler = self.handler
+        on_error = self.on_error
+        stopping = self._stopping
+        slots = threading.BoundedSemaphore(self.max_in_flight)
+        failures = []
+
+        def process(message: Message):
+            try:
+                handler(message)
+                message.delete()
+            except Exception as ex:
+                if on_error is None:
+                    failures.append(ex)
+                    stopping.set()
+                else:
+                    # Exceptions raised in a worker are otherwise lost in the
+                    # (discarded) executor future.
+                    try:
+                        on_error(message, ex)
+                    except Exception as error_ex:
+                        LOGGER.exception("on_error callback failed")
+                        failures.append(error_ex)
+                        stopping.set()
+            finally:
+                slots.release()
+
+        messages = self.receiver.receive_raw()
+        with ThreadPoolExecutor(self.workers) as executor:
+            try:
+                while not stopping.is_set():
+                    slots.acquire()
+                    if stopping.is_set():
+                        break
+
+                    try:
+                        message = next(messages)
+                    except StopIteration:
+                        break
+
+                    executor.submit(process, message)
+
+            finally:
+                LOGGER.debug("Waiting for in-flight messages...")
+                messages.close()
+
+        # Reset once stopped (rather than on entry) so a stop requested before
+        # run() is called is not lost.
+        stopping.clear()
+        if failures:
+            raise failures[0]
@@ -0,0 +1,164 @@
+"""
+Log Queues
+~~~~~~~~~~
+
+Durable single node message queues backed by a memory-mapped append-only log
+(see :mod:`pyapp_ext.messaging.log`), eg::
+
+    SEND_MESSAGE_QUEUES = {
+        "jobs": (
+            "pyapp_ext.messaging.sio.log.LogSender",
+            {"directory": "/var/lib/myapp/jobs", "sync_window": 0.005},
+        ),
+    }
+
+    RECEIVE_MESSAGE_QUEUES = {
+        "jobs": (
+            "pyapp_ext.messaging.sio.log.LogReceiver",
+            {"directory": "/var/lib/myapp/jobs", "group": "workers"},
+        ),
+    }
+
+"""
+from typing import Generator, Iterable, Optional
+
+from .bases import MessageSender, MessageReceiver, Message
+from ..log import ConsumerGroup, SegmentedLog, open_log
+from ..serialisation import Body
+
+__all__ = ("LogSender", "LogReceiver")
+
+
+class LogSender(MessageSender):
+    """
+    Append messages to a durable log.
+
+    :param directory: Directory of the log.
+    :param segment_size: Size in bytes of log segment files.
+    :param sync_window: Durability window in seconds. Sends block until the
+        message is synced to disk; sends made within the window share a single
+        sync (group commit). `0` syncs every message and `None` leaves
+        writing back to the operating system (sends do not wait).
+
+    """
+
+    __slots__ = ("directory", "segment_size", "sync_window", "_log")
+
+    def __init__(
+        self,
+        *,
+        directory: str,
+        segment_size: int = None,
+        sync_window: Optional[float] = 0.002,
+    ):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.sync_window = sync_window
+        self._log = None
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.directory!r}>"
+
+    def _attach(self) -> SegmentedLog:
+        self._log = open_log(self.directory, segment_size=self.segment_size)
+        return self._log
+
+    @property
+    def log(self) -> SegmentedLog:
+        log = self._log
+        return log if log is not None and not log.closed else self._attach()
+
+    def open(self):
+        self._attach()
+
+    def close(self):
+        if self._log is not None and not self._log.closed:
+            self._log.sync()
+
+    def configure(self):
+        self._attach()
+
+    def send_raw(
+        self, body: Body, *, content_type: str = None, content_encoding: str = None
+    ) -> int:
+        log = self.log
+        offset = log.append(body, content_type, content_encoding)
+        if self.sync_window is not None:
+            log.commit(offset, self.sync_window)
+        return offset
+
+
+class LogReceiver(MessageReceiver):
+    """
+    Receive messages from a durable log as a member of a consumer group.
+
+    Messages are delivered in order to receivers of the same group (within
+    this process); each group receives every message. The envelope of a
+    message is its offset. Messages that are not deleted are redelivered when
+    the log is re-opened (eg after a restart) or the group is rewound.
+
+    :param directory: Directory of the log.
+    :param group: Name of the consumer group.
+    :param segment_size: Size in bytes of log segment files.
+    :param idle_timeout: Stop receiving once no message has been received for
+        this many seconds; `None` waits indefinitely.
+
+    """
+
+    __slots__ = ("directory", "group_name", "segment_size", "idle_timeout", "_log")
+
+    def __init__(
+        self,
+        *,
+        directory: str,
+        group: str = "default",
+        segment_size: int = None,
+        idle_timeout: float = None,
+    ):
+        self.directory = directory
+        self.group_name = group
+        self.segment_size = segment_size
+        self.idle_timeout = idle_timeout
+        self._log = None
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.directory!r} group={self.group_name!r}>"
+
+    def _attach(self) -> SegmentedLog:
+        self._log = open_log(self.directory, segment_size=self.segment_size)
+        return self._log
+
+    @property
+    def log(self) -> SegmentedLog:
+        log = self._log
+        return log if log is not None and not log.closed else self._attach()
+
+    @property
+    def group(self) -> ConsumerGroup:
+        return self.log.group(self.group_name)
+
+    def open(self):
+        self._attach().group(self.group_name)
+
+    def close(self):
+        pass
+
+    def configure(self):
+        self._attach().group(self.group_name)
+
+    def receive_raw(self) -> Generator[Message, None, None]:
+        log = self.log
+        group = self.group
+        while True:
+            record = log.read_wait(group, self.idle_timeout)
+            if record is None:
+                return
+
+            offset, body, content_type, content_encoding = record
+            yield Message(body, content_type, content_encoding, offset, self)
+
+    def delete(self, message: Message):
+        self.log.ack(self.group, message.envelope)
+
+    def delete_many(self, messages: Iterable[Message]):
+        self.log.ack(self.group, *(message.envelope for message in messages))
@@ -0,0 +1,222 @@
+"""
+In-Memory Queues
+~~~~~~~~~~~~~~~~
+
+Message queues backed by the in-process broker (see
+:mod:`pyapp_ext.messaging.memory`).
+
+Memory queues are registered like any other queue, eg::
+
+    SEND_MESSAGE_QUEUES = {
+        "jobs": (
+            "pyapp_ext.messaging.sio.memory.MemorySender",
+            {"queue_name": "jobs", "max_size": 1000},
+        ),
+    }
+
+    RECEIVE_MESSAGE_QUEUES = {
+        "jobs": (
+            "pyapp_ext.messaging.sio.memory.MemoryReceiver",
+            {"queue_name": "jobs", "visibility_timeout": 30},
+        ),
+    }
+
+Queues are shared with the AsyncIO memory queues so messages can be passed
+between threads and event loops of the same process.
+
+"""
+from typing import Generator, Iterable, List, Optional, Sequence
+
+from .bases import MessageSender, MessageReceiver, Message
+from ..memory import Delivery, MemoryBroker, MemoryQueue, broker as default_broker
+from ..serialisation import Body
+
+__all__ = ("MemorySender", "MemoryReceiver")
+
+
+class MemorySender(MessageSender):
+    """
+    Send messages to a queue or publish messages to a topic of an in-memory
+    broker.
+
+    Bodies are put on the queue without being copied; the same body object is
+    shared by every queue subscribed to a topic.
+
+    :param queue_name: Name of the queue to send messages to.
+    :param topic: Name of the topic to publish messages to (instead of a queue).
+    :param max_size: Capacity of the queue; if not supplied the capacity of
+        the queue is not changed (new queues are unbounded).
+    :param timeout: Time in seconds to block waiting for space on a full queue
+        before raising :class:`QueueFull`; `None` waits indefinitely.
+    :param broker: Broker to use; defaults to the broker shared by the process.
+
+    """
+
+    __slots__ = ("queue_name", "topic", "max_size", "timeout", "broker", "_queue")
+
+    def __init__(
+        self,
+        *,
+        queue_name: str = None,
+        topic: str = None,
+        max_size: int = None,
+        timeout: float = None,
+        broker: MemoryBroker = None,
+    ):
+        if (queue_name is None) == (topic is None):
+            raise ValueError("One of queue_name or topic must be supplied")
+
+        self.queue_name = queue_name
+        self.topic = topic
+        self.max_size = max_size
+        self.timeout = timeout
+        self.broker = broker or default_broker
+        self._queue = None
+
+    def __repr__(self):
+        if self.topic is None:
+            return f"<{type(self).__name__} queue={self.queue_name!r}>"
+        return f"<{type(self).__name__} topic={self.topic!r}>"
+
+    def _targets(self) -> List[MemoryQueue]:
+        if self.topic is not None:
+            return self.broker.subscribers(self.topic)
+        if self._queue is None:
+            self._queue = self.broker.declare_queue(
+                self.queue_name, max_size=self.max_size
+            )
+        return [self._queue]
+
+    def open(self):
+        self._targets()
+
+    def close(self):
+        pass
+
+    def configure(self):
+        self._targets()
+
+    def send_raw(
+        self, body: Body, *, content_type: str = None, content_encoding: str = None
+    ) -> str:
+        queues = self._targets()
+        message_id, items = self.broker.items(
+            body, content_type, content_encoding, len(queues)
+        )
+        for queue, item in zip(queues, items):
+            queue.put(item, self.timeout)
+        return message_id
+
+
+class MemoryReceiver(MessageReceiver):
+    """
+    Receive messages from a queue of an in-memory broker.
+
+    Multiple receivers of the same queue compete for messages. A received
+    message is held in-flight until it is deleted; if it is not deleted within
+    `visibility_timeout` seconds it is redelivered (to any receiver). The
+    envelope of each message is a :class:`Delivery`.
+
+    Receiving continues until the queue is closed and empty or, if an
+    `idle_timeout` is supplied, no message is received for that long.
+
+    :param queue_name: Name of the queue to receive messages from.
+    :param topics: Topics to subscribe the queue to when opened/configured.
+    :param max_size: Capacity of the queue; if not supplied the capacity of
+        the queue is not changed (new queues are unbounded).
+    :param visibility_timeout: Time in seconds a received message is held
+        before it is redelivered; `None` holds messages until deleted.
+    :param idle_timeout: Stop receiving once no message has been received for
+        this many seconds; `None` waits indefinitely.
+    :param broker: Broker to use; defaults to the broker shared by the process.
+
+    """
+
+    __slots__ = (
+        "queue_name",
+        "topics",
+        "max_size",
+        "visibility_timeout",
+        "idle_timeout",
+        "broker",
+        "_queue",
+    )
+
+    def __init__(
+        self,
+        *,
+        queue_name: str,
+        topics: Sequence[str] = (),
+        max_size: int = None,
+        visibility_timeout: Optional[float] = 30.0,
+        idle_timeout: float = None,
+        broker: MemoryBroker = None,
+    ):
+        self.queue_name = queue_name
+        self.topics = tuple(topics)
+        self.max_size = max_size
+        self.visibility_timeout = visibility_timeout
+        self.idle_timeout = idle_timeout
+        self.broker = broker or default_broker
+        self._queue = None
+
+    def __repr__(self):
+        return f"<{type(self).__name__} queue={self.queue_name!r}>"
+
+    def _declare(self) -> MemoryQueue:
+        broker = self.broker
+        self._queue = broker.declare_queue(self.queue_name, max_size=self.max_size)
+        for topic in self.topics:
+            broker.subscribe(topic, self.queue_name)
+        return self._queue
+
+    @property
+    def queue(self) -> MemoryQueue:
+        """
+        Queue messages are received from; declared (and subscribed to topics)
+        on first use.
+        """
+        return self._queue or self._declare()
+
+    def open(self):
+        self._declare()
+
+    def close(self):
+        pass
+
+    def configure(self):
+        self._declare()
+
+    def receive_raw(self) -> Generator[Message, None, None]:
+        queue = self.queue
+        while True:
+            delivery = queue.get(self.idle_timeout, self.visibility_timeout)
+            if delivery is None:
+                return
+
+            receipt, item = delivery
+            yield Message(
+                item.body,
+                item.content_type,
+                item.content_encoding,
+                Delivery(item.message_id, receipt, item.delivery_count),
+                self,
+            )
+
+    def delete(self, message: Message):
+        self.queue.ack(message.envelope.receipt)
+
+    def delete_many(self, messages: Iterable[Message]):
+        self.queue.ack(*(message.envelope.receipt for message in messages))
+
+    def release(self, message: Message):
+        """
+        Return a message to the queue to be redelivered immediately.
+        """
+        self.queue.release(message.envelope.receipt)
+
+    def release_many(self, messages: Iterable[Message]):
+        """
+        Return messages to the queue to be redelivered immediately, in order.
+        """
+        self.queue.release(*(message.envelope.receipt for message in messages))
@@ -0,0 +1,161 @@
+"""
+Shared Memory Queues
+~~~~~~~~~~~~~~~~~~~~
+
+Message queues for processes on the same host backed by a shared memory ring
+buffer (see :mod:`pyapp_ext.messaging.shm`), eg::
+
+    SEND_MESSAGE_QUEUES = {
+        "jobs": (
+            "pyapp_ext.messaging.sio.shm.SharedMemorySender",
+            {"name": "jobs", "capacity": 64 * 1024 * 1024},
+        ),
+    }
+
+    RECEIVE_MESSAGE_QUEUES = {
+        "jobs": ("pyapp_ext.messaging.sio.shm.SharedMemoryReceiver", {"name": "jobs"}),
+    }
+
+Rings are shared with the AsyncIO shared memory queues.
+
+"""
+import select
+import time
+from typing import Generator
+
+from .bases import MessageSender, MessageReceiver, Message
+from ..exceptions import QueueFull
+from ..serialisation import Body
+from ..shm import SharedMemoryRing, DEFAULT_CAPACITY
+
+__all__ = ("SharedMemorySender", "SharedMemoryReceiver")
+
+
+class SharedMemorySender(MessageSender):
+    """
+    Send messages to a shared memory ring.
+
+    When the ring is full sending waits (polling with a short back-off) for
+    receivers to free space.
+
+    :param name: Name of the ring.
+    :param capacity: Size in bytes of the ring if it is created.
+    :param timeout: Time in seconds to wait for space in a full ring before
+        raising :class:`QueueFull`; `None` waits indefinitely.
+    :param directory: Directory for the ring lock file and FIFO.
+
+    """
+
+    __slots__ = ("ring", "timeout")
+
+    def __init__(
+        self,
+        *,
+        name: str,
+        capacity: int = DEFAULT_CAPACITY,
+        timeout: float = None,
+        directory: str = None,
+    ):
+        self.ring = SharedMemoryRing(name, capacity=capacity, directory=directory)
+        self.timeout = timeout
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.ring.name!r}>"
+
+    def open(self):
+        self.ring.open()
+
+    def close(self):
+        self.ring.close()
+
+    def configure(self):
+        self.ring.open()
+
+    def send_raw(
+        self, body: Body, *, content_type: str = None, content_encoding: str = None
+    ):
+        ring = self.ring
+        if not ring.is_open:
+            ring.open()
+        if ring.put(body, content_type, content_encoding):
+            return
+
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        delay = 0.0001
+        while not ring.put(body, content_type, content_encoding):
+            if deadline is not None and time.monotonic() >= deadline:
+                raise QueueFull(f"Shared memory ring {ring.name!r} is full")
+            time.sleep(delay)
+            delay = min(delay * 2, 0.01)
+
+
+class SharedMemoryReceiver(MessageReceiver):
+    """
+    Receive messages from a shared memory ring.
+
+    Multiple receivers (in any process) compete for messages. Messages are
+    removed from the ring as they are received so :meth:`delete` has nothing
+    to do; messages are not redelivered if a receiver fails.
+
+    :param name: Name of the ring.
+    :param capacity: Size in bytes of the ring if it is created.
+    :param idle_timeout: Stop receiving once no message has been received for
+        this many seconds; `None` waits indefinitely.
+    :param directory: Directory for the ring lock file and FIFO.
+
+    """
+
+    __slots__ = ("ring", "idle_timeout")
+
+    def __init__(
+        self,
+        *,
+        name: str,
+        capacity: int = DEFAULT_CAPACITY,
+        idle_timeout: float = None,
+        directory: str = None,
+    ):
+        self.ring = SharedMemoryRing(name, capacity=capacity, directory=directory)
+        self.idle_timeout = idle_timeout
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.ring.name!r}>"
+
+    def open(self):
+        self.ring.open()
+
+    def close(self):
+        self.ring.close()
+
+    def configure(self):
+        self.ring.open()
+
+    def receive_raw(self) -> Generator[Message, None, None]:
+        ring = self.ring
+        if not ring.is_open:
+            ring.open()
+
+        idle_timeout = self.idle_timeout
+        deadline = None
+        while True:
+            message = ring.get()
+            if message is not None:
+                deadline = None
+                body, content_type, content_encoding = message
+                yield Message(body, content_type, content_encoding, None, self)
+                continue
+
+            timeout = None
+            if idle_timeout is not None:
+                now = time.monotonic()
+                if deadline is None:
+                    deadline = now + idle_timeout
+                timeout = max(deadline - now, 0)
+
+            readable, _, _ = select.select([ring.notify_fd], [], [], timeout)
+            if not readable:
+                return
+            ring.consume_notification()
+
+    def delete(self, message: Message):
+        pass
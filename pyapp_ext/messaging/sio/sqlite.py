@@ -0,0 +1,222 @@
+"""
+SQLite Queues
+~~~~~~~~~~~~~
+
+Persistent message queues for nodes without a broker backed by an SQLite
+database (see :mod:`pyapp_ext.messaging.sqlite`), eg::
+
+    SEND_MESSAGE_QUEUES = {
+        "jobs": (
+            "pyapp_ext.messaging.sio.sqlite.SQLiteSender",
+            {"path": "/var/lib/myapp/queues.db", "queue_name": "jobs"},
+        ),
+    }
+
+    RECEIVE_MESSAGE_QUEUES = {
+        "jobs": (
+            "pyapp_ext.messaging.sio.sqlite.SQLiteReceiver",
+            {"path": "/var/lib/myapp/queues.db", "queue_name": "jobs"},
+        ),
+    }
+
+Create the schema with the ``messaging configure`` command (or by calling
+:meth:`configure`).
+
+"""
+import time
+from typing import Generator, Iterable, List
+
+from .bases import MessageSender, MessageReceiver, Message
+from ..serialisation import Body
+from ..sqlite import SQLiteStore
+
+__all__ = ("SQLiteSender", "SQLiteReceiver")
+
+
+class SQLiteSender(MessageSender):
+    """
+    Send messages to a queue stored in an SQLite database.
+
+    :param path: Path of the database file.
+    :param queue_name: Name of the queue within the database.
+    :param commit_window: Time in seconds the first of a group of concurrent
+        sends (from multiple threads) waits for others to join a single
+        transaction (group commit); `0` commits each send immediately.
+    :param synchronous: SQLite synchronous mode (see :class:`SQLiteStore`).
+    :param busy_timeout: Time in seconds to wait for a locked database.
+
+    """
+
+    __slots__ = ("store", "queue_name", "commit_window")
+
+    def __init__(
+        self,
+        *,
+        path: str,
+        queue_name: str = "default",
+        commit_window: float = 0.0,
+        synchronous: str = "NORMAL",
+        busy_timeout: float = 5.0,
+    ):
+        self.store = SQLiteStore(
+            path, synchronous=synchronous, busy_timeout=busy_timeout
+        )
+        self.queue_name = queue_name
+        self.commit_window = commit_window
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.store.path!r} queue={self.queue_name!r}>"
+
+    def open(self):
+        self.store.create_schema()
+
+    def close(self):
+        self.store.close()
+
+    def configure(self):
+        self.store.create_schema()
+
+    def send_raw(
+        self, body: Body, *, content_type: str = None, content_encoding: str = None
+    ) -> int:
+        return self.store.insert(
+            self.queue_name, body, content_type, content_encoding, self.commit_window
+        )
+
+    def send_raw_many(
+        self,
+        bodies: Iterable[Body],
+        *,
+        content_type: str = None,
+        content_encoding: str = None,
+    ) -> List[int]:
+        return self.store.insert_many(
+            self.queue_name,
+            [(body, content_type, content_encoding) for body in bodies],
+        )
+
+
+class SQLiteReceiver(MessageReceiver):
+    """
+    Receive messages from a queue stored in an SQLite database.
+
+    Messages are claimed in batches of up to `batch_size` with a lease of
+    `visibility_timeout` seconds; messages that are not deleted before their
+    lease expires are redelivered (to any receiver in any process). The
+    envelope of a message is its :class:`Lease`. SQLite does not notify
+    receivers of new messages so an empty queue is polled, backing off up to
+    `poll_interval` seconds.
+
+    Deleted messages are marked as acknowledged and removed in bulk at most
+    every `vacuum_interval` seconds.
+
+    :param path: Path of the database file.
+    :param queue_name: Name of the queue within the database.
+    :param visibility_timeout: Lease time in seconds of a claimed message.
+    :param batch_size: Maximum number of messages claimed at once.
+    :param poll_interval: Maximum time in seconds between polls of an empty
+        queue.
+    :param idle_timeout: Stop receiving once no message has been received for
+        this many seconds; `None` waits indefinitely.
+    :param vacuum_interval: Minimum time in seconds between removing
+        acknowledged messages.
+    :param synchronous: SQLite synchronous mode (see :class:`SQLiteStore`).
+    :param busy_timeout: Time in seconds to wait for a locked database.
+
+    """
+
+    __slots__ = (
+        "store",
+        "queue_name",
+        "visibility_timeout",
+        "batch_size",
+        "poll_interval",
+        "idle_timeout",
+    )
+
+    def __init__(
+        self,
+        *,
+        path: str,
+        queue_name: str = "default",
+        visibility_timeout: float = 30.0,
+        batch_size: int = 10,
+        poll_interval: float = 0.5,
+        idle_timeout: float = None,
+        vacuum_interval: float = 60.0,
+        synchronous: str = "NORMAL",
+        busy_timeout: float = 5.0,
+    ):
+        self.store = SQLiteStore(
+            path,
+            synchronous=synchronous,
+            busy_timeout=busy_timeout,
+            vacuum_interval=vacuum_interval,
+        )
+        self.queue_name = queue_name
+        self.visibility_timeout = visibility_timeout
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.store.path!r} queue={self.queue_name!r}>"
+
+    def open(self):
+        self.store.create_schema()
+
+    def close(self):
+        self.store.close()
+
+    def configure(self):
+        self.store.create_schema()
+
+    def receive_raw(self) -> Generator[Message, None, None]:
+        store = self.store
+        delay = 0.01
+        deadline = None
+        while True:
+            rows = store.claim(
+                self.queue_name, self.batch_size, self.visibility_timeout
+            )
+            if rows:
+                delay = 0.01
+                deadline = None
+                yielded = 0
+                try:
+                    for lease, body, content_type, content_encoding in rows:
+                        yielded += 1
+                        yield Message(body, content_type, content_encoding, lease, self)
+                finally:
+                    # Rows claimed but not handed out (eg receive_batch only
+                    # needed some of them) are released rather than left
+                    # leased until their visibility timeout expires.
+                    unyielded = [lease for lease, *_ in rows[yielded:]]
+                    if unyielded:
+                        store.release_many(unyielded)
+                continue
+
+            if self.idle_timeout is not None:
+                now = time.monotonic()
+                if deadline is None:
+                    deadline = now + self.idle_timeout
+                if now >= deadline:
+                    return
+                delay = min(delay, deadline - now)
+
+            time.sleep(delay)
+            delay = min(delay * 2, self.poll_interval)
+
+    def delete(self, message: Message):
+        self.delete_many((message,))
+
+    def delete_many(self, messages: Iterable[Message]):
+        store = self.store
+        store.ack([message.envelope for message in messages])
+        store.maybe_vacuum()
+
+    def release(self, message: Message):
+        """
+        Return a message to the queue to be redelivered immediately.
+        """
+        self.store.release(message.envelope)
@@ -0,0 +1,376 @@
+"""
+SQLite Store
+~~~~~~~~~~~~
+
+Persistent message store used by the AsyncIO and Synchronous SQLite queues
+(see :mod:`pyapp_ext.messaging.aio.sqlite` and
+:mod:`pyapp_ext.messaging.sio.sqlite`).
+
+Messages are stored in a single table of an SQLite database running in WAL
+mode so receivers can read while senders write, and multiple processes on
+the same host can share a database. A message is:
+
+- *ready* until it is due,
+- *leased* once claimed by a receiver; the lease expires after a visibility
+  timeout after which the message may be claimed again,
+- *acked* once deleted by the receiver; acknowledged rows are removed in bulk
+  by :meth:`SQLiteStore.vacuum`.
+
+Claims are made by state and due time which is covered by an index.
+
+"""
+import sqlite3
+import threading
+import time
+from typing import Any, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from .serialisation import Body
+
+__all__ = ("Lease", "SQLiteStore", "READY", "LEASED", "ACKED")
+
+READY = 0
+LEASED = 1
+ACKED = 2
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        queue TEXT NOT NULL,
+        state INTEGER NOT NULL DEFAULT 0,
+        due REAL NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        content_type TEXT,
+        content_encoding TEXT,
+        body BLOB NOT NULL
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS messages_queue_state_due
+        ON messages (queue, state, due)
+    """,
+)
+
+
+class Lease(NamedTuple):
+    """
+    Envelope of a message claimed from an SQLite queue.
+
+    The number of attempts identifies the lease; an acknowledgement is ignored
+    if the message has since been claimed again.
+    """
+
+    id: int
+    attempts: int
+
+
+Row = Tuple[Lease, Body, Optional[str], Optional[str]]
+
+
+class SQLiteStore:
+    """
+    Message store in an SQLite database.
+
+    A single connection is used by the store and access to it is serialised
+    so a store can be shared by threads; calls block on database I/O.
+
+    :param path: Path of the database file.
+    :param synchronous: SQLite synchronous mode; `NORMAL` is durable in WAL
+        mode except for the last transactions before a power loss, use `FULL`
+        to sync every commit.
+    :param busy_timeout: Time in seconds to wait for the database to be
+        unlocked by another connection.
+    :param vacuum_interval: Minimum time in seconds between removing
+        acknowledged messages (see :meth:`maybe_vacuum`).
+
+    """
+
+    __slots__ = (
+        "path",
+        "synchronous",
+        "busy_timeout",
+        "vacuum_interval",
+        "_connection",
+        "_lock",
+        "_last_vacuum",
+        "_commit",
+        "_committing",
+        "_pending",
+    )
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        synchronous: str = "NORMAL",
+        busy_timeout: float = 5.0,
+        vacuum_interval: float = 60.0,
+    ):
+        self.path = path
+        self.synchronous = synchronous
+        self.busy_timeout = busy_timeout
+        self.vacuum_interval = vacuum_interval
+        self._connection = None
+        self._lock = threading.Lock()
+        self._last_vacuum = time.monotonic()
+        self._commit = threading.Condition()
+        self._committing = False
+        self._pending = []
+
+    def __repr__(self):
+        return f"<SQLiteStore {self.path!r}>"
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        connection = self._connection
+        if connection is None:
+            connection = sqlite3.connect(
+                self.path,
+                timeout=self.busy_timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            # Only takes effect for a new database and must be set before the
+            # switch to WAL; allows freed pages to be returned to the file
+            # system by vacuum.
+            connection.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(f"PRAGMA synchronous={self.synchronous}")
+            self._connection = connection
+        return connection
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _transaction(self, func, *args) -> Any:
+        with self._lock:
+            connection = self.connection
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(connection, *args)
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+            return result
+
+    def create_schema(self):
+        """
+        Create the messages table and index.
+        """
+        with self._lock:
+            connection = self.connection
+            for statement in SCHEMA:
+                connection.execute(statement)
+
+    def insert_many(
+        self, queue: str, messages: Sequence[Tuple[Body, Optional[str], Optional[str]]]
+    ) -> List[int]:
+        """
+        Insert messages in a single transaction (group commit).
+
+        :return: IDs of the inserted messages.
+        """
+
+        def insert(connection: sqlite3.Connection) -> List[int]:
+            now = time.time()
+            return [
+                connection.execute(
+                    "INSERT INTO messages "
+                    "(queue, state, due, content_type, content_encoding, body) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (queue, READY, now, content_type, content_encoding, body),
+                ).lastrowid
+                for body, content_type, content_encoding in messages
+            ]
+
+        return self._transaction(insert)
+
+    def insert(
+        self,
+        queue: str,
+        body: Body,
+        content_type: str = None,
+        content_encoding: str = None,
+        window: float = 0,
+    ) -> int:
+        """
+        Insert a message, blocking until it is committed.
+
+        The first caller waits `window` seconds for messages inserted by
+        other threads and commits them all in one transaction (group commit);
+        callers arriving while a commit is in progress join the next one.
+
+        :return: ID of the inserted message.
+        """
+        # Pending entry of queue, message, result, error and done
+        entry = [queue, (body, content_type, content_encoding), None, None, False]
+        commit = self._commit
+        with commit:
+            self._pending.append(entry)
+            while not entry[4]:
+                if not self._committing:
+                    self._committing = True
+                    break
+                commit.wait()
+
+        if not entry[4]:
+            try:
+                if window:
+                    time.sleep(window)
+                with commit:
+                    batch, self._pending = self._pending, []
+                self._commit_batch(batch)
+            finally:
+                with commit:
+                    self._committing = False
+                    commit.notify_all()
+
+        if entry[3] is not None:
+            raise entry[3]
+        return entry[2]
+
+    def _commit_batch(self, batch: List[list]):
+        def insert(connection: sqlite3.Connection):
+            now = time.time()
+            for entry in batch:
+                body, content_type, content_encoding = entry[1]
+                entry[2] = connection.execute(
+                    "INSERT INTO messages "
+                    "(queue, state, due, content_type, content_encoding, body) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (entry[0], READY, now, content_type, content_encoding, body),
+                ).lastrowid
+
+        try:
+            self._transaction(insert)
+        except Exception as ex:
+            for entry in batch:
+                entry[3] = ex
+        for entry in batch:
+            entry[4] = True
+
+    def claim(self, queue: str, limit: int, visibility_timeout: float) -> List[Row]:
+        """
+        Lease up to `limit` messages that are ready (or whose lease has
+        expired) in insertion order.
+        """
+
+        def claim(connection: sqlite3.Connection) -> List[Row]:
+            now = time.time()
+            rows = connection.execute(
+                "SELECT id, attempts, body, content_type, content_encoding "
+                "FROM messages WHERE queue = ? AND state IN (?, ?) AND due <= ? "
+                "ORDER BY id LIMIT ?",
+                (queue, READY, LEASED, now, limit),
+            ).fetchall()
+            if rows:
+                connection.executemany(
+                    "UPDATE messages SET state = ?, due = ?, attempts = ? WHERE id = ?",
+                    [
+                        (LEASED, now + visibility_timeout, attempts + 1, id_)
+                        for id_, attempts, *_ in rows
+                    ],
+                )
+            return [
+                (Lease(id_, attempts + 1), body, content_type, content_encoding)
+                for id_, attempts, body, content_type, content_encoding in rows
+            ]
+
+        return self._transaction(claim)
+
+    def ack(self, leases: Iterable[Lease]) -> int:
+        """
+        Mark leased messages as acknowledged.
+
+        :return: Number of messages acknowledged.
+        """
+
+        def ack(connection: sqlite3.Connection) -> int:
+            cursor = connection.executemany(
+                "UPDATE messages SET state = ? "
+                "WHERE id = ? AND attempts = ? AND state = ?",
+                [(ACKED, lease.id, lease.attempts, LEASED) for lease in leases],
+            )
+            return cursor.rowcount
+
+        return self._transaction(ack)
+
+    def release(self, lease: Lease) -> bool:
+        """
+        Return a leased message to be claimed again immediately.
+        """
+
+        def release(connection: sqlite3.Connection) -> bool:
+            cursor = connection.execute(
+                "UPDATE messages SET state = ?, due = ? "
+                "WHERE id = ? AND attempts = ? AND state = ?",
+                (READY, time.time(), lease.id, lease.attempts, LEASED),
+            )
+            return cursor.rowcount > 0
+
+        return self._transaction(release)
+
+    def release_many(self, leases: Iterable[Lease]) -> int:
+        """
+        Return leased messages to be claimed again immediately.
+
+        :return: Number of messages released.
+        """
+
+        def release_many(connection: sqlite3.Connection) -> int:
+            now = time.time()
+            cursor = connection.executemany(
+                "UPDATE messages SET state = ?, due = ? "
+                "WHERE id = ? AND attempts = ? AND state = ?",
+                [(READY, now, lease.id, lease.attempts, LEASED) for lease in leases],
+            )
+            return cursor.rowcount
+
+        return self._transaction(release_many)
+
+    def vacuum(self) -> int:
+        """
+        Remove acknowledged messages and release free pages.
+
+        :return: Number of messages removed.
+        """
+        removed = self._transaction(
+            lambda connection: connection.execute(
+                "DELETE FROM messages WHERE state = ?", (ACKED,)
+            ).rowcount
+        )
+        with self._lock:
+            connection = self.connection
+            # Each step of the pragma frees a single page so it is run as a
+            # script (which steps to completion); the checkpoint then
+            # truncates the database file.
+            connection.executescript("PRAGMA incremental_vacuum;")
+            connection.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+            self._last_vacuum = time.monotonic()
+        return removed
+
+    def maybe_vacuum(self) -> int:
+        """
+        Vacuum if `vacuum_interval` seconds have passed since the last vacuum.
+        """
+        if time.monotonic() - self._last_vacuum < self.vacuum_interval:
+            return 0
+        return self.vacuum()
+
+    def counts(self, queue: str) -> dict:
+        """
+        Number of messages in each state.
+        """
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT state, COUNT(*) FROM messages WHERE queue = ? GROUP BY state",
+                (queue,),
+            ).fetchall()
+        counts = {"ready": 0, "leased": 0, "acked": 0}
+        names = {READY: "ready", LEASED: "leased", ACKED: "acked"}
+        counts.update((names[state], count) for state, count in rows)
+        return counts
@@ -1,5 +1,9 @@
+import asyncio
+
 import pytest
 
+from pyapp_ext.messaging.serialisation import GZipEncoding, FastJSONSerialise
+from pyapp_ext.messaging.aio import Message
 from .mock_bases import MessageSenderTest, MessageReceiverTest
 
 
@@ -66,6 +70,113 @@ class TestMessageSender:
             }
         )]
 
+    @pytest.mark.asyncio
+    async def test_send__below_encoding_threshold(self):
+        target = MessageSenderTest()
+        target.default_serialisation = GZipEncoding(
+            FastJSONSerialise(), threshold=1024
+        )
+
+        await target.send(a="foo")
+
+        assert target.send_raw_calls == [
+            ({"a": "foo"}, {"content_type": "application/json", "content_encoding": None})
+        ]
+
+    @pytest.mark.asyncio
+    async def test_send_many__mixed_encodings(self):
+        bodies = []
+
+        class RecordingSender(MessageSenderTest):
+            async def send_raw(self, body, **kwargs):
+                bodies.append(kwargs["content_encoding"])
+                return kwargs["content_encoding"]
+
+        target = RecordingSender()
+        target.default_serialisation = GZipEncoding(FastJSONSerialise(), threshold=64)
+
+        actual = await target.send_many([{"a": "x" * 100}, {"a": 1}, {"a": "y" * 100}])
+
+        assert actual == ["GZIP", None, "GZIP"]
+        assert sorted(bodies, key=str) == ["GZIP", "GZIP", None]
+
+    @pytest.mark.asyncio
+    async def test_send_many(self):
+        target = MessageSenderTest()
+
+        await target.send_many([{"a": "foo"}, {"b": "bar"}])
+
+        assert target.send_raw_calls == [
+            ({"a": "foo"}, {"content_type": "application/json", "content_encoding": None}),
+            ({"b": "bar"}, {"content_type": "application/json", "content_encoding": None}),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_send_raw_many__bounded_concurrency(self):
+        in_flight = {"current": 0, "peak": 0}
+
+        class SlowSender(MessageSenderTest):
+            send_concurrency = 2
+
+            async def send_raw(self, body, **kwargs):
+                in_flight["current"] += 1
+                in_flight["peak"] = max(in_flight["peak"], in_flight["current"])
+                await asyncio.sleep(0.01)
+                await super().send_raw(body, **kwargs)
+                in_flight["current"] -= 1
+                return body
+
+        target = SlowSender()
+
+        actual = await target.send_raw_many(["1", "2", "3", "4", "5"])
+
+        assert actual == ["1", "2", "3", "4", "5"]
+        assert len(target.send_raw_calls) == 5
+        assert in_flight["peak"] == 2
+
+    @pytest.mark.asyncio
+    async def test_send_raw_many__failure_cancels_workers(self):
+        class FailingSender(MessageSenderTest):
+            send_concurrency = 2
+
+            async def send_raw(self, body, **kwargs):
+                if body == "1":
+                    raise ValueError("Oops")
+                await asyncio.sleep(0.01)
+                await super().send_raw(body, **kwargs)
+
+        target = FailingSender()
+
+        with pytest.raises(ValueError):
+            await target.send_raw_many(["1", "2", "3", "4", "5"])
+        await asyncio.sleep(0.05)
+
+        assert target.send_raw_calls == []
+
+    @pytest.mark.asyncio
+    async def test_send_raw_many__body_not_copied(self):
+        bodies = []
+
+        class RecordingSender(MessageSenderTest):
+            async def send_raw(self, body, **kwargs):
+                bodies.append(body)
+
+        target = RecordingSender()
+        body = memoryview(b'{"a": "foo"}')
+
+        await target.send_raw_many([body, body])
+
+        assert all(actual is body for actual in bodies)
+
+    @pytest.mark.asyncio
+    async def test_send_raw_many__empty(self):
+        target = MessageSenderTest()
+
+        actual = await target.send_raw_many([])
+
+        assert actual == []
+        assert target.send_raw_calls == []
+
 
 class TestMessageReceiver:
     @pytest.mark.asyncio
@@ -101,3 +212,179 @@ class TestMessageReceiver:
 
         assert actual == [{"a": "foo"}, {"b": "bar", "c": 42}]
         assert target.delete_calls == [0, 1]
+
+    @pytest.mark.asyncio
+    async def test_receive_batch(self):
+        target = MessageReceiverTest(['{"a":"foo"}', '{"b":"bar"}', '{"c":42}'])
+
+        actual = await target.receive_batch(max_messages=2)
+
+        assert [message.content for message in actual] == [{"a": "foo"}, {"b": "bar"}]
+        assert target.delete_calls == []
+
+    @pytest.mark.asyncio
+    async def test_receive_batch__max_wait(self):
+        class SlowReceiver(MessageReceiverTest):
+            async def receive_raw(self):
+                async for message in super().receive_raw():
+                    yield message
+                    await asyncio.sleep(1)
+
+        target = SlowReceiver(['{"a":"foo"}', '{"b":"bar"}'])
+
+        actual = await target.receive_batch(max_messages=2, max_wait=0.01)
+
+        assert [message.content for message in actual] == [{"a": "foo"}]
+
+    @pytest.mark.asyncio
+    async def test_receive_batch__returns_available(self):
+        class SlowReceiver(MessageReceiverTest):
+            async def receive_raw(self):
+                async for message in super().receive_raw():
+                    yield message
+                await asyncio.sleep(10)
+
+        target = SlowReceiver(['{"a":"foo"}', '{"b":"bar"}'])
+
+        actual = await asyncio.wait_for(target.receive_batch(), 1)
+
+        assert [message.content for message in actual] == [{"a": "foo"}, {"b": "bar"}]
+
+    @pytest.mark.asyncio
+    async def test_receive__batch_size(self):
+        target = MessageReceiverTest(['{"a":"foo"}', '{"b":"bar"}', '{"c":42}'])
+
+        actual = []
+        async for batch in target.listen(batch_size=2):
+            actual.append([message.content for message in batch])
+
+        assert actual == [[{"a": "foo"}, {"b": "bar"}], [{"c": 42}]]
+        assert target.delete_calls == [0, 1, 2]
+
+    @pytest.mark.asyncio
+    async def test_receive__batch_size__returns_available(self):
+        class SlowReceiver(MessageReceiverTest):
+            async def receive_raw(self):
+                async for message in super().receive_raw():
+                    yield message
+                await asyncio.sleep(10)
+
+        target = SlowReceiver(['{"a":"foo"}', '{"b":"bar"}'])
+        batches = target.listen(batch_size=5)
+
+        actual = await asyncio.wait_for(batches.__anext__(), 1)
+        await batches.aclose()
+
+        assert [message.content for message in actual] == [{"a": "foo"}, {"b": "bar"}]
+
+    @pytest.mark.asyncio
+    async def test_receive__delete_batch_size(self):
+        delete_many_calls = []
+
+        class BulkReceiver(MessageReceiverTest):
+            async def delete_many(self, messages):
+                delete_many_calls.append([message.envelope for message in messages])
+
+        target = BulkReceiver(['{"a":"foo"}', '{"b":"bar"}', '{"c":42}'])
+
+        async for _ in target.listen(delete_batch_size=2):
+            pass
+
+        assert delete_many_calls == [[0, 1], [2]]
+        assert target.delete_calls == []
+
+    @pytest.mark.asyncio
+    async def test_receive__delete_interval(self):
+        delete_many_calls = []
+
+        class SlowBulkReceiver(MessageReceiverTest):
+            async def receive_raw(self):
+                async for message in super().receive_raw():
+                    yield message
+                    if message.envelope == 1:
+                        await asyncio.sleep(0.1)
+
+            async def delete_many(self, messages):
+                delete_many_calls.append([message.envelope for message in messages])
+
+        target = SlowBulkReceiver(['{"a":"foo"}', '{"b":"bar"}', '{"c":42}'])
+
+        async for message in target.listen(delete_batch_size=10, delete_interval=0.01):
+            if message.envelope == 2:
+                # Idle wait for the third message flushed held deletes
+                assert delete_many_calls == [[0, 1]]
+
+        assert delete_many_calls == [[0, 1], [2]]
+
+    @pytest.mark.asyncio
+    async def test_consume(self):
+        in_flight = {"current": 0, "peak": 0}
+        actual = []
+
+        async def handler(message):
+            in_flight["current"] += 1
+            in_flight["peak"] = max(in_flight["peak"], in_flight["current"])
+            await asyncio.sleep(0.01)
+            actual.append(message.content)
+            in_flight["current"] -= 1
+
+        target = MessageReceiverTest(['{"a":"foo"}', '{"b":"bar"}', '{"c":42}'])
+
+        await target.consume(handler, concurrency=2)
+
+        assert len(actual) == 3
+        assert in_flight["peak"] == 2
+        assert sorted(target.delete_calls) == [0, 1, 2]
+
+    @pytest.mark.asyncio
+    async def test_consume__on_error(self):
+        errors = []
+
+        async def handler(message):
+            if message.envelope == 1:
+                raise ValueError("Eek")
+
+        target = MessageReceiverTest(['{"a":"foo"}', '{"b":"bar"}', '{"c":42}'])
+
+        await target.consume(
+            handler,
+            concurrency=2,
+            on_error=lambda message, ex: errors.append((message.envelope, str(ex))),
+        )
+
+        assert errors == [(1, "Eek")]
+        assert sorted(target.delete_calls) == [0, 2]
+
+    @pytest.mark.asyncio
+    async def test_consume__error_raised(self):
+        async def handler(message):
+            raise ValueError("Eek")
+
+        target = MessageReceiverTest(['{"a":"foo"}', '{"b":"bar"}', '{"c":42}'])
+
+        with pytest.raises(ValueError):
+            await target.consume(handler)
+
+        assert target.delete_calls == []
+
+
+class TestMessage:
+    @pytest.mark.asyncio
+    async def test_acontent(self):
+        queue = MessageReceiverTest()
+        queue.offload_threshold = 0
+        target = Message(b'{"a":"foo"}', "application/json", None, 1, queue)
+
+        actual = await target.acontent()
+
+        assert actual == {"a": "foo"}
+        assert target.content is actual
+
+    @pytest.mark.asyncio
+    async def test_delete(self):
+        queue = MessageReceiverTest()
+        target = Message(b'{"a":"foo"}', "application/json", None, 1, queue)
+
+        await target.delete()
+
+        assert queue.delete_calls == [1]
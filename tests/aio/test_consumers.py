@@ -0,0 +1,177 @@
+import asyncio
+
+import pytest
+
+from pyapp_ext.messaging.aio import consumers, Message
+from .mock_bases import MessageReceiverTest
+
+
+def make_messages(*pairs):
+    return [f'{{"id":"{key}","seq":{seq}}}' for key, seq in pairs]
+
+
+class TestPartitionedConsumer:
+    def test_partition__stable(self):
+        receiver = MessageReceiverTest()
+        target = consumers.PartitionedConsumer(receiver, None, key="id", lanes=4)
+
+        actual = [
+            target.partition(Message(body, "application/json", None, idx, receiver))
+            for idx, body in enumerate(make_messages(("a", 1), ("a", 2), ("b", 1)))
+        ]
+
+        assert actual[0] == actual[1]
+        assert all(0 <= lane < 4 for lane in actual)
+
+    @pytest.mark.asyncio
+    async def test_run__preserves_order_per_key(self):
+        handled = []
+
+        async def handler(message):
+            content = message.content
+            # Vary handling time so lanes interleave
+            await asyncio.sleep(0.001 * (content["seq"] % 3))
+            handled.append((content["id"], content["seq"]))
+
+        receiver = MessageReceiverTest(
+            make_messages(*((key, seq) for seq in range(10) for key in "abcdef"))
+        )
+        target = consumers.PartitionedConsumer(
+            receiver, handler, key="id", lanes=3, lane_buffer=2
+        )
+
+        await target.run()
+
+        assert len(handled) == 60
+        for key in "abcdef":
+            assert [seq for k, seq in handled if k == key] == list(range(10))
+        assert sum(lane.acked for lane in target.lanes) == 60
+        assert len(receiver.delete_calls) == 60
+
+    @pytest.mark.asyncio
+    async def test_run__key_callable(self):
+        handled = []
+
+        async def handler(message):
+            handled.append(message.content["seq"])
+
+        receiver = MessageReceiverTest(make_messages(("a", 1), ("a", 2)))
+        target = consumers.PartitionedConsumer(
+            receiver, handler, key=lambda content: content["id"], lanes=2
+        )
+
+        await target.run()
+
+        assert handled == [1, 2]
+
+    @pytest.mark.asyncio
+    async def test_run__failure_stops_lane(self):
+        async def handler(message):
+            if message.content["seq"] == 1:
+                raise ValueError("Eek")
+
+        receiver = MessageReceiverTest(make_messages(("a", 1), ("a", 2), ("a", 3)))
+        target = consumers.PartitionedConsumer(receiver, handler, key="id", lanes=1)
+
+        with pytest.raises(ValueError):
+            await target.run()
+
+        assert receiver.delete_calls == []
+        assert target.lanes[0].failed == 1
+
+    @pytest.mark.asyncio
+    async def test_run__on_error(self):
+        errors = []
+
+        async def handler(message):
+            if message.content["seq"] == 1:
+                raise ValueError("Eek")
+
+        receiver = MessageReceiverTest(make_messages(("a", 1), ("a", 2)))
+        target = consumers.PartitionedConsumer(
+            receiver,
+            handler,
+            key="id",
+            lanes=1,
+            on_error=lambda message, ex: errors.append(message.envelope),
+        )
+
+        await target.run()
+
+        assert errors == [0]
+        assert receiver.delete_calls == [1]
+
+
+    @pytest.mark.asyncio
+    async def test_run__on_error_fails(self):
+        async def handler(message):
+            raise ValueError("Eek")
+
+        def on_error(message, ex):
+            raise KeyError("Oops")
+
+        receiver = MessageReceiverTest(make_messages(*(("a", seq) for seq in range(5))))
+        target = consumers.PartitionedConsumer(
+            receiver, handler, key="id", lanes=1, lane_buffer=1, on_error=on_error
+        )
+
+        with pytest.raises(KeyError):
+            await asyncio.wait_for(target.run(), 1)
+
+        assert target.lanes[0].failed == 1
+
+    @pytest.mark.asyncio
+    async def test_run__failure_on_idle_queue(self):
+        class IdleReceiver(MessageReceiverTest):
+            async def receive_raw(self):
+                async for message in super().receive_raw():
+                    yield message
+                await asyncio.sleep(10)
+
+        async def handler(message):
+            raise ValueError("Eek")
+
+        receiver = IdleReceiver(make_messages(("a", 1)))
+        target = consumers.PartitionedConsumer(receiver, handler, key="id", lanes=1)
+
+        with pytest.raises(ValueError):
+            await asyncio.wait_for(target.run(), 1)
+
+
+def sum_handler(content):
+    if content["seq"] < 0:
+        raise ValueError("Eek")
+    return content["seq"] * 2
+
+
+class TestProcessPoolConsumer:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("deserialise_in_worker", (True, False))
+    async def test_run(self, deserialise_in_worker):
+        receiver = MessageReceiverTest(make_messages(("a", 1), ("b", 2), ("c", 3)))
+        target = consumers.ProcessPoolConsumer(
+            receiver,
+            sum_handler,
+            workers=2,
+            deserialise_in_worker=deserialise_in_worker,
+        )
+
+        await target.run()
+
+        assert sorted(receiver.delete_calls) == [0, 1, 2]
+
+    @pytest.mark.asyncio
+    async def test_run__on_error(self):
+        errors = []
+        receiver = MessageReceiverTest(make_messages(("a", 1), ("b", -1)))
+        target = consumers.ProcessPoolConsumer(
+            receiver,
+            sum_handler,
+            workers=1,
+            on_error=lambda message, ex: errors.append(message.envelope),
+        )
+
+        await target.run()
+
+        assert errors == [1]
+        assert receiver.delete_calls == [0]
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from pyapp_ext.messaging import log
+from pyapp_ext.messaging.aio.log import LogSender, LogReceiver
+
+
+@pytest.fixture
+def directory(tmp_path):
+    path = str(tmp_path / "log")
+    yield path
+    log.open_log(path).close()
+
+
+class TestLogQueues:
+    @pytest.mark.asyncio
+    async def test_send_listen(self, directory):
+        sender = LogSender(directory=directory)
+        receiver = LogReceiver(directory=directory, idle_timeout=0)
+
+        async with sender, receiver:
+            assert await sender.send_many([{"a": 1}, {"b": 2}]) == [0, 1]
+            actual = [await message.acontent() async for message in receiver.listen()]
+
+        assert actual == [{"a": 1}, {"b": 2}]
+        assert receiver.group.committed == 2
+
+    @pytest.mark.asyncio
+    async def test_send__group_commit(self, directory, monkeypatch):
+        sender = LogSender(directory=directory, sync_window=0.01)
+        syncs = []
+        target = sender.log
+        original = target.sync
+        monkeypatch.setattr(
+            log.SegmentedLog, "sync", lambda self: syncs.append(1) or original()
+        )
+
+        actual = await asyncio.gather(*(sender.send(a=idx) for idx in range(10)))
+
+        assert actual == list(range(10))
+        assert len(syncs) == 1
+
+    @pytest.mark.asyncio
+    async def test_receive_raw__waits_for_message(self, directory):
+        sender = LogSender(directory=directory)
+        receiver = LogReceiver(directory=directory)
+
+        async def send():
+            await asyncio.sleep(0.01)
+            await sender.send(a=1)
+
+        sending = asyncio.ensure_future(send())
+        messages = receiver.receive_raw()
+        message = await asyncio.wait_for(messages.__anext__(), 1)
+        await messages.aclose()
+        await sending
+
+        assert message.content == {"a": 1}
@@ -0,0 +1,273 @@
+import asyncio
+import threading
+
+import pytest
+
+from pyapp_ext.messaging.aio import memory
+from pyapp_ext.messaging.memory import Delivery, MemoryBroker, QueueFull
+
+
+@pytest.fixture
+def broker():
+    return MemoryBroker()
+
+
+class TestMemorySender:
+    def test_init__requires_one_target(self):
+        with pytest.raises(ValueError):
+            memory.MemorySender()
+        with pytest.raises(ValueError):
+            memory.MemorySender(queue_name="foo", topic="bar")
+
+    @pytest.mark.asyncio
+    async def test_send(self, broker):
+        target = memory.MemorySender(queue_name="foo", broker=broker)
+
+        async with target:
+            message_id = await target.send(a=1)
+
+        queue = broker.get_queue("foo")
+        _, item = queue.get(timeout=0)
+        assert item.message_id == message_id
+        assert item.content_type == target.serialisation.content_type
+
+    @pytest.mark.asyncio
+    async def test_send_raw__body_not_copied(self, broker):
+        body = bytearray(b'{"a": 1}')
+        target = memory.MemorySender(queue_name="foo", broker=broker)
+
+        await target.send_raw(body)
+
+        assert broker.get_queue("foo").get(timeout=0)[1].body is body
+
+    @pytest.mark.asyncio
+    async def test_send_raw__topic_fan_out(self, broker):
+        broker.subscribe("events", "a")
+        broker.subscribe("events", "b")
+        target = memory.MemorySender(topic="events", broker=broker)
+
+        await target.send_raw(b"{}")
+
+        assert len(broker.get_queue("a")) == 1
+        assert len(broker.get_queue("b")) == 1
+
+    @pytest.mark.asyncio
+    async def test_send_raw__full(self, broker):
+        target = memory.MemorySender(
+            queue_name="foo", max_size=1, timeout=0.01, broker=broker
+        )
+        await target.send_raw(b"{}")
+
+        with pytest.raises(QueueFull):
+            await target.send_raw(b"{}")
+
+    @pytest.mark.asyncio
+    async def test_send_raw__waits_for_space(self, broker):
+        target = memory.MemorySender(queue_name="foo", max_size=1, broker=broker)
+        receiver = memory.MemoryReceiver(queue_name="foo", broker=broker)
+        await target.send_raw(b"1")
+
+        async def consume():
+            message = await receiver.receive_raw().__anext__()
+            await asyncio.sleep(0.01)
+            await message.delete()
+
+        await asyncio.gather(consume(), target.send_raw(b"2"))
+
+        assert broker.get_queue("foo").ready_count == 1
+
+    @pytest.mark.asyncio
+    async def test_send_many(self, broker):
+        target = memory.MemorySender(queue_name="foo", broker=broker)
+        receiver = memory.MemoryReceiver(
+            queue_name="foo", idle_timeout=0, broker=broker
+        )
+
+        await target.send_many([{"a": idx} for idx in range(5)])
+
+        actual = [await message.acontent() async for message in receiver.listen()]
+        assert actual == [{"a": idx} for idx in range(5)]
+
+
+class TestMemoryReceiver:
+    @pytest.mark.asyncio
+    async def test_listen(self, broker):
+        sender = memory.MemorySender(queue_name="foo", broker=broker)
+        target = memory.MemoryReceiver(queue_name="foo", idle_timeout=0, broker=broker)
+        await sender.send(a=1)
+        await sender.send(b=2)
+
+        actual = [message async for message in target.listen()]
+
+        assert [message.content for message in actual] == [{"a": 1}, {"b": 2}]
+        assert isinstance(actual[0].envelope, Delivery)
+        assert len(broker.get_queue("foo")) == 0
+
+    @pytest.mark.asyncio
+    async def test_receive_raw__waits_for_message(self, broker):
+        sender = memory.MemorySender(queue_name="foo", broker=broker)
+        target = memory.MemoryReceiver(queue_name="foo", broker=broker)
+
+        async def send():
+            await asyncio.sleep(0.01)
+            await sender.send(a=1)
+
+        asyncio.ensure_future(send())
+        message = await asyncio.wait_for(target.receive_raw().__anext__(), 1)
+
+        assert message.content == {"a": 1}
+
+    @pytest.mark.asyncio
+    async def test_receive_raw__from_another_thread(self, broker):
+        sender = memory.MemorySender(queue_name="foo", broker=broker)
+        target = memory.MemoryReceiver(queue_name="foo", broker=broker)
+
+        def send():
+            asyncio.new_event_loop().run_until_complete(sender.send(a=1))
+
+        threading.Timer(0.01, send).start()
+        message = await asyncio.wait_for(target.receive_raw().__anext__(), 1)
+
+        assert message.content == {"a": 1}
+
+    @pytest.mark.asyncio
+    async def test_receive_raw__ends_when_closed(self, broker):
+        target = memory.MemoryReceiver(queue_name="foo", broker=broker)
+        asyncio.get_event_loop().call_later(0.01, broker.delete_queue, "foo")
+
+        actual = [message async for message in target.receive_raw()]
+
+        assert actual == []
+
+    @pytest.mark.asyncio
+    async def test_competing_consumers(self, broker):
+        sender = memory.MemorySender(queue_name="foo", broker=broker)
+        await sender.send_many([{"a": idx} for idx in range(20)])
+        receivers = [
+            memory.MemoryReceiver(queue_name="foo", idle_timeout=0.01, broker=broker)
+            for _ in range(3)
+        ]
+
+        async def consume(receiver):
+            results = []
+            async for message in receiver.listen():
+                results.append(message.content["a"])
+                await asyncio.sleep(0)
+            return results
+
+        actual = await asyncio.gather(*(consume(r) for r in receivers))
+
+        assert sorted(sum(actual, [])) == list(range(20))
+        assert all(actual)
+
+    @pytest.mark.asyncio
+    async def test_topics(self, broker):
+        sender = memory.MemorySender(topic="events", broker=broker)
+        targets = [
+            memory.MemoryReceiver(
+                queue_name=name, topics=["events"], idle_timeout=0, broker=broker
+            )
+            for name in ("a", "b")
+        ]
+        for target in targets:
+            await target.configure()
+
+        await sender.send(a=1)
+
+        for target in targets:
+            assert [m.content async for m in target.listen()] == [{"a": 1}]
+
+    @pytest.mark.asyncio
+    async def test_redelivery(self, broker):
+        sender = memory.MemorySender(queue_name="foo", broker=broker)
+        target = memory.MemoryReceiver(
+            queue_name="foo", visibility_timeout=0.01, broker=broker
+        )
+        await sender.send(a=1)
+
+        messages = target.receive_raw()
+        first = await messages.__anext__()
+        second = await asyncio.wait_for(messages.__anext__(), 1)
+        await messages.aclose()
+
+        assert first.envelope.message_id == second.envelope.message_id
+        assert second.envelope.delivery_count == 2
+
+    @pytest.mark.asyncio
+    async def test_delete_many(self, broker):
+        sender = memory.MemorySender(queue_name="foo", broker=broker)
+        target = memory.MemoryReceiver(queue_name="foo", broker=broker)
+        await sender.send_many([{"a": idx} for idx in range(3)])
+
+        batch = await target.receive_batch(3)
+        await target.delete_many(batch)
+
+        assert len(broker.get_queue("foo")) == 0
+
+    @pytest.mark.asyncio
+    async def test_receive_batch__returns_available(self, broker):
+        sender = memory.MemorySender(queue_name="foo", broker=broker)
+        target = memory.MemoryReceiver(queue_name="foo", broker=broker)
+        await sender.send_many([{"a": idx} for idx in range(3)])
+
+        batch = await asyncio.wait_for(target.receive_batch(), 1)
+
+        assert [message.content for message in batch] == [{"a": 0}, {"a": 1}, {"a": 2}]
+
+    @pytest.mark.asyncio
+    async def test_receive_batch__cancel_releases_received(self, broker):
+        sender = memory.MemorySender(queue_name="foo", broker=broker)
+        target = memory.MemoryReceiver(queue_name="foo", broker=broker)
+        await sender.send(a=1)
+
+        task = asyncio.ensure_future(target.receive_batch(2, max_wait=None))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.wait((task,))
+
+        queue = broker.get_queue("foo")
+        assert (queue.ready_count, queue.in_flight_count) == (1, 0)
+
+    @pytest.mark.asyncio
+    async def test_receive_batch__cancel_keeps_order(self, broker):
+        sender = memory.MemorySender(queue_name="foo", broker=broker)
+        target = memory.MemoryReceiver(queue_name="foo", broker=broker)
+        await sender.send_many([{"a": 1}, {"a": 2}])
+
+        task = asyncio.ensure_future(target.receive_batch(3, max_wait=None))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.wait((task,))
+
+        actual = await target.receive_batch(3)
+        assert [message.content for message in actual] == [{"a": 1}, {"a": 2}]
+
+    @pytest.mark.asyncio
+    async def test_release(self, broker):
+        sender = memory.MemorySender(queue_name="foo", broker=broker)
+        target = memory.MemoryReceiver(queue_name="foo", broker=broker)
+        await sender.send(a=1)
+
+        messages = target.receive_raw()
+        await target.release(await messages.__anext__())
+        message = await messages.__anext__()
+        await messages.aclose()
+
+        assert message.envelope.delivery_count == 2
+
+    @pytest.mark.asyncio
+    async def test_registered_queue(self, broker, monkeypatch):
+        from pyapp.conf import settings
+        from pyapp_ext.messaging.aio import factory
+
+        monkeypatch.setattr(memory, "default_broker", broker)
+        monkeypatch.setitem(
+            settings.SEND_MESSAGE_QUEUES,
+            "memory-test",
+            ("pyapp_ext.messaging.aio.memory.MemorySender", {"queue_name": "foo"}),
+        )
+
+        sender = factory.get_sender("memory-test")
+
+        assert isinstance(sender, memory.MemorySender)
+        assert sender.broker is broker
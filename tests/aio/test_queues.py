@@ -1,9 +1,14 @@
+import asyncio
+
 import mock
 import pytest
 
 from asyncio import Future
 
+from pyapp_ext.messaging import serialisation
 from pyapp_ext.messaging.aio import queues
+from pyapp_ext.messaging.aio.memory import MemorySender, MemoryReceiver
+from pyapp_ext.messaging.memory import MemoryBroker
 
 
 def mock_get_sender(name: str):
@@ -40,6 +45,8 @@ class TestBroadcastMessagePublisher:
         for queue in target._queues:
             queue.open.assert_called()
 
+        await target.close()
+
     @pytest.mark.asyncio
     async def test_close(self, monkeypatch):
         monkeypatch.setattr(queues, "get_sender", mock_get_sender)
@@ -67,6 +74,620 @@ class TestBroadcastMessagePublisher:
         target = queues.BroadcastMessagePublisher(target_queues=("foo", "bar"))
 
         await target.send_raw(*args, **kwargs)
+        await target.flush()
 
         for queue in target._queues:
             queue.send_raw.assert_called_with(*args, **kwargs)
+        assert {name: stats.sent for name, stats in target.stats.items()} == {
+            "foo": 1,
+            "bar": 1,
+        }
+
+        await target.close()
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "body", (b"foo", bytearray(b"foo"), memoryview(b"foo"))
+    )
+    async def test_publish_raw__body_not_copied(self, monkeypatch, body):
+        monkeypatch.setattr(queues, "get_sender", mock_get_sender)
+        target = queues.BroadcastMessagePublisher(target_queues=("foo", "bar"))
+
+        await target.send_raw(body)
+        await target.flush()
+
+        for queue in target._queues:
+            (actual,), _ = queue.send_raw.call_args
+            assert actual is body
+
+        await target.close()
+
+    @pytest.mark.parametrize(
+        "kwargs",
+        (
+            {"overflow": "eek"},
+            {"overflow": "spill"},
+            {"overflow": "block", "spill_queue": "spill"},
+            {"buffer_size": 0},
+        ),
+    )
+    def test_init__invalid(self, monkeypatch, kwargs):
+        monkeypatch.setattr(queues, "get_sender", mock_get_sender)
+
+        with pytest.raises(ValueError):
+            queues.BroadcastMessagePublisher(target_queues=("foo",), **kwargs)
+
+    @pytest.mark.asyncio
+    async def test_publish_raw__slow_target_isolated(self, monkeypatch):
+        monkeypatch.setattr(queues, "get_sender", mock_get_sender)
+        target = queues.BroadcastMessagePublisher(target_queues=("foo", "bar"))
+        slow, fast = target._queues
+        release = asyncio.Event()
+
+        async def wait(*args, **kwargs):
+            await release.wait()
+
+        slow.send_raw.side_effect = wait
+
+        await asyncio.wait_for(target.send_raw(b"a"), 1)
+        await asyncio.wait_for(target.send_raw(b"b"), 1)
+        await asyncio.sleep(0)
+
+        assert fast.send_raw.call_count == 2
+        assert target.buffered() == {"foo": 1, "bar": 0}
+
+        release.set()
+        await target.flush()
+        assert target.stats["foo"].sent == 2
+
+        await target.close()
+
+    @pytest.mark.asyncio
+    async def test_publish_raw__errors_counted(self, monkeypatch):
+        monkeypatch.setattr(queues, "get_sender", mock_get_sender)
+        target = queues.BroadcastMessagePublisher(target_queues=("foo", "bar"))
+        target._queues[0].send_raw.side_effect = ConnectionError("Down")
+
+        await target.send_raw(b"a")
+        await target.send_raw(b"b")
+        await target.flush()
+
+        failing, healthy = target.stats["foo"], target.stats["bar"]
+        assert (failing.sent, failing.errors) == (0, 2)
+        assert isinstance(failing.last_error, ConnectionError)
+        assert (healthy.sent, healthy.errors) == (2, 0)
+        assert healthy.latency_max >= healthy.latency_mean >= 0
+
+        await target.close()
+
+    @pytest.mark.asyncio
+    async def test_publish_raw__drop_oldest(self, monkeypatch):
+        monkeypatch.setattr(queues, "get_sender", mock_get_sender)
+        target = queues.BroadcastMessagePublisher(
+            target_queues=("foo",), buffer_size=2, overflow="drop-oldest"
+        )
+
+        for body in (b"a", b"b", b"c", b"d"):
+            await target.send_raw(body)
+        await target.flush()
+
+        queue = target._queues[0]
+        assert [args[0] for args, _ in queue.send_raw.call_args_list] == [b"c", b"d"]
+        assert target.stats["foo"].dropped == 2
+
+        await target.close()
+
+    @pytest.mark.asyncio
+    async def test_publish_raw__spill(self, monkeypatch):
+        monkeypatch.setattr(queues, "get_sender", mock_get_sender)
+        target = queues.BroadcastMessagePublisher(
+            target_queues=("foo",),
+            buffer_size=1,
+            overflow="spill",
+            spill_queue="spill",
+        )
+
+        await target.send_raw(b"a")
+        await target.send_raw(b"b", content_type="text/plain")
+        await target.flush()
+
+        target._queues[0].send_raw.assert_called_once_with(
+            b"a", content_type=None, content_encoding=None
+        )
+        target._spill.send_raw.assert_called_once_with(
+            b"b", content_type="text/plain", content_encoding=None
+        )
+        assert target.stats["foo"].spilled == 1
+
+        await target.close()
+
+    @pytest.mark.asyncio
+    async def test_publish_raw__block(self, monkeypatch):
+        monkeypatch.setattr(queues, "get_sender", mock_get_sender)
+        target = queues.BroadcastMessagePublisher(target_queues=("foo",), buffer_size=1)
+        release = asyncio.Event()
+
+        async def wait(*args, **kwargs):
+            await release.wait()
+
+        target._queues[0].send_raw.side_effect = wait
+        await target.send_raw(b"a")  # Taken by the drain task
+        await asyncio.sleep(0)
+        await target.send_raw(b"b")  # Buffered
+
+        publish = asyncio.ensure_future(target.send_raw(b"c"))
+        await asyncio.sleep(0.01)
+        assert not publish.done()
+
+        release.set()
+        await asyncio.wait_for(publish, 1)
+        await target.flush()
+        assert target.stats["foo"].sent == 3
+
+        await target.close()
+
+    @pytest.mark.asyncio
+    async def test_close__flushes_buffers(self, monkeypatch):
+        monkeypatch.setattr(queues, "get_sender", mock_get_sender)
+        target = queues.BroadcastMessagePublisher(target_queues=("foo", "bar"))
+
+        await target.open()
+        await target.send_raw(b"a")
+        await target.close()
+
+        for queue in target._queues:
+            queue.send_raw.assert_called_once()
+            queue.close.assert_called()
+
+
+class BatchSender:
+    """
+    Sender that records batches sent with send_raw_many.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.batches = []
+        self.error = None
+        self.opened = self.closed = False
+
+    async def open(self):
+        self.opened = True
+
+    async def close(self):
+        self.closed = True
+
+    async def send_raw_many(self, bodies, *, content_type=None, content_encoding=None):
+        if self.error:
+            raise self.error
+        self.batches.append((list(bodies), content_type, content_encoding))
+        return [f"id-{body}" for body in bodies]
+
+
+class TestBatchingMessageSender:
+    @pytest.fixture
+    def target(self, monkeypatch):
+        monkeypatch.setattr(queues, "get_sender", BatchSender)
+        return queues.BatchingMessageSender(target_queue="foo", linger_ms=10)
+
+    @pytest.mark.asyncio
+    async def test_send_raw__concurrent_sends_batched(self, target):
+        actual = await asyncio.gather(*(target.send_raw(str(idx)) for idx in range(3)))
+
+        assert actual == ["id-0", "id-1", "id-2"]
+        assert target._queue.batches == [(["0", "1", "2"], None, None)]
+
+    @pytest.mark.asyncio
+    async def test_send_raw__linger(self, target):
+        future = target.send_raw_nowait("a")
+
+        await asyncio.sleep(0)
+        assert not future.done()
+
+        assert await asyncio.wait_for(future, 1) == "id-a"
+
+    @pytest.mark.asyncio
+    async def test_send_raw__max_batch_size(self, target):
+        target.max_batch_size = 2
+
+        futures = [target.send_raw_nowait(str(idx)) for idx in range(5)]
+        await target.flush()
+
+        assert [bodies for bodies, *_ in target._queue.batches] == [
+            ["0", "1"],
+            ["2", "3"],
+            ["4"],
+        ]
+        assert all(future.done() for future in futures)
+
+    @pytest.mark.asyncio
+    async def test_send_raw__max_bytes(self, target):
+        target.max_bytes = 6
+
+        for body in (b"aaa", memoryview(b"bbb"), b"c"):
+            target.send_raw_nowait(body)
+        await target.flush()
+
+        assert [len(bodies) for bodies, *_ in target._queue.batches] == [2, 1]
+
+    @pytest.mark.asyncio
+    async def test_send_raw__max_bytes_not_exceeded(self, target):
+        target.max_bytes = 1000
+
+        for body in (b"a" * 900, b"b" * 900, b"c" * 50, b"d" * 2000):
+            target.send_raw_nowait(body)
+        await target.flush()
+
+        assert [
+            [len(body) for body in bodies] for bodies, *_ in target._queue.batches
+        ] == [[900], [900, 50], [2000]]
+
+    @pytest.mark.asyncio
+    async def test_send__uses_target_serialisation(self, target):
+        target._queue.serialisation = serialisation.GZipEncoding(
+            serialisation.JSONSerialise()
+        )
+        target._queue.offload_threshold = 10
+        target._queue.serialisation_executor = None
+
+        await target.send(a=1)
+
+        (((body,), content_type, content_encoding),) = target._queue.batches
+        assert (content_type, content_encoding) == ("application/json", "GZIP")
+        assert target.offload_threshold == 10
+
+    @pytest.mark.asyncio
+    async def test_send_raw__grouped_by_content_type(self, target):
+        target.send_raw_nowait("a", content_type="text/plain")
+        target.send_raw_nowait("b", content_type="text/plain")
+        target.send_raw_nowait("c", content_type="application/json")
+        target.send_raw_nowait("d", content_type="text/plain")
+        await target.flush()
+
+        assert target._queue.batches == [
+            (["a", "b"], "text/plain", None),
+            (["c"], "application/json", None),
+            (["d"], "text/plain", None),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_send_raw__error_raised_to_callers(self, target):
+        target._queue.error = ConnectionError("Down")
+
+        results = await asyncio.gather(
+            target.send_raw("a"), target.send_raw("b"), return_exceptions=True
+        )
+
+        assert all(isinstance(result, ConnectionError) for result in results)
+
+    @pytest.mark.asyncio
+    async def test_send_raw_many(self, target):
+        actual = await target.send_raw_many(["a", "b"], content_type="text/plain")
+
+        assert actual == ["id-a", "id-b"]
+        assert target._queue.batches == [(["a", "b"], "text/plain", None)]
+
+    @pytest.mark.asyncio
+    async def test_close__flushes(self, target):
+        await target.open()
+        future = target.send_raw_nowait("a")
+        await target.close()
+
+        assert future.result() == "id-a"
+        assert target._queue.closed
+
+    def test_init__invalid(self, monkeypatch):
+        monkeypatch.setattr(queues, "get_sender", BatchSender)
+
+        with pytest.raises(ValueError):
+            queues.BatchingMessageSender(target_queue="foo", max_batch_size=0)
+
+
+class TestPrefetchMessageReceiver:
+    @pytest.fixture
+    def broker(self):
+        return MemoryBroker()
+
+    @pytest.fixture
+    def make_target(self, monkeypatch, broker):
+        def get_receiver(name):
+            return MemoryReceiver(queue_name=name, idle_timeout=0.05, broker=broker)
+
+        monkeypatch.setattr(queues, "get_receiver", get_receiver)
+
+        def make_target(**kwargs):
+            return queues.PrefetchMessageReceiver(source_queue="foo", **kwargs)
+
+        return make_target
+
+    @pytest.fixture
+    def sender(self, broker):
+        return MemorySender(queue_name="foo", broker=broker)
+
+    @pytest.mark.asyncio
+    async def test_listen(self, make_target, sender):
+        target = make_target()
+        await sender.send_many([{"a": 1}, {"b": 2}])
+
+        async with target:
+            actual = [await message.acontent() async for message in target.listen()]
+
+        assert actual == [{"a": 1}, {"b": 2}]
+        assert len(target._queue.queue) == 0
+
+    @pytest.mark.asyncio
+    async def test_receive_raw__message_queue_is_wrapper(self, make_target, sender):
+        target = make_target()
+        await sender.send(a=1)
+
+        async with target:
+            message = await target.receive_raw().__anext__()
+            assert message.queue is target
+            await message.delete()
+
+            assert target._queue.queue.in_flight_count == 0
+
+    @pytest.mark.asyncio
+    async def test_prefetch__bounded_by_count(self, make_target, sender):
+        target = make_target(max_messages=2)
+        await sender.send_many([{"idx": idx} for idx in range(5)])
+
+        async with target:
+            await asyncio.sleep(0.01)
+
+            assert target.buffered == 2
+            assert target._queue.queue.ready_count == 3
+
+    @pytest.mark.asyncio
+    async def test_prefetch__bounded_by_bytes(self, make_target, sender):
+        target = make_target(max_bytes=10)
+        await sender.send_raw_many([b"x" * 6] * 4)
+
+        async with target:
+            await asyncio.sleep(0.01)
+
+            assert (target.buffered, target.buffered_bytes) == (2, 12)
+
+    @pytest.mark.asyncio
+    async def test_prefetch__bounded_by_visibility_timeout(self, make_target, sender):
+        target = make_target(max_messages=10, visibility_timeout=1)
+        target._handle_time = 0.4
+        await sender.send_many([{"idx": idx} for idx in range(5)])
+
+        async with target:
+            await asyncio.sleep(0.01)
+
+            assert target.buffered == 2
+
+    @pytest.mark.asyncio
+    async def test_listen__handler_slower_than_visibility_timeout(
+        self, make_target, sender
+    ):
+        target = make_target(visibility_timeout=0.02)
+        await sender.send_many([{"idx": idx} for idx in range(3)])
+        actual = []
+
+        async with target:
+            async for message in target.listen():
+                actual.append((await message.acontent())["idx"])
+                await asyncio.sleep(0.03)
+
+        # Messages prefetched before the handle time was known expire and are
+        # received again; the listener does not stall.
+        assert sorted(actual) == [0, 1, 2]
+
+    @pytest.mark.asyncio
+    async def test_prefetch__on_demand_when_handler_slower_than_timeout(
+        self, make_target, sender
+    ):
+        target = make_target(visibility_timeout=0.02)
+        target._handle_time = 0.05
+        await sender.send_many([{"idx": idx} for idx in range(3)])
+        actual = []
+
+        async with target:
+            await asyncio.sleep(0.01)
+            assert target.buffered == 0
+            assert target._queue.queue.ready_count == 3
+
+            async for message in target.listen():
+                actual.append((await message.acontent())["idx"])
+                await asyncio.sleep(0.03)
+                assert target.buffered == 0
+
+        assert actual == [0, 1, 2]
+        assert target.expired == 0
+
+    @pytest.mark.asyncio
+    async def test_receive_raw__expired_messages_released(self, make_target, sender):
+        target = make_target(visibility_timeout=0.02)
+        await sender.send_many([{"a": 1}, {"b": 2}])
+
+        async with target:
+            await asyncio.sleep(0.03)
+            messages = target.receive_raw()
+            actual = await messages.__anext__()
+            await messages.aclose()
+
+        # Both prefetched messages expired; the first was received again
+        assert target.expired == 2
+        assert actual.envelope.delivery_count == 2
+
+    @pytest.mark.asyncio
+    async def test_close__releases_buffered(self, make_target, sender):
+        target = make_target()
+        await sender.send_many([{"a": 1}, {"b": 2}])
+
+        await target.open()
+        await asyncio.sleep(0.01)
+        await target.close()
+
+        assert target._queue.queue.ready_count == 2
+        assert target.buffered == 0
+
+    @pytest.mark.asyncio
+    async def test_receive_raw__source_error_raised(self, make_target):
+        target = make_target()
+
+        async def receive_raw():
+            raise ConnectionError("Down")
+            yield  # pragma: no cover
+
+        target._queue = mock.Mock(receive_raw=receive_raw)
+
+        with pytest.raises(ConnectionError):
+            async for _ in target.receive_raw():
+                pass
+
+
+class TestFlowControlledReceiver:
+    @pytest.fixture
+    def broker(self):
+        return MemoryBroker()
+
+    @pytest.fixture
+    def make_target(self, monkeypatch, broker):
+        def get_receiver(name):
+            return MemoryReceiver(queue_name=name, idle_timeout=0.05, broker=broker)
+
+        monkeypatch.setattr(queues, "get_receiver", get_receiver)
+
+        def make_target(**kwargs):
+            return queues.FlowControlledReceiver(source_queue="foo", **kwargs)
+
+        return make_target
+
+    @pytest.fixture
+    def sender(self, broker):
+        return MemorySender(queue_name="foo", broker=broker)
+
+    @pytest.mark.asyncio
+    async def test_listen(self, make_target, sender):
+        target = make_target(max_in_flight=1)
+        await sender.send_many([{"a": 1}, {"b": 2}])
+
+        async with target:
+            actual = [await message.acontent() async for message in target.listen()]
+
+        assert actual == [{"a": 1}, {"b": 2}]
+        assert target.stats() == {
+            "in_flight": 0,
+            "in_flight_bytes": 0,
+            "peak_in_flight": 1,
+            "peak_in_flight_bytes": len('{"a": 1}'),
+            "paused": False,
+            "pauses": 0,
+            "paused_time": 0.0,
+            "expired": 0,
+        }
+
+    @pytest.mark.asyncio
+    async def test_receive_raw__pauses_at_max_in_flight(self, make_target, sender):
+        target = make_target(max_in_flight=2)
+        await sender.send_many([{"idx": idx} for idx in range(3)])
+        messages = target.receive_raw()
+
+        first = await messages.__anext__()
+        await messages.__anext__()
+        pending = asyncio.ensure_future(messages.__anext__())
+        await asyncio.sleep(0.01)
+
+        assert not pending.done()
+        assert (target.in_flight, target.paused) == (2, True)
+
+        await first.delete()
+        third = await asyncio.wait_for(pending, 1)
+
+        assert await third.acontent() == {"idx": 2}
+        assert (target.in_flight, target.paused, target.pauses) == (2, False, 1)
+        await messages.aclose()
+
+    @pytest.mark.asyncio
+    async def test_receive_raw__pauses_at_max_in_flight_bytes(
+        self, make_target, sender
+    ):
+        target = make_target(max_in_flight_bytes=10)
+        await sender.send_raw_many([b"x" * 6] * 3)
+        messages = target.receive_raw()
+
+        first = await messages.__anext__()
+        second = await messages.__anext__()
+        pending = asyncio.ensure_future(messages.__anext__())
+        await asyncio.sleep(0.01)
+
+        assert not pending.done()
+        assert target.in_flight_bytes == 12
+
+        await target.delete_many([first, second])
+        await asyncio.wait_for(pending, 1)
+
+        assert target.in_flight_bytes == 6
+        await messages.aclose()
+
+    @pytest.mark.asyncio
+    async def test_receive_raw__credit_expires(self, make_target, sender):
+        target = make_target(max_in_flight=1, visibility_timeout=0.02)
+        await sender.send_many([{"a": 1}, {"b": 2}])
+        messages = target.receive_raw()
+
+        await messages.__anext__()
+        second = await asyncio.wait_for(messages.__anext__(), 1)
+
+        assert await second.acontent() == {"b": 2}
+        assert target.expired == 1
+        await messages.aclose()
+
+    @pytest.mark.asyncio
+    async def test_release(self, make_target, sender):
+        target = make_target(max_in_flight=1)
+        await sender.send(a=1)
+        messages = target.receive_raw()
+
+        message = await messages.__anext__()
+        await target.release(message)
+        again = await messages.__anext__()
+
+        assert again.envelope.delivery_count == 2
+        assert target.in_flight == 1
+        await messages.aclose()
+
+    @pytest.mark.asyncio
+    async def test_consume(self, make_target, sender):
+        target = make_target(max_in_flight=2)
+        await sender.send_many([{"idx": idx} for idx in range(6)])
+        actual = []
+
+        async def handler(message):
+            actual.append((await message.acontent())["idx"])
+            await asyncio.sleep(0.001)
+
+        await target.consume(handler, concurrency=4)
+
+        assert sorted(actual) == list(range(6))
+        assert target.peak_in_flight == 2
+        assert target.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_listen__wrapped_by_prefetch(self, monkeypatch, broker, sender):
+        receivers = {}
+
+        def get_receiver(name):
+            if name in receivers:
+                return receivers[name]
+            return MemoryReceiver(queue_name=name, idle_timeout=0.05, broker=broker)
+
+        monkeypatch.setattr(queues, "get_receiver", get_receiver)
+        flow = receivers["flow"] = queues.FlowControlledReceiver(
+            source_queue="foo", max_in_flight=2
+        )
+        target = queues.PrefetchMessageReceiver(source_queue="flow")
+        await sender.send_many([{"idx": idx} for idx in range(5)])
+
+        async with target:
+            actual = [
+                (await message.acontent())["idx"] async for message in target.listen()
+            ]
+
+        assert actual == list(range(5))
+        assert (flow.in_flight, flow.in_flight_bytes) == (0, 0)
+        assert flow.peak_in_flight == 2
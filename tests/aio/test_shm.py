@@ -0,0 +1,74 @@
+import asyncio
+import uuid
+
+import pytest
+
+# Shared memory queues require Python 3.8+ on a POSIX platform
+pytest.importorskip("multiprocessing.shared_memory")
+pytest.importorskip("fcntl")
+
+from pyapp_ext.messaging.aio import shm
+from pyapp_ext.messaging.exceptions import QueueFull
+
+
+@pytest.fixture
+def name(tmp_path):
+    name = f"test-{uuid.uuid4().hex[:8]}"
+    yield name
+    shm.SharedMemoryRing(name, directory=str(tmp_path)).unlink()
+
+
+class TestSharedMemoryQueues:
+    @pytest.mark.asyncio
+    async def test_send_listen(self, name, tmp_path):
+        sender = shm.SharedMemorySender(name=name, directory=str(tmp_path))
+        receiver = shm.SharedMemoryReceiver(
+            name=name, idle_timeout=0, directory=str(tmp_path)
+        )
+
+        async with sender, receiver:
+            await sender.send_many([{"a": 1}, {"b": 2}])
+            actual = [await message.acontent() async for message in receiver.listen()]
+
+        assert actual == [{"a": 1}, {"b": 2}]
+
+    @pytest.mark.asyncio
+    async def test_receive_raw__waits_for_message(self, name, tmp_path):
+        sender = shm.SharedMemorySender(name=name, directory=str(tmp_path))
+        receiver = shm.SharedMemoryReceiver(name=name, directory=str(tmp_path))
+
+        async with sender, receiver:
+
+            async def send():
+                await asyncio.sleep(0.01)
+                await sender.send(a=1)
+
+            asyncio.ensure_future(send())
+            messages = receiver.receive_raw()
+            message = await asyncio.wait_for(messages.__anext__(), 1)
+            await messages.aclose()
+
+        assert message.content == {"a": 1}
+
+    @pytest.mark.asyncio
+    async def test_send_raw__waits_for_space(self, name, tmp_path):
+        sender = shm.SharedMemorySender(name=name, capacity=64, directory=str(tmp_path))
+        receiver = shm.SharedMemoryReceiver(name=name, directory=str(tmp_path))
+
+        async with sender, receiver:
+            await sender.send_raw(bytes(40))
+            asyncio.get_event_loop().call_later(0.01, receiver.ring.get)
+            await asyncio.wait_for(sender.send_raw(bytes(40)), 1)
+
+            assert len(sender.ring) == 52
+
+    @pytest.mark.asyncio
+    async def test_send_raw__full(self, name, tmp_path):
+        target = shm.SharedMemorySender(
+            name=name, capacity=64, timeout=0.01, directory=str(tmp_path)
+        )
+
+        async with target:
+            await target.send_raw(bytes(40))
+            with pytest.raises(QueueFull):
+                await target.send_raw(bytes(40))
@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+from pyapp_ext.messaging.aio.sqlite import SQLiteSender, SQLiteReceiver
+from pyapp_ext.messaging.sqlite import SQLiteStore
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "queues.db")
+
+
+class TestSQLiteQueues:
+    @pytest.mark.asyncio
+    async def test_send_listen(self, path):
+        sender = SQLiteSender(path=path)
+        receiver = SQLiteReceiver(path=path, idle_timeout=0, vacuum_interval=0)
+
+        async with sender, receiver:
+            assert await sender.send_many([{"a": 1}, {"b": 2}]) == [1, 2]
+            actual = [await message.acontent() async for message in receiver.listen()]
+
+            assert receiver.store.counts("default")["acked"] == 0
+
+        assert actual == [{"a": 1}, {"b": 2}]
+
+    @pytest.mark.asyncio
+    async def test_send__group_commit(self, path, monkeypatch):
+        sender = SQLiteSender(path=path, commit_window=0.01)
+        batches = []
+        insert_many = sender.store.insert_many
+
+        def record(self, queue, messages):
+            batches.append(len(messages))
+            return insert_many(queue, messages)
+
+        monkeypatch.setattr(SQLiteStore, "insert_many", record)
+
+        async with sender:
+            actual = await asyncio.gather(*(sender.send(idx=idx) for idx in range(5)))
+
+        assert actual == [1, 2, 3, 4, 5]
+        assert batches == [5]
+
+    @pytest.mark.asyncio
+    async def test_send__error_raised_to_callers(self, path, monkeypatch):
+        sender = SQLiteSender(path=path)
+
+        def fail(self, queue, messages):
+            raise RuntimeError("Oops")
+
+        monkeypatch.setattr(SQLiteStore, "insert_many", fail)
+
+        with pytest.raises(RuntimeError):
+            await sender.send(a=1)
+
+    @pytest.mark.asyncio
+    async def test_receive_raw__polls_for_message(self, path):
+        sender = SQLiteSender(path=path)
+        receiver = SQLiteReceiver(path=path, idle_timeout=1, poll_interval=0.01)
+
+        async with sender, receiver:
+
+            async def send():
+                await asyncio.sleep(0.05)
+                await sender.send(a=1)
+
+            task = asyncio.ensure_future(send())
+            message = await receiver.receive_raw().__anext__()
+            await task
+
+        assert await message.acontent() == {"a": 1}
+
+    @pytest.mark.asyncio
+    async def test_release(self, path):
+        sender = SQLiteSender(path=path)
+        receiver = SQLiteReceiver(path=path, idle_timeout=0)
+
+        async with sender, receiver:
+            await sender.send(a=1)
+            message = await receiver.receive_raw().__anext__()
+            await receiver.release(message)
+            again = await receiver.receive_raw().__anext__()
+
+        assert again.envelope.attempts == 2
+
+    @pytest.mark.asyncio
+    async def test_receive_batch__releases_unused_rows(self, path):
+        sender = SQLiteSender(path=path)
+        receiver = SQLiteReceiver(path=path, idle_timeout=0, batch_size=10)
+
+        async with sender, receiver:
+            await sender.send_many([{"idx": idx} for idx in range(5)])
+            actual = await receiver.receive_batch(2)
+
+            assert [await message.acontent() for message in actual] == [
+                {"idx": 0},
+                {"idx": 1},
+            ]
+            assert receiver.store.counts("default") == {
+                "ready": 3,
+                "leased": 2,
+                "acked": 0,
+            }
+
+    @pytest.mark.asyncio
+    async def test_configure__creates_schema(self, path):
+        receiver = SQLiteReceiver(path=path, idle_timeout=0)
+
+        await receiver.configure()
+
+        assert [message async for message in receiver.receive_raw()] == []
+        await receiver.close()
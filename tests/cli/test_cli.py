@@ -229,6 +229,42 @@ class TestCLI:
         mock_sender.configure.assert_called()
         mock_factory.message_receiver_factory.create.assert_called_with("bar")
 
+    def test_train_dictionary(self, monkeypatch):
+        mock_dictionary = mock.Mock(
+            as_bytes=mock.Mock(return_value=b"dict"),
+            dict_id=mock.Mock(return_value=42),
+        )
+        mock_train = mock.Mock(return_value=mock_dictionary)
+        monkeypatch.setattr(cli, "train_zstd_dictionary", mock_train)
+        mock_out = mock.Mock()
+        mock_opts = mock.Mock(
+            OUTPUT=mock_out,
+            SAMPLES=[mock.Mock(read=mock.Mock(return_value=b"eek"))],
+            size=1024,
+            dict_id=42,
+        )
+
+        actual = cli.Extension.train_dictionary(mock_opts)
+
+        assert actual == 0
+        mock_train.assert_called_with([b"eek"], size=1024, dict_id=42)
+        mock_out.write.assert_called_with(b"dict")
+
+    def test_train_dictionary__failed(self, monkeypatch):
+        monkeypatch.setattr(
+            cli, "train_zstd_dictionary", mock.Mock(side_effect=ValueError)
+        )
+        mock_opts = mock.Mock(
+            SAMPLES=[mock.Mock(read=mock.Mock(return_value=b"eek"))],
+            size=1024,
+            dict_id=0,
+        )
+
+        actual = cli.Extension.train_dictionary(mock_opts)
+
+        assert actual == 30
+        mock_opts.OUTPUT.write.assert_not_called()
+
     def test_register_commands(self, monkeypatch):
         mock_group = mock.Mock()
         mock_command_group = mock.Mock(
@@ -238,4 +274,4 @@ class TestCLI:
         cli.Extension.register_commands(mock_command_group)
 
         mock_command_group.create_command_group.assert_called_with("messaging")
-        assert mock_group.command.call_count == 5
+        assert mock_group.command.call_count == 6
@@ -1,3 +1,4 @@
+from pyapp_ext.messaging.serialisation import GZipEncoding, FastJSONSerialise
 from .mock_bases import MessageSenderTest, MessageReceiverTest
 
 
@@ -60,6 +61,28 @@ class TestMessageSender:
             }
         )]
 
+    def test_send__below_encoding_threshold(self):
+        target = MessageSenderTest()
+        target.default_serialisation = GZipEncoding(
+            FastJSONSerialise(), threshold=1024
+        )
+
+        target.send(a="foo")
+
+        assert target.send_raw_calls == [
+            ({"a": "foo"}, {"content_type": "application/json", "content_encoding": None})
+        ]
+
+    def test_send_many(self):
+        target = MessageSenderTest()
+
+        target.send_many([{"a": "foo"}, {"b": "bar"}])
+
+        assert target.send_raw_calls == [
+            ({"a": "foo"}, {"content_type": "application/json", "content_encoding": None}),
+            ({"b": "bar"}, {"content_type": "application/json", "content_encoding": None}),
+        ]
+
 
 class TestMessageReceiver:
     def test_receive__auto_delete(self):
@@ -92,3 +115,43 @@ class TestMessageReceiver:
 
         assert actual == [{"a": "foo"}, {"b": "bar", "c": 42}]
         assert target.delete_calls == [0, 1]
+
+    def test_receive_batch(self):
+        target = MessageReceiverTest(['{"a":"foo"}', '{"b":"bar"}', '{"c":42}'])
+
+        actual = target.receive_batch(max_messages=2, max_wait=None)
+
+        assert [message.content for message in actual] == [{"a": "foo"}, {"b": "bar"}]
+        assert target.delete_calls == []
+
+    def test_receive_batch__default_max_wait(self):
+        target = MessageReceiverTest(['{"a":"foo"}', '{"b":"bar"}', '{"c":42}'])
+
+        actual = target.receive_batch(max_messages=2)
+
+        assert [message.content for message in actual] == [{"a": "foo"}]
+
+    def test_receive__batch_size(self):
+        target = MessageReceiverTest(['{"a":"foo"}', '{"b":"bar"}', '{"c":42}'])
+
+        actual = []
+        for batch in target.listen(batch_size=2):
+            actual.append([message.content for message in batch])
+
+        assert actual == [[{"a": "foo"}, {"b": "bar"}], [{"c": 42}]]
+        assert target.delete_calls == [0, 1, 2]
+
+    def test_receive__delete_batch_size(self):
+        delete_many_calls = []
+
+        class BulkReceiver(MessageReceiverTest):
+            def delete_many(self, messages):
+                delete_many_calls.append([message.envelope for message in messages])
+
+        target = BulkReceiver(['{"a":"foo"}', '{"b":"bar"}', '{"c":42}'])
+
+        for _ in target.listen(delete_batch_size=2):
+            pass
+
+        assert delete_many_calls == [[0, 1], [2]]
+        assert target.delete_calls == []
@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pytest
+
+from pyapp_ext.messaging.sio import consumers
+from .mock_bases import MessageReceiverTest
+
+
+class ThreadSafeReceiver(MessageReceiverTest):
+    def __init__(self, messages=None):
+        super().__init__(messages)
+        self.lock = threading.Lock()
+
+    def delete(self, message):
+        with self.lock:
+            super().delete(message)
+
+
+class TestThreadPoolConsumer:
+    def test_run(self):
+        in_flight = {"current": 0, "peak": 0}
+        lock = threading.Lock()
+
+        def handler(message):
+            with lock:
+                in_flight["current"] += 1
+                in_flight["peak"] = max(in_flight["peak"], in_flight["current"])
+            time.sleep(0.01)
+            with lock:
+                in_flight["current"] -= 1
+
+        receiver = ThreadSafeReceiver(['{"a":"foo"}', '{"b":"bar"}', '{"c":42}'] * 3)
+        target = consumers.ThreadPoolConsumer(receiver, handler, workers=3)
+
+        target.run()
+
+        assert sorted(receiver.delete_calls) == [0, 1, 2, 3, 4, 5, 6, 7, 8]
+        assert in_flight["peak"] <= 3
+
+    def test_run__on_error(self):
+        errors = []
+
+        def handler(message):
+            if message.envelope == 1:
+                raise ValueError("Eek")
+
+        receiver = ThreadSafeReceiver(['{"a":"foo"}', '{"b":"bar"}', '{"c":42}'])
+        target = consumers.ThreadPoolConsumer(
+            receiver,
+            handler,
+            workers=2,
+            on_error=lambda message, ex: errors.append(message.envelope),
+        )
+
+        target.run()
+
+        assert errors == [1]
+        assert sorted(receiver.delete_calls) == [0, 2]
+
+    def test_run__error_raised(self):
+        def handler(message):
+            raise ValueError("Eek")
+
+        receiver = ThreadSafeReceiver(['{"a":"foo"}', '{"b":"bar"}', '{"c":42}'])
+        target = consumers.ThreadPoolConsumer(receiver, handler, workers=1)
+
+        with pytest.raises(ValueError):
+            target.run()
+
+        assert receiver.delete_calls == []
+
+    def test_run__on_error_fails(self):
+        def handler(message):
+            raise ValueError("Eek")
+
+        def on_error(message, ex):
+            raise KeyError("Oops")
+
+        receiver = ThreadSafeReceiver(['{"a":"foo"}', '{"b":"bar"}', '{"c":42}'])
+        target = consumers.ThreadPoolConsumer(
+            receiver, handler, workers=1, on_error=on_error
+        )
+
+        with pytest.raises(KeyError):
+            target.run()
+
+        assert receiver.delete_calls == []
+
+    def test_stop(self):
+        receiver = ThreadSafeReceiver(['{"a":"foo"}', '{"b":"bar"}', '{"c":42}'])
+        target = consumers.ThreadPoolConsumer(
+            receiver, lambda message: target.stop(), workers=1
+        )
+
+        target.run()
+
+        assert receiver.delete_calls == [0]
+
+    def test_run__after_stop(self):
+        calls = []
+
+        def handler(message):
+            calls.append(message.envelope)
+            if len(calls) == 1:
+                target.stop()
+
+        receiver = ThreadSafeReceiver(['{"a":"foo"}', '{"b":"bar"}', '{"c":42}'])
+        target = consumers.ThreadPoolConsumer(receiver, handler, workers=1)
+
+        target.run()
+        target.run()
+
+        assert calls == [0, 0, 1, 2]
+
+    def test_stop__before_run(self):
+        calls = []
+        receiver = ThreadSafeReceiver(['{"a":"foo"}', '{"b":"bar"}'])
+        target = consumers.ThreadPoolConsumer(receiver, calls.append, workers=1)
+
+        target.stop()
+        target.run()
+
+        assert calls == []
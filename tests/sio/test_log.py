@@ -0,0 +1,55 @@
+import threading
+
+import pytest
+
+from pyapp_ext.messaging import log
+from pyapp_ext.messaging.sio.log import LogSender, LogReceiver
+
+
+@pytest.fixture
+def directory(tmp_path):
+    path = str(tmp_path / "log")
+    yield path
+    log.open_log(path).close()
+
+
+class TestLogQueues:
+    def test_send_listen(self, directory):
+        sender = LogSender(directory=directory)
+        receiver = LogReceiver(directory=directory, idle_timeout=0)
+
+        with sender, receiver:
+            assert sender.send_many([{"a": 1}, {"b": 2}]) == [0, 1]
+            actual = [message.content for message in receiver.listen()]
+
+        assert actual == [{"a": 1}, {"b": 2}]
+        assert receiver.group.committed == 2
+
+    def test_listen__across_segments(self, directory):
+        sender = LogSender(directory=directory, segment_size=256)
+        receiver = LogReceiver(directory=directory, segment_size=256, idle_timeout=0)
+
+        with sender, receiver:
+            sender.send_many([{"idx": idx} for idx in range(12)])
+            actual = [message.content["idx"] for message in receiver.listen()]
+
+        assert actual == list(range(12))
+
+    def test_receive_raw__waits_for_message(self, directory):
+        sender = LogSender(directory=directory, sync_window=None)
+        receiver = LogReceiver(directory=directory, idle_timeout=1)
+
+        threading.Timer(0.01, sender.send, kwargs={"a": 1}).start()
+
+        assert next(receiver.receive_raw()).content == {"a": 1}
+
+    def test_unacked_redelivered_after_restart(self, directory):
+        sender = LogSender(directory=directory)
+        sender.send(a=1)
+        receiver = LogReceiver(directory=directory, idle_timeout=0)
+        assert len(list(receiver.receive_raw())) == 1
+        log.open_log(directory).close()
+
+        receiver = LogReceiver(directory=directory, idle_timeout=0)
+
+        assert [message.content for message in receiver.listen()] == [{"a": 1}]
@@ -0,0 +1,102 @@
+import threading
+
+import pytest
+
+from pyapp_ext.messaging.sio import memory
+from pyapp_ext.messaging.memory import Delivery, MemoryBroker, QueueFull
+
+
+@pytest.fixture
+def broker():
+    return MemoryBroker()
+
+
+class TestMemorySender:
+    def test_init__requires_one_target(self):
+        with pytest.raises(ValueError):
+            memory.MemorySender()
+
+    def test_send(self, broker):
+        target = memory.MemorySender(queue_name="foo", broker=broker)
+
+        with target:
+            message_id = target.send(a=1)
+
+        _, item = broker.get_queue("foo").get(timeout=0)
+        assert item.message_id == message_id
+
+    def test_send_raw__topic_fan_out(self, broker):
+        broker.subscribe("events", "a")
+        broker.subscribe("events", "b")
+        body = b"{}"
+        target = memory.MemorySender(topic="events", broker=broker)
+
+        target.send_raw(body)
+
+        assert broker.get_queue("a").get(timeout=0)[1].body is body
+        assert broker.get_queue("b").get(timeout=0)[1].body is body
+
+    def test_send_raw__full(self, broker):
+        target = memory.MemorySender(
+            queue_name="foo", max_size=1, timeout=0.01, broker=broker
+        )
+        target.send_raw(b"{}")
+
+        with pytest.raises(QueueFull):
+            target.send_raw(b"{}")
+
+
+class TestMemoryReceiver:
+    def test_listen(self, broker):
+        sender = memory.MemorySender(queue_name="foo", broker=broker)
+        target = memory.MemoryReceiver(queue_name="foo", idle_timeout=0, broker=broker)
+        sender.send_many([{"a": 1}, {"b": 2}])
+
+        actual = list(target.listen())
+
+        assert [message.content for message in actual] == [{"a": 1}, {"b": 2}]
+        assert isinstance(actual[0].envelope, Delivery)
+        assert len(broker.get_queue("foo")) == 0
+
+    def test_receive_raw__from_another_thread(self, broker):
+        sender = memory.MemorySender(queue_name="foo", broker=broker)
+        target = memory.MemoryReceiver(queue_name="foo", idle_timeout=1, broker=broker)
+
+        threading.Timer(0.01, sender.send, kwargs={"a": 1}).start()
+
+        assert next(target.receive_raw()).content == {"a": 1}
+
+    def test_redelivery(self, broker):
+        sender = memory.MemorySender(queue_name="foo", broker=broker)
+        target = memory.MemoryReceiver(
+            queue_name="foo", visibility_timeout=0.01, idle_timeout=1, broker=broker
+        )
+        sender.send(a=1)
+
+        messages = target.receive_raw()
+        first = next(messages)
+        second = next(messages)
+
+        assert first.envelope.message_id == second.envelope.message_id
+        assert second.envelope.delivery_count == 2
+
+    def test_topics(self, broker):
+        sender = memory.MemorySender(topic="events", broker=broker)
+        target = memory.MemoryReceiver(
+            queue_name="a", topics=["events"], idle_timeout=0, broker=broker
+        )
+        target.configure()
+
+        sender.send(a=1)
+
+        assert [m.content for m in target.listen()] == [{"a": 1}]
+
+    def test_release(self, broker):
+        sender = memory.MemorySender(queue_name="foo", broker=broker)
+        target = memory.MemoryReceiver(queue_name="foo", idle_timeout=0, broker=broker)
+        sender.send(a=1)
+
+        messages = target.receive_raw()
+        target.release(next(messages))
+
+        assert next(messages).envelope.delivery_count == 2
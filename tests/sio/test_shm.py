@@ -0,0 +1,55 @@
+import threading
+import uuid
+
+import pytest
+
+# Shared memory queues require Python 3.8+ on a POSIX platform
+pytest.importorskip("multiprocessing.shared_memory")
+pytest.importorskip("fcntl")
+
+from pyapp_ext.messaging.exceptions import QueueFull
+from pyapp_ext.messaging.sio import shm
+
+
+@pytest.fixture
+def name(tmp_path):
+    name = f"test-{uuid.uuid4().hex[:8]}"
+    yield name
+    shm.SharedMemoryRing(name, directory=str(tmp_path)).unlink()
+
+
+class TestSharedMemoryQueues:
+    def test_send_listen(self, name, tmp_path):
+        sender = shm.SharedMemorySender(name=name, directory=str(tmp_path))
+        receiver = shm.SharedMemoryReceiver(
+            name=name, idle_timeout=0, directory=str(tmp_path)
+        )
+
+        with sender, receiver:
+            sender.send_many([{"a": 1}, {"b": 2}])
+            actual = [message.content for message in receiver.listen()]
+
+        assert actual == [{"a": 1}, {"b": 2}]
+
+    def test_receive_raw__waits_for_message(self, name, tmp_path):
+        sender = shm.SharedMemorySender(name=name, directory=str(tmp_path))
+        receiver = shm.SharedMemoryReceiver(
+            name=name, idle_timeout=1, directory=str(tmp_path)
+        )
+        receiver.open()
+
+        threading.Timer(0.01, sender.send, kwargs={"a": 1}).start()
+
+        assert next(receiver.receive_raw()).content == {"a": 1}
+        sender.close()
+        receiver.close()
+
+    def test_send_raw__full(self, name, tmp_path):
+        target = shm.SharedMemorySender(
+            name=name, capacity=64, timeout=0.01, directory=str(tmp_path)
+        )
+
+        with target:
+            target.send_raw(bytes(40))
+            with pytest.raises(QueueFull):
+                target.send_raw(bytes(40))
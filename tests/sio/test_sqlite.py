@@ -0,0 +1,86 @@
+import threading
+
+import pytest
+
+from pyapp_ext.messaging.sio.sqlite import SQLiteSender, SQLiteReceiver
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "queues.db")
+
+
+class TestSQLiteQueues:
+    def test_send_listen(self, path):
+        sender = SQLiteSender(path=path)
+        receiver = SQLiteReceiver(path=path, idle_timeout=0, vacuum_interval=0)
+
+        with sender, receiver:
+            assert sender.send_many([{"a": 1}, {"b": 2}]) == [1, 2]
+            actual = [message.content for message in receiver.listen()]
+
+            assert receiver.store.counts("default") == {
+                "ready": 0,
+                "leased": 0,
+                "acked": 0,
+            }
+
+        assert actual == [{"a": 1}, {"b": 2}]
+
+    def test_queues_are_separate(self, path):
+        sender = SQLiteSender(path=path, queue_name="a")
+        receiver = SQLiteReceiver(path=path, queue_name="b", idle_timeout=0)
+
+        with sender, receiver:
+            sender.send(a=1)
+
+            assert list(receiver.receive_raw()) == []
+
+    def test_receive_raw__polls_for_message(self, path):
+        sender = SQLiteSender(path=path)
+        receiver = SQLiteReceiver(path=path, idle_timeout=1, poll_interval=0.01)
+        sender.configure()
+
+        threading.Timer(0.05, sender.send, kwargs={"a": 1}).start()
+
+        with receiver:
+            assert next(receiver.receive_raw()).content == {"a": 1}
+        sender.close()
+
+    def test_undeleted_redelivered(self, path):
+        sender = SQLiteSender(path=path)
+        receiver = SQLiteReceiver(path=path, idle_timeout=0, visibility_timeout=0)
+
+        with sender, receiver:
+            sender.send(a=1)
+            first = next(receiver.receive_raw())
+            second = next(receiver.receive_raw())
+
+            assert first.envelope.id == second.envelope.id
+            assert second.envelope.attempts == 2
+
+    def test_release(self, path):
+        sender = SQLiteSender(path=path)
+        receiver = SQLiteReceiver(path=path, idle_timeout=0)
+
+        with sender, receiver:
+            sender.send(a=1)
+            message = next(receiver.receive_raw())
+            receiver.release(message)
+
+            assert next(receiver.receive_raw()).content == {"a": 1}
+
+    def test_receive_batch__releases_unused_rows(self, path):
+        sender = SQLiteSender(path=path)
+        receiver = SQLiteReceiver(path=path, idle_timeout=0, batch_size=10)
+
+        with sender, receiver:
+            sender.send_many([{"idx": idx} for idx in range(5)])
+            actual = receiver.receive_batch(2, max_wait=None)
+
+            assert [message.content for message in actual] == [{"idx": 0}, {"idx": 1}]
+            assert receiver.store.counts("default") == {
+                "ready": 3,
+                "leased": 2,
+                "acked": 0,
+            }
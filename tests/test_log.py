@@ -0,0 +1,202 @@
+import os
+import threading
+
+import pytest
+
+from pyapp_ext.messaging import log
+from pyapp_ext.messaging.exceptions import MessagingError
+
+
+@pytest.fixture
+def directory(tmp_path):
+    path = str(tmp_path / "log")
+    yield path
+    log.open_log(path).close()
+
+
+class TestSegmentedLog:
+    def test_append_read(self, directory):
+        target = log.open_log(directory)
+        group = target.group("a")
+
+        assert target.append(b"foo", "application/json", "GZIP") == 0
+        assert target.append("bar") == 1
+
+        offset, body, content_type, content_encoding = target.read(group)
+        assert (offset, content_type, content_encoding) == (
+            0,
+            "application/json",
+            "GZIP",
+        )
+        assert isinstance(body, memoryview)
+        assert body == b"foo"
+        assert target.read(group)[1:] == (1, "bar", None, None)[1:]
+        assert target.read(group) is None
+
+    def test_groups_receive_every_message(self, directory):
+        target = log.open_log(directory)
+        target.append(b"foo")
+
+        assert target.read(target.group("a"))[1] == b"foo"
+        assert target.read(target.group("b"))[1] == b"foo"
+
+    def test_roll_segments(self, directory):
+        target = log.open_log(directory, segment_size=256)
+        for idx in range(20):
+            target.append(bytes(20))
+
+        assert len(target.segments) > 1
+        group = target.group("a")
+        assert [target.read(group)[0] for _ in range(20)] == list(range(20))
+
+    def test_append__too_large(self, directory):
+        target = log.open_log(directory, segment_size=256)
+
+        with pytest.raises(ValueError):
+            target.append(bytes(512))
+
+    def test_restart__redelivers_unacked(self, directory):
+        target = log.open_log(directory)
+        group = target.group("a")
+        for idx in range(5):
+            target.append(b"%d" % idx)
+        offsets = [target.read(group)[0] for _ in range(5)]
+        target.ack(group, offsets[0], offsets[1], offsets[3])
+        target.close()
+
+        target = log.open_log(directory)
+        group = target.group("a")
+
+        # Acknowledgements above the committed offset are not persisted
+        assert group.committed == 2
+        assert [bytes(target.read(group)[1]) for _ in range(3)] == [b"2", b"3", b"4"]
+        assert target.read(group) is None
+
+    def test_restart__ignores_partial_record(self, directory):
+        target = log.open_log(directory)
+        target.append(b"foo")
+        target.append(b"bar")
+        segment = target.segments[0]
+        target.close()
+
+        # Corrupt the last record
+        with open(segment.path, "r+b") as f:
+            f.seek(segment.write_position - 1)
+            f.write(b"X")
+
+        target = log.open_log(directory)
+        assert target.next_offset == 1
+
+    def test_rewind(self, directory):
+        target = log.open_log(directory)
+        group = target.group("a")
+        for idx in range(3):
+            target.append(b"%d" % idx)
+        for _ in range(3):
+            target.read(group)
+        target.ack(group, 1)
+
+        group.rewind()
+
+        assert [target.read(group)[0] for _ in range(2)] == [0, 2]
+
+    def test_compact(self, directory):
+        target = log.open_log(directory, segment_size=256)
+        a, b = target.group("a"), target.group("b")
+        for idx in range(20):
+            target.append(bytes(20))
+        segments = len(target.segments)
+
+        for group in (a, b):
+            target.ack(group, *(target.read(group)[0] for _ in range(15)))
+
+        assert len(target.segments) < segments
+        assert target.first_offset <= 15
+        assert len(os.listdir(directory)) == len(target.segments) + 2
+
+    def test_compact__read_across_segment_boundary(self, directory):
+        target = log.open_log(directory, segment_size=256)
+        group = target.group("a")
+        for idx in range(12):
+            target.append(b"%02d" % idx + bytes(20))
+        first_segment = target.segments[1].base_offset
+
+        # Read and ack to the end of the first segment, compacting it away
+        for _ in range(first_segment):
+            target.ack(group, target.read(group)[0])
+
+        assert target.segments[0].base_offset == first_segment
+        actual = [bytes(target.read(group)[1][:2]) for _ in range(12 - first_segment)]
+        assert actual == [b"%02d" % idx for idx in range(first_segment, 12)]
+        assert target.read(group) is None
+
+    def test_compact__no_groups(self, directory):
+        target = log.open_log(directory, segment_size=256)
+        for idx in range(20):
+            target.append(bytes(20))
+
+        assert target.compact() == 0
+
+    def test_commit(self, directory):
+        target = log.open_log(directory)
+        offsets = []
+
+        def append():
+            offset = target.append(b"foo")
+            target.commit(offset, 0.01)
+            offsets.append(offset)
+
+        threads = [threading.Thread(target=append) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert sorted(offsets) == [0, 1, 2, 3, 4]
+        assert target._synced == 5
+
+    def test_commit__error_raised_to_group(self, directory, monkeypatch):
+        target = log.open_log(directory)
+        errors = []
+
+        def sync(self):
+            raise OSError("Disk full")
+
+        monkeypatch.setattr(log.SegmentedLog, "sync", sync)
+
+        def append():
+            offset = target.append(b"foo")
+            try:
+                target.commit(offset, 0.05)
+            except OSError as ex:
+                errors.append(ex)
+
+        threads = [threading.Thread(target=append) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(errors) == 3
+        assert target._synced == 0
+
+        monkeypatch.undo()
+        target.commit(2)
+        assert target._synced == 3
+
+    def test_read_wait(self, directory):
+        target = log.open_log(directory)
+        group = target.group("a")
+        threading.Timer(0.01, target.append, (b"foo",)).start()
+
+        assert target.read_wait(group, 1)[0] == 0
+        assert target.read_wait(group, 0.01) is None
+
+    def test_load__not_a_segment(self, directory):
+        os.makedirs(directory)
+        with open(os.path.join(directory, "0.log"), "wb") as f:
+            f.write(bytes(64))
+
+        with pytest.raises(MessagingError):
+            log.SegmentedLog(directory)
+        os.remove(os.path.join(directory, "0.log"))
@@ -0,0 +1,180 @@
+import threading
+import time
+
+import pytest
+
+from pyapp_ext.messaging import memory
+from pyapp_ext.messaging.exceptions import QueueNotFound
+
+
+def item(broker, body=b"foo"):
+    _, (result,) = broker.items(body, "application/json", None, 1)
+    return result
+
+
+@pytest.fixture
+def broker():
+    return memory.MemoryBroker()
+
+
+class TestMemoryQueue:
+    def test_put_get_ack(self, broker):
+        target = memory.MemoryQueue("foo")
+        target.put(item(broker))
+
+        receipt, actual = target.get(timeout=0)
+
+        assert actual.body == b"foo"
+        assert actual.delivery_count == 1
+        assert (target.ready_count, target.in_flight_count) == (0, 1)
+        assert target.ack(receipt) == 1
+        assert target.ack(receipt) == 0
+        assert len(target) == 0
+
+    def test_get__timeout(self):
+        target = memory.MemoryQueue("foo")
+
+        assert target.get(timeout=0.01) is None
+
+    def test_get__redelivered_after_visibility_timeout(self, broker):
+        target = memory.MemoryQueue("foo")
+        target.put(item(broker))
+
+        receipt, _ = target.get(timeout=0, visibility_timeout=0.01)
+        assert target.get(timeout=0) is None
+
+        redelivered_receipt, actual = target.get(timeout=1)
+
+        assert actual.delivery_count == 2
+        assert target.ack(receipt) == 0
+        assert target.ack(redelivered_receipt) == 1
+
+    def test_release(self, broker):
+        target = memory.MemoryQueue("foo")
+        target.put(item(broker, b"a"))
+        target.put(item(broker, b"b"))
+
+        receipt, _ = target.get(timeout=0)
+        assert target.release(receipt)
+        assert not target.release(receipt)
+
+        _, actual = target.get(timeout=0)
+        assert actual.body == b"a"
+
+    def test_release__order_kept(self, broker):
+        target = memory.MemoryQueue("foo")
+        for body in (b"a", b"b", b"c"):
+            target.put(item(broker, body))
+        receipts = [target.get(timeout=0)[0] for _ in range(2)]
+
+        assert target.release(*receipts) == 2
+
+        actual = [target.get(timeout=0)[1].body for _ in range(3)]
+        assert actual == [b"a", b"b", b"c"]
+
+    def test_get__expired_order_kept(self, broker):
+        target = memory.MemoryQueue("foo")
+        for body in (b"a", b"b", b"c"):
+            target.put(item(broker, body))
+        for _ in range(2):
+            target.get(timeout=0, visibility_timeout=0.01)
+        time.sleep(0.02)
+
+        actual = [target.get(timeout=0)[1].body for _ in range(3)]
+        assert actual == [b"a", b"b", b"c"]
+
+    def test_put__bounded(self, broker):
+        target = memory.MemoryQueue("foo", max_size=1)
+        target.put(item(broker))
+
+        with pytest.raises(memory.QueueFull):
+            target.put(item(broker), timeout=0.01)
+
+    def test_put__waits_for_ack(self, broker):
+        target = memory.MemoryQueue("foo", max_size=1)
+        target.put(item(broker))
+        receipt, _ = target.get(timeout=0)
+        threading.Timer(0.01, target.ack, (receipt,)).start()
+
+        target.put(item(broker), timeout=1)
+
+        assert target.ready_count == 1
+
+    def test_get_or_wait(self, broker):
+        target = memory.MemoryQueue("foo")
+        calls = []
+
+        assert target.get_or_wait(lambda: calls.append(1)) is None
+        target.put(item(broker))
+
+        assert calls == [1]
+        assert target.get_or_wait(None) is not None
+
+    def test_close(self, broker):
+        target = memory.MemoryQueue("foo")
+        target.put(item(broker))
+        threading.Timer(0.01, target.close).start()
+
+        assert target.get() is not None
+        assert target.get() is None
+        with pytest.raises(memory.QueueClosed):
+            target.put(item(broker))
+
+    def test_ack__prunes_deadlines(self, broker):
+        target = memory.MemoryQueue("foo")
+        for _ in range(200):
+            target.put(item(broker))
+        receipts = [target.get(timeout=0, visibility_timeout=60)[0] for _ in range(200)]
+
+        target.ack(*receipts)
+
+        assert len(target._deadlines) <= 64
+
+
+class TestMemoryBroker:
+    def test_declare_queue(self, broker):
+        queue = broker.declare_queue("foo")
+
+        assert broker.declare_queue("foo") is queue
+        assert broker.declare_queue("foo", max_size=10).max_size == 10
+        assert "foo" in broker
+
+    def test_get_queue__not_found(self, broker):
+        with pytest.raises(QueueNotFound):
+            broker.get_queue("foo")
+
+    def test_subscribe(self, broker):
+        broker.subscribe("events", "b")
+        broker.subscribe("events", "a")
+
+        assert [q.name for q in broker.subscribers("events")] == ["a", "b"]
+        assert broker.subscribers("other") == []
+
+        broker.unsubscribe("events", "a")
+        assert [q.name for q in broker.subscribers("events")] == ["b"]
+
+    def test_delete_queue(self, broker):
+        queue = broker.declare_queue("foo")
+        broker.subscribe("events", "foo")
+
+        broker.delete_queue("foo")
+
+        assert queue.closed
+        assert "foo" not in broker
+        assert broker.subscribers("events") == []
+
+    def test_items(self, broker):
+        body = b"foo"
+
+        message_id, items = broker.items(body, "text/plain", None, 2)
+
+        assert len(items) == 2
+        assert all(i.message_id == message_id and i.body is body for i in items)
+
+    def test_reset(self, broker):
+        queue = broker.declare_queue("foo")
+
+        broker.reset()
+
+        assert queue.closed
+        assert "foo" not in broker
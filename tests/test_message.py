@@ -0,0 +1,72 @@
+import mock
+import pytest
+
+from pyapp_ext.messaging.message import BaseMessage
+from pyapp_ext.messaging.serialisation import JSONSerialise, GZipEncoding
+
+
+@pytest.fixture
+def queue():
+    queue = mock.Mock()
+    queue.serialisation = mock.Mock(
+        wraps=JSONSerialise(), content_type="application/json", content_encoding=None
+    )
+    return queue
+
+
+class TestBaseMessage:
+    def test_content__decoded_once(self, queue):
+        target = BaseMessage('{"a": 1}', "application/json", None, 1, queue)
+
+        assert target.content == {"a": 1}
+        assert target.content == {"a": 1}
+        queue.serialisation.deserialise.assert_called_once_with('{"a": 1}')
+
+    def test_tuple_compatibility(self, queue):
+        target = BaseMessage("body", "application/json", None, 1, queue)
+
+        body, content_type, content_encoding, envelope, actual_queue = target
+
+        assert (body, content_type, content_encoding, envelope) == (
+            "body",
+            "application/json",
+            None,
+            1,
+        )
+        assert actual_queue is queue
+        assert target[0] == "body"
+        assert target[-2] == 1
+        assert len(target) == 5
+        assert target == ("body", "application/json", None, 1, queue)
+        assert target._asdict()["envelope"] == 1
+
+    def test_repr(self, queue):
+        target = BaseMessage("body", "application/json", None, 1, queue)
+
+        assert repr(target).startswith("BaseMessage(body='body', ")
+
+    def test_replace__keeps_cache(self, queue):
+        target = BaseMessage('{"a": 1}', "application/json", None, 1, queue)
+        assert target.content == {"a": 1}
+
+        actual = target._replace(envelope=2)
+
+        assert actual.envelope == 2
+        assert actual.content == {"a": 1}
+        queue.serialisation.deserialise.assert_called_once()
+
+    def test_replace__body_resets_cache(self, queue):
+        target = BaseMessage('{"a": 1}', "application/json", None, 1, queue)
+        assert target.content == {"a": 1}
+
+        actual = target._replace(body='{"a": 2}')
+
+        assert actual.content == {"a": 2}
+        assert target.content == {"a": 1}
+
+    def test_content__uses_message_serialisation(self, queue):
+        body = GZipEncoding(JSONSerialise()).serialise({"a": 1})
+        target = BaseMessage(body, "application/json", "gzip", 1, queue)
+
+        assert target.content == {"a": 1}
+        queue.serialisation.deserialise.assert_not_called()
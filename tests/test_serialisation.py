@@ -1,7 +1,20 @@
+import datetime
+import decimal
+import json
+import mmap
+import pickle
+import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 
 from pyapp_ext.messaging import serialisation
 
+requires_pickle5 = pytest.mark.skipif(
+    sys.version_info < (3, 8), reason="Pickle protocol 5 requires Python 3.8+"
+)
+
 
 @pytest.mark.parametrize(
     "target, value",
@@ -10,10 +23,15 @@ from pyapp_ext.messaging import serialisation
         (serialisation.PickleSerialise(), {"Foo": "Bar"}),
         (serialisation.PickleSerialise(), 123),
         (serialisation.PickleSerialise(), True),
+        (serialisation.PickleSerialise(protocol=2), {"Foo": "Bar"}),
         (serialisation.JSONSerialise(), "Foo"),
         (serialisation.JSONSerialise(), {"Foo": "Bar"}),
         (serialisation.JSONSerialise(), 123),
         (serialisation.JSONSerialise(), True),
+        (serialisation.FastJSONSerialise(), "Foo"),
+        (serialisation.FastJSONSerialise(), {"Foo": "Bar"}),
+        (serialisation.FastJSONSerialise(), 123),
+        (serialisation.FastJSONSerialise(), True),
     ),
 )
 def test_content_type__round_trip(target, value):
@@ -41,3 +59,400 @@ def test_content_encoder__round_trip(target, value):
     actual = target.deserialise(data)
 
     assert actual == value
+
+
+@pytest.mark.parametrize(
+    "encoding, module, kwargs",
+    (
+        ("GZipEncoding", "gzip", {"level": 1}),
+        ("ZstdEncoding", "zstandard", {"level": 19}),
+        ("LZ4Encoding", "lz4", {"level": 9}),
+    ),
+)
+class TestContentEncodings:
+    @pytest.fixture
+    def target(self, encoding, module, kwargs):
+        pytest.importorskip(module)
+        return getattr(serialisation, encoding)(
+            serialisation.FastJSONSerialise(), threshold=64, **kwargs
+        )
+
+    def test_round_trip(self, target):
+        value = {"values": ["message"] * 100}
+
+        actual = target.deserialise(target.serialise(value))
+
+        assert actual == value
+
+    def test_serialise_encoded__above_threshold(self, target):
+        value = {"values": ["message"] * 100}
+
+        data, content_encoding = target.serialise_encoded(value)
+
+        assert content_encoding == target.content_encoding
+        assert len(data) < len(target.content.serialise(value))
+        assert target.deserialise(data) == value
+
+    def test_serialise_encoded__below_threshold(self, target):
+        data, content_encoding = target.serialise_encoded({"a": 1})
+
+        assert content_encoding is None
+        assert data == b'{"a":1}'
+
+    def test_registered(self, target):
+        assert ("application/json", target.content_encoding) in serialisation.registry
+
+
+@pytest.mark.parametrize(
+    "target",
+    (
+        serialisation.JSONSerialise(),
+        serialisation.FastJSONSerialise(),
+        serialisation.GZipEncoding(serialisation.JSONSerialise()),
+    ),
+)
+@pytest.mark.parametrize("body_type", (bytes, bytearray, memoryview))
+def test_deserialise__bytes_like(target, body_type):
+    data = target.serialise({"a": 1})
+    if isinstance(data, str):
+        data = data.encode()
+
+    actual = target.deserialise(body_type(data))
+
+    assert actual == {"a": 1}
+
+
+def test_serialise_encoded__content_type():
+    target = serialisation.JSONSerialise()
+
+    assert target.serialise_encoded({"a": 1}) == ('{"a": 1}', None)
+
+
+class TestFastJSONSerialise:
+    def test_serialise__bytes(self):
+        target = serialisation.FastJSONSerialise()
+
+        actual = target.serialise({"a": [1, 2.5, None, "é"]})
+
+        assert isinstance(actual, bytes)
+        assert json.loads(actual) == {"a": [1, 2.5, None, "é"]}
+
+    def test_serialise__native_types(self):
+        target = serialisation.FastJSONSerialise()
+        value = {
+            "when": datetime.datetime(2020, 1, 2, 3, 4, 5, 600000),
+            "id": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+        }
+
+        actual = json.loads(target.serialise(value))
+
+        assert actual == {
+            "when": "2020-01-02T03:04:05.600000",
+            "id": "12345678-1234-5678-1234-567812345678",
+        }
+
+    @pytest.mark.parametrize("data", (b'{"a":1}', bytearray(b'{"a":1}'), '{"a":1}'))
+    def test_deserialise(self, data):
+        target = serialisation.FastJSONSerialise()
+
+        assert target.deserialise(data) == {"a": 1}
+
+    def test_stdlib_backend(self):
+        value = {
+            "when": datetime.date(2020, 1, 2),
+            "id": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+        }
+
+        data = serialisation._stdlib_dumps(value)
+        actual = serialisation._stdlib_loads(memoryview(data))
+
+        assert (
+            data == b'{"when":"2020-01-02","id":"12345678-1234-5678-1234-567812345678"}'
+        )
+        assert actual == {"when": "2020-01-02", "id": str(value["id"])}
+
+    def test_stdlib_backend__unsupported(self):
+        with pytest.raises(TypeError):
+            serialisation._stdlib_dumps({"a": object()})
+
+
+class TestMsgPackSerialise:
+    @pytest.fixture
+    def target(self):
+        pytest.importorskip("msgpack")
+        return serialisation.MsgPackSerialise()
+
+    @pytest.mark.parametrize(
+        "value",
+        (
+            "Foo",
+            {"Foo": "Bar", 1: [1.5, None, True]},
+            123,
+            b"\x00binary",
+            datetime.datetime(2020, 1, 2, 3, 4, 5, 600000),
+            datetime.datetime(
+                2020,
+                1,
+                2,
+                3,
+                4,
+                5,
+                tzinfo=datetime.timezone(datetime.timedelta(hours=10)),
+            ),
+            datetime.date(2020, 1, 2),
+            decimal.Decimal("12.3400"),
+            uuid.UUID("12345678-1234-5678-1234-567812345678"),
+        ),
+    )
+    def test_round_trip(self, target, value):
+        data = target.serialise(value)
+        actual = target.deserialise(data)
+
+        assert actual == value
+        assert type(actual) is type(value)
+
+    def test_round_trip__gzip(self, target):
+        encoding = serialisation.GZipEncoding(target)
+
+        actual = encoding.deserialise(encoding.serialise({"a": decimal.Decimal("1.1")}))
+
+        assert actual == {"a": decimal.Decimal("1.1")}
+        assert encoding.content_type == "application/msgpack"
+
+    def test_serialise__unsupported(self, target):
+        with pytest.raises(TypeError):
+            target.serialise(object())
+
+    def test_registered(self, target):
+        assert ("application/msgpack", None) in serialisation.registry
+        assert ("application/msgpack", "GZIP") in serialisation.registry
+
+
+class TestZstdDictEncoding:
+    @pytest.fixture
+    def dictionary(self):
+        pytest.importorskip("zstandard")
+        samples = [
+            json.dumps(
+                {"event": "order.created", "order_id": idx, "sku": f"SKU-{idx % 7}"}
+            ).encode()
+            for idx in range(500)
+        ]
+        return serialisation.train_zstd_dictionary(samples, size=2048, dict_id=42)
+
+    def test_round_trip(self, dictionary):
+        target = serialisation.ZstdDictEncoding(
+            serialisation.FastJSONSerialise(), dictionary
+        )
+        value = {"event": "order.created", "order_id": 1234, "sku": "SKU-1"}
+
+        data, content_encoding = target.serialise_encoded(value)
+
+        assert content_encoding == "ZSTD-DICT:42"
+        assert target.deserialise(data) == value
+
+    def test_raw_dictionary(self, dictionary):
+        target = serialisation.ZstdDictEncoding(
+            serialisation.FastJSONSerialise(), dictionary.as_bytes()
+        )
+
+        assert target.content_encoding == "ZSTD-DICT:42"
+
+    def test_registry__selects_dictionary(self, dictionary):
+        registry = serialisation.SerialisationRegistry()
+        target = registry.register(
+            serialisation.ZstdDictEncoding(
+                serialisation.FastJSONSerialise(), dictionary
+            )
+        )
+
+        assert registry.get("application/json", "zstd-dict:42") is target
+
+
+@requires_pickle5
+class TestOutOfBandPickleSerialise:
+    def test_round_trip(self):
+        target = serialisation.OutOfBandPickleSerialise()
+
+        actual = target.deserialise(target.serialise({"Foo": bytearray(b"Bar")}))
+
+        assert actual == {"Foo": bytearray(b"Bar")}
+
+    def test_round_trip__out_of_band(self):
+        target = serialisation.OutOfBandPickleSerialise()
+        blob = b"x" * 4096
+
+        data = target.serialise({"blob": pickle.PickleBuffer(blob), "seq": 1})
+        actual = target.deserialise(data)
+
+        # Buffer is framed after the pickle stream rather than inside it
+        assert data.endswith(blob)
+        assert actual["seq"] == 1
+        assert actual["blob"] == blob
+        # Loaded buffer is a view over the message body (not a copy)
+        assert isinstance(actual["blob"], memoryview)
+        assert actual["blob"].obj is data
+
+    def test_round_trip__no_buffers(self):
+        target = serialisation.OutOfBandPickleSerialise()
+
+        actual = target.deserialise(target.serialise({"a": [1, 2, 3]}))
+
+        assert actual == {"a": [1, 2, 3]}
+
+    def test_deserialise__mmap(self, tmp_path):
+        target = serialisation.OutOfBandPickleSerialise()
+        blob = bytearray(b"y" * 4096)
+        path = tmp_path / "body"
+        path.write_bytes(target.serialise({"blob": pickle.PickleBuffer(blob)}))
+
+        with path.open("rb") as f, mmap.mmap(
+            f.fileno(), 0, access=mmap.ACCESS_READ
+        ) as body:
+            actual = target.deserialise(body)
+            assert actual["blob"] == blob
+            actual["blob"].release()
+
+
+class RecordingExecutor(ThreadPoolExecutor):
+    def __init__(self):
+        super().__init__(1)
+        self.calls = []
+
+    def submit(self, fn, *args, **kwargs):
+        self.calls.append(fn)
+        return super().submit(fn, *args, **kwargs)
+
+
+class TestAsyncSerialisation:
+    @pytest.fixture
+    def executor(self):
+        executor = RecordingExecutor()
+        yield executor
+        executor.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_adeserialise__inline(self, executor):
+        target = serialisation.FastJSONSerialise()
+
+        actual = await target.adeserialise(b'{"a":1}', executor=executor, threshold=64)
+
+        assert actual == {"a": 1}
+        assert executor.calls == []
+
+    @pytest.mark.asyncio
+    async def test_adeserialise__offloaded(self, executor):
+        target = serialisation.GZipEncoding(serialisation.FastJSONSerialise())
+        value = {"values": list(range(1000))}
+
+        actual = await target.adeserialise(
+            target.serialise(value), executor=executor, threshold=64
+        )
+
+        assert actual == value
+        assert executor.calls == [target.deserialise]
+
+    @pytest.mark.asyncio
+    async def test_aserialise__offloaded(self, executor):
+        target = serialisation.GZipEncoding(serialisation.FastJSONSerialise())
+        value = {"values": list(range(1000))}
+
+        data = await target.aserialise(value, executor=executor, threshold=64)
+
+        assert target.deserialise(data) == value
+        assert executor.calls == [target.compress]
+
+    @pytest.mark.asyncio
+    async def test_aserialise_encoded__below_encoding_threshold(self, executor):
+        target = serialisation.GZipEncoding(
+            serialisation.FastJSONSerialise(), threshold=1024
+        )
+
+        actual = await target.aserialise_encoded(
+            {"a": 1}, executor=executor, threshold=0
+        )
+
+        assert actual == (b'{"a":1}', None)
+        assert executor.calls == []
+
+    @pytest.mark.asyncio
+    async def test_aserialise_encoded__content_type(self, executor):
+        target = serialisation.FastJSONSerialise()
+
+        actual = await target.aserialise_encoded({"a": 1}, executor=executor)
+
+        assert actual == (b'{"a":1}', None)
+
+
+class TestSerialisationRegistry:
+    def test_register(self):
+        target = serialisation.SerialisationRegistry()
+        json_serialise = serialisation.JSONSerialise()
+
+        target.register(json_serialise)
+
+        assert len(target) == 1
+        assert ("application/json", None) in target
+        assert target.get("application/json") is json_serialise
+
+    @pytest.mark.parametrize(
+        "content_type, content_encoding",
+        (
+            ("application/json", "GZIP"),
+            ("Application/JSON", "gzip"),
+            ("application/json; charset=utf-8", "gzip"),
+        ),
+    )
+    def test_get__normalised(self, content_type, content_encoding):
+        target = serialisation.SerialisationRegistry()
+        gzip_json = target.register(
+            serialisation.GZipEncoding(serialisation.JSONSerialise())
+        )
+
+        actual = target.get(content_type, content_encoding)
+
+        assert actual is gzip_json
+
+    def test_get__unknown(self):
+        target = serialisation.SerialisationRegistry()
+
+        assert target.get("application/json") is None
+
+    def test_resolve__prefers_default(self):
+        target = serialisation.SerialisationRegistry()
+        target.register(serialisation.JSONSerialise())
+        default = serialisation.JSONSerialise()
+
+        actual = target.resolve("application/json", None, default)
+
+        assert actual is default
+
+    def test_resolve__registered(self):
+        target = serialisation.SerialisationRegistry()
+        gzip_json = target.register(
+            serialisation.GZipEncoding(serialisation.JSONSerialise())
+        )
+
+        actual = target.resolve(
+            "application/json", "GZIP", serialisation.JSONSerialise()
+        )
+
+        assert actual is gzip_json
+
+    def test_resolve__below_threshold(self):
+        target = serialisation.SerialisationRegistry()
+        default = serialisation.GZipEncoding(serialisation.JSONSerialise())
+
+        actual = target.resolve("application/json", None, default)
+
+        assert actual is default.content
+
+    def test_resolve__fallback(self):
+        target = serialisation.SerialisationRegistry()
+        default = serialisation.JSONSerialise()
+
+        assert target.resolve("text/plain", None, default) is default
+        assert target.resolve(None, None, default) is default
+
+    def test_default_registry__pickle_not_registered(self):
+        assert ("application/python-pickle", None) not in serialisation.registry
@@ -0,0 +1,123 @@
+import multiprocessing
+import uuid
+
+import pytest
+
+# Shared memory queues require Python 3.8+ on a POSIX platform
+pytest.importorskip("multiprocessing.shared_memory")
+pytest.importorskip("fcntl")
+
+from pyapp_ext.messaging import shm
+from pyapp_ext.messaging.exceptions import MessagingError
+
+
+@pytest.fixture
+def ring(tmp_path):
+    target = shm.SharedMemoryRing(
+        f"test-{uuid.uuid4().hex[:8]}", capacity=256, directory=str(tmp_path)
+    )
+    target.open()
+    yield target
+    target.unlink()
+
+
+def _produce(name, directory, count):
+    ring = shm.SharedMemoryRing(name, directory=directory)
+    ring.open()
+    for idx in range(count):
+        while not ring.put(b"%d" % idx, "text/plain"):
+            pass
+    ring.close()
+
+
+class TestSharedMemoryRing:
+    def test_put_get(self, ring):
+        assert ring.put(b"foo", "application/json", "GZIP")
+        assert ring.put("bar")
+
+        assert ring.get() == (b"foo", "application/json", "GZIP")
+        assert ring.get() == ("bar", None, None)
+        assert ring.get() is None
+
+    def test_put__bytes_like(self, ring):
+        ring.put(memoryview(bytearray(b"foo")))
+
+        assert ring.get() == (b"foo", None, None)
+
+    def test_put__full(self, ring):
+        assert ring.put(bytes(200))
+
+        assert not ring.put(bytes(100))
+        ring.get()
+        assert ring.put(bytes(100))
+
+    def test_put__too_large(self, ring):
+        with pytest.raises(ValueError):
+            ring.put(bytes(300))
+
+    def test_wraps(self, ring):
+        for idx in range(50):
+            body = bytes([idx]) * (idx + 30)
+            assert ring.put(body, "text/plain")
+            assert ring.get() == (body, "text/plain", None)
+        assert len(ring) == 0
+
+    def test_notifications(self, ring):
+        import select
+
+        assert select.select([ring.notify_fd], [], [], 0)[0] == []
+        ring.put(b"foo")
+
+        assert select.select([ring.notify_fd], [], [], 0)[0] == [ring.notify_fd]
+        ring.consume_notification()
+        assert select.select([ring.notify_fd], [], [], 0)[0] == []
+
+    def test_notifications__drained(self, ring):
+        import select
+
+        for _ in range(3):
+            ring.put(b"foo")
+
+        ring.consume_notification()
+        assert select.select([ring.notify_fd], [], [], 0)[0] == []
+
+    def test_attach(self, ring):
+        other = shm.SharedMemoryRing(ring.name, capacity=1024, directory=ring.directory)
+        other.open()
+        try:
+            ring.put(b"foo")
+
+            assert other.capacity == 256
+            assert other.get() == (b"foo", None, None)
+        finally:
+            other.close()
+
+    def test_open__not_a_ring(self, tmp_path):
+        from multiprocessing import shared_memory
+
+        name = f"test-{uuid.uuid4().hex[:8]}"
+        segment = shared_memory.SharedMemory(
+            f"pyapp-messaging-{name}", create=True, size=128
+        )
+        try:
+            target = shm.SharedMemoryRing(name, directory=str(tmp_path))
+            with pytest.raises(MessagingError):
+                target.open()
+        finally:
+            segment.close()
+            segment.unlink()
+
+    def test_other_process(self, ring):
+        process = multiprocessing.Process(
+            target=_produce, args=(ring.name, ring.directory, 100)
+        )
+        process.start()
+
+        actual = []
+        while len(actual) < 100:
+            message = ring.get()
+            if message is not None:
+                actual.append(int(message[0]))
+        process.join()
+
+        assert actual == list(range(100))
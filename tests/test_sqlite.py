@@ -0,0 +1,131 @@
+import os
+import threading
+
+import pytest
+
+from pyapp_ext.messaging import sqlite
+
+
+@pytest.fixture
+def store(tmp_path):
+    target = sqlite.SQLiteStore(str(tmp_path / "queues.db"), vacuum_interval=0)
+    target.create_schema()
+    yield target
+    target.close()
+
+
+class TestSQLiteStore:
+    def test_create_schema__wal_mode(self, store):
+        (mode,) = store.connection.execute("PRAGMA journal_mode").fetchone()
+
+        assert mode == "wal"
+
+    def test_insert_claim(self, store):
+        assert store.insert_many("a", [(b"foo", "application/json", "GZIP")]) == [1]
+        store.insert("a", "bar")
+        store.insert("b", b"eek")
+
+        actual = store.claim("a", 10, 30)
+
+        assert actual == [
+            (sqlite.Lease(1, 1), b"foo", "application/json", "GZIP"),
+            (sqlite.Lease(2, 1), "bar", None, None),
+        ]
+        assert store.claim("a", 10, 30) == []
+        assert store.counts("a") == {"ready": 0, "leased": 2, "acked": 0}
+
+    def test_claim__limit(self, store):
+        store.insert_many("a", [(str(idx), None, None) for idx in range(5)])
+
+        assert [body for _, body, *_ in store.claim("a", 3, 30)] == ["0", "1", "2"]
+        assert [body for _, body, *_ in store.claim("a", 3, 30)] == ["3", "4"]
+
+    def test_claim__lease_expired(self, store):
+        store.insert("a", b"foo")
+        ((first, *_),) = store.claim("a", 1, 0)
+
+        ((second, *_),) = store.claim("a", 1, 30)
+
+        assert second == sqlite.Lease(first.id, 2)
+        # Acknowledgement of the expired lease is ignored
+        assert store.ack([first]) == 0
+        assert store.ack([second]) == 1
+
+    def test_release(self, store):
+        store.insert("a", b"foo")
+        ((lease, *_),) = store.claim("a", 1, 30)
+
+        assert store.release(lease)
+        assert store.claim("a", 1, 30)[0][0] == sqlite.Lease(lease.id, 2)
+        assert not store.release(lease)
+
+    def test_release_many(self, store):
+        store.insert_many("a", [(b"foo", None, None), (b"bar", None, None)])
+        leases = [lease for lease, *_ in store.claim("a", 2, 30)]
+
+        assert store.release_many(leases) == 2
+        assert store.counts("a")["ready"] == 2
+        assert store.release_many(leases) == 0
+
+    def test_vacuum(self, store):
+        store.insert_many("a", [(b"foo", None, None), (b"bar", None, None)])
+        leases = [lease for lease, *_ in store.claim("a", 2, 30)]
+        store.ack(leases[:1])
+
+        assert store.maybe_vacuum() == 1
+        assert store.counts("a") == {"ready": 0, "leased": 1, "acked": 0}
+
+    def test_create_schema__incremental_auto_vacuum(self, store):
+        (mode,) = store.connection.execute("PRAGMA auto_vacuum").fetchone()
+
+        assert mode == 2
+
+    def test_vacuum__frees_pages(self, store):
+        store.insert_many("a", [(bytes(4096), None, None)] * 200)
+        store.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        size = os.path.getsize(store.path)
+        store.ack([lease for lease, *_ in store.claim("a", 200, 30)])
+
+        assert store.vacuum() == 200
+        assert os.path.getsize(store.path) < size / 4
+
+    def test_maybe_vacuum__interval(self, store):
+        store.vacuum_interval = 60
+
+        assert store.maybe_vacuum() == 0
+
+    def test_insert__group_commit(self, store, monkeypatch):
+        batches = []
+        commit_batch = store._commit_batch  # Bound before patching
+
+        def record(self, batch):
+            batches.append(len(batch))
+            commit_batch(batch)
+
+        monkeypatch.setattr(sqlite.SQLiteStore, "_commit_batch", record)
+        ids = []
+        threads = [
+            threading.Thread(
+                target=lambda: ids.append(store.insert("a", b"x", window=0.05))
+            )
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert sorted(ids) == [1, 2, 3, 4, 5]
+        assert sum(batches) == 5
+        assert len(batches) < 5
+
+    def test_shared_between_connections(self, store):
+        other = sqlite.SQLiteStore(store.path)
+        try:
+            store.insert("a", b"foo")
+            ((lease, body, *_),) = other.claim("a", 1, 30)
+
+            assert body == b"foo"
+            assert store.claim("a", 1, 30) == []
+        finally:
+            other.close()